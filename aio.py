@@ -0,0 +1,286 @@
+import asyncio
+import contextvars
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Optional, Union
+
+from config import env_float, env_int
+from metrics import Counter, Histogram
+from timings import annotate
+
+# ================== I/O EVENT LOOP ==================
+# Upstream HTTP (SerpAPI, OpenAI) runs on one asyncio loop per process, on a
+# daemon thread, with the shared async clients from http_clients.py. The
+# Streamlit script, fan_out() workers and the itinerary pool stay
+# synchronous and hand coroutines over with run() / iterate(). Coroutines
+# run in a copy of the caller's context, so spans and the deadline follow.
+#
+# Every LOOP_LAG_INTERVAL seconds (0.25; 0 turns it off) a timer records how
+# late the loop ran it: a loop busy parsing responses, or starved of the GIL
+# by many sessions' scripts, delays every upstream call it carries.
+
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_LOCK = threading.Lock()
+
+LOOP_LAG = Histogram(
+    "travel_planner_event_loop_lag_seconds", "How late the I/O loop ran a due timer", ["loop"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+
+async def _watch_lag(interval: float, name: str):
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(loop.time() - started - interval, 0.0), loop=name)
+
+
+def event_loop() -> asyncio.AbstractEventLoop:
+    global _LOOP
+    with _LOCK:
+        if _LOOP is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="aio", daemon=True).start()
+            interval = env_float("LOOP_LAG_INTERVAL", 0.25)
+            if interval > 0:
+                asyncio.run_coroutine_threadsafe(_watch_lag(interval, "aio"), loop)
+            _LOOP = loop
+        return _LOOP
+
+
+async def _in_context(context, coro):
+    return await asyncio.get_running_loop().create_task(coro, context=context)
+
+
+def submit(coro) -> Future:
+    return asyncio.run_coroutine_threadsafe(_in_context(contextvars.copy_context(), coro), event_loop())
+
+
+def run(coro):
+    """Run `coro` on the I/O loop and block until it finishes."""
+    future = submit(coro)
+    try:
+        return future.result()
+    finally:
+        future.cancel()
+
+
+def iterate(items: AsyncIterator) -> Iterator:
+    """Iterate an async generator from a synchronous thread. Closing the
+    returned generator cancels the async one (and whatever it awaits)."""
+    handoff = queue.SimpleQueue()
+
+    async def pump():
+        try:
+            async for item in items:
+                handoff.put((True, item))
+        except Exception as e:
+            handoff.put((False, e))
+        else:
+            handoff.put((False, None))
+
+    future = submit(pump())
+    try:
+        while True:
+            more, value = handoff.get()
+            if more:
+                yield value
+            elif value is not None:
+                raise value
+            else:
+                return
+    finally:
+        future.cancel()
+
+
+# ================== DEADLINES ==================
+# A search gets one Deadline (SEARCH_DEADLINE seconds) and each stage a
+# slice of what is left of it. The innermost `with deadline(...)` wins
+# unless an outer one ends sooner. Upstream calls read it with time_left()
+# and give up with TimeoutError instead of waiting indefinitely.
+
+
+class Deadline:
+    __slots__ = ("at",)
+
+    def __init__(self, seconds: float):
+        self.at = time.monotonic() + max(seconds, 0.0)
+
+    def remaining(self) -> float:
+        return max(self.at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.at
+
+    def split(self, share: float) -> "Deadline":
+        # A stage's slice: `share` of the time left
+        return Deadline(self.remaining() * share)
+
+
+_DEADLINE: ContextVar[Optional[Deadline]] = ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline(limit: Union[Deadline, float]):
+    current = limit if isinstance(limit, Deadline) else Deadline(limit)
+    outer = _DEADLINE.get()
+    if outer is not None and outer.at < current.at:
+        current = outer
+    token = _DEADLINE.set(current)
+    try:
+        yield current
+    finally:
+        _DEADLINE.reset(token)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _DEADLINE.get()
+
+
+def time_left(cap: Optional[float] = None) -> Optional[float]:
+    """Seconds until the current deadline, at most `cap`; None if unbounded."""
+    current = _DEADLINE.get()
+    if current is None:
+        return cap
+    left = current.remaining()
+    return left if cap is None else min(cap, left)
+
+
+@asynccontextmanager
+async def bounded():
+    """Cancel the enclosed awaits when the current deadline passes."""
+    try:
+        async with asyncio.timeout(time_left()):
+            yield
+    except TimeoutError as e:
+        if str(e):
+            raise
+        raise TimeoutError("deadline exceeded") from e
+
+
+# ================== RETRIES ==================
+# Transient upstream failures (429, 5xx, dropped connections) are retried
+# with "full jitter" exponential backoff: attempt n sleeps a uniform random
+# time in [0, min(cap, base * 2**n)], or the server's Retry-After if larger.
+# No sleep runs past the deadline; the last answer or error is returned.
+# UPSTREAM_BACKOFF_BASE (0.25 s) and UPSTREAM_BACKOFF_CAP (4 s) tune it.
+# A metered upstream passes `may_retry`, which pays for the extra call (or
+# says no, and the last answer stands).
+
+RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+UPSTREAM_RETRIES = Counter(
+    "travel_planner_upstream_retries_total", "Upstream calls retried", ["upstream", "reason"]
+)
+UPSTREAM_HEDGES = Counter(
+    "travel_planner_upstream_hedges_total", "Hedged duplicate requests sent", ["upstream", "winner"]
+)
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def _retry_after(outcome) -> Optional[float]:
+    headers = getattr(outcome, "headers", None) or getattr(getattr(outcome, "response", None), "headers", None)
+    try:
+        return float(headers.get("retry-after")) if headers else None
+    except (TypeError, ValueError):
+        return None
+
+
+async def with_retries(
+    call: Callable[[], Awaitable],
+    upstream: str,
+    retry_reason: Callable[[object, Optional[BaseException]], Optional[str]],
+    attempts: Optional[int] = None,
+    may_retry: Optional[Callable[[], Awaitable[bool]]] = None,
+):
+    """Await `call()` until retry_reason(result, error) is None or retries run out."""
+    attempts = env_int("UPSTREAM_MAX_RETRIES", 2) if attempts is None else attempts
+    base = env_float("UPSTREAM_BACKOFF_BASE", 0.25)
+    cap = env_float("UPSTREAM_BACKOFF_CAP", 4.0)
+    for attempt in range(attempts + 1):
+        try:
+            result, error = await call(), None
+        except Exception as e:
+            result, error = None, e
+        reason = retry_reason(result, error)
+        if reason is None or attempt == attempts:
+            break
+        delay = max(backoff_delay(attempt, base, cap), _retry_after(error or result) or 0.0)
+        left = time_left()
+        if left is not None and delay >= left:
+            break
+        if may_retry is not None and not await may_retry():
+            break
+        UPSTREAM_RETRIES.inc(upstream=upstream, reason=reason)
+        annotate(retries=attempt + 1, retry_reason=reason)
+        await asyncio.sleep(delay)
+    if error is not None:
+        raise error
+    return result
+
+
+# ================== HEDGED REQUESTS ==================
+# An attempt still running after the upstream's recent p95 latency is
+# probably stuck behind something slow; a duplicate sent then usually
+# returns first. Whichever copy succeeds first wins and the other is
+# cancelled. The duplicate costs one more upstream call about 5% of the time;
+# `may_hedge` pays for it, or says no and the first copy is awaited alone.
+
+
+class LatencyTracker:
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float, min_samples: int = 20) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < min_samples:
+            return None
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+async def hedged(call: Callable[[], Awaitable], hedge_after: Optional[float], upstream: str,
+                 may_hedge: Optional[Callable[[], Awaitable[bool]]] = None):
+    """Await `call()`, starting a second copy if the first takes longer than `hedge_after`."""
+    if hedge_after is None:
+        return await call()
+    first = asyncio.ensure_future(call())
+    pending = {first}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=hedge_after)
+        if done:
+            return first.result()
+        if may_hedge is not None and not await may_hedge():
+            return await first
+        second = asyncio.ensure_future(call())
+        pending.add(second)
+        annotate(hedged=True)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    UPSTREAM_HEDGES.inc(upstream=upstream, winner="hedge" if task is second else "first")
+                    return task.result()
+                error = task.exception()
+        UPSTREAM_HEDGES.inc(upstream=upstream, winner="none")
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,411 @@
+import csv
+import os
+import sys
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from config import env_str
+
+# ================== AIRPORT INDEX ==================
+# The bundled data/airports.csv (iata,name,city,country,rank) is a curated
+# list of ~440 main commercial airports, not a full index. Point AIRPORTS_CSV
+# at an OurAirports airports.csv export to load every scheduled-service
+# airport (a few thousand) instead; both formats are read. `rank` orders a
+# city's airports, 1 = its main one (LHR before LCY), so
+# airports_for_city()[0] is what a route label or a one-airport lookup uses;
+# OurAirports rows rank by type (large, medium, small).
+#
+# Everything is stored column-wise in a handful of strings and typed arrays
+# rather than one Python object per airport, so even tens of thousands of
+# airports cost a few MB and the index builds in well under a second. With
+# 20,000 airports (benchmarks/bench_airports.py --synthetic 20000) queries,
+# typos included, stay under a millisecond at p99.
+
+BUNDLED_AIRPORTS_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "airports.csv")
+
+CITY_ALIASES = {
+    "bangalore": "bengaluru",
+    "bombay": "mumbai",
+    "madras": "chennai",
+    "calcutta": "kolkata",
+    "cochin": "kochi",
+    "trivandrum": "thiruvananthapuram",
+    "calicut": "kozhikode",
+    "mangalore": "mangaluru",
+    "mysore": "mysuru",
+    "allahabad": "prayagraj",
+    "banaras": "varanasi",
+    "vizag": "visakhapatnam",
+    "new delhi": "delhi",
+    "gurgaon": "delhi",
+    "saigon": "ho chi minh city",
+    "nyc": "new york",
+}
+
+# Words that appear in most airport names and only add noise to prefix search.
+_NAME_STOPWORDS = {
+    "international", "airport", "airfield", "aerodrome", "regional", "municipal", "county", "field",
+    "the", "de", "of", "and",
+}
+
+KIND_CODE, KIND_CITY, KIND_NAME = 0, 1, 2
+
+# Prefix scans stop after this many keys per result. Fuzzy matching only
+# runs the edit-distance DP on keys that share enough bigrams with the query
+# within their first _HEAD characters (a q-gram filter over packed postings).
+_SCAN_PER_RESULT = 40
+_HEAD = 8
+
+
+class Airport(NamedTuple):
+    iata: str
+    name: str
+    city: str
+    country: str
+
+    @property
+    def label(self) -> str:
+        return f"{self.city} - {self.name}"
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return " ".join("".join(ch if ch.isalnum() else " " for ch in text).split())
+
+
+def city_key(city: str, country: str) -> str:
+    return f"{normalize(city)}|{country.lower()}"
+
+
+class _StringColumn:
+    # Many strings packed into one; row i is blob[offsets[i]:offsets[i + 1]].
+    __slots__ = ("blob", "offsets")
+
+    def __init__(self, values: Iterable[str]):
+        offsets = array("I", [0])
+        parts = []
+        total = 0
+        for value in values:
+            parts.append(value)
+            total += len(value)
+            offsets.append(total)
+        self.blob = "".join(parts)
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.blob[self.offsets[i]:self.offsets[i + 1]]
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self.blob) + self.offsets.itemsize * len(self.offsets)
+
+
+class AirportIndex:
+    def __init__(self, airports: Iterable[Tuple]):
+        # (iata, name, city, country[, rank]); rank defaults to 1
+        rows = sorted(
+            {(iata.upper(), name, city, country.upper(), int(rank[0]) if rank else 1)
+             for iata, name, city, country, *rank in airports if len(iata) == 3 and city},
+            # Indian airports first, then by city, each city's main airport first
+            key=lambda r: (r[3] != "IN", r[2], r[4], r[0]),
+        )
+        self._iata = "".join(r[0] for r in rows)
+        self._countries = "".join(r[3][:2].ljust(2) for r in rows)
+        self._names = _StringColumn(r[1] for r in rows)
+        self._cities = _StringColumn(r[2] for r in rows)
+
+        reverse_aliases = {}
+        for alias, target in CITY_ALIASES.items():
+            reverse_aliases.setdefault(target, []).append(alias)
+
+        keys = set()
+        cities = {}
+        for row, (iata, name, city, country, _) in enumerate(rows):
+            keys.add((iata.lower(), KIND_CODE, row))
+            city_norm = normalize(city)
+            for word in {city_norm, *city_norm.split(), *reverse_aliases.get(city_norm, ())}:
+                keys.add((word, KIND_CITY, row))
+            for word in normalize(name).split():
+                if len(word) >= 3 and word not in _NAME_STOPWORDS:
+                    keys.add((word, KIND_NAME, row))
+            cities.setdefault(city_key(city, country), []).append(row)
+
+        keys = sorted(keys)
+        self._keys = _StringColumn(k for k, _, _ in keys)
+        self._key_kinds = array("B", (kind for _, kind, _ in keys))
+        self._key_rows = array("I", (row for _, _, row in keys))
+
+        # bigram -> ascending key positions, stored CSR-style in two arrays
+        postings = [[] for _ in range(_BIGRAMS)]
+        for pos, (key, _, _) in enumerate(keys):
+            for gram in set(_bigrams(key[:_HEAD])):
+                postings[gram].append(pos)
+        self._gram_starts = array("I", [0])
+        self._gram_positions = array("I")
+        for positions in postings:
+            self._gram_positions.extend(positions)
+            self._gram_starts.append(len(self._gram_positions))
+
+        city_keys = sorted(cities)
+        self._city_keys = _StringColumn(city_keys)
+        self._city_starts = array("I", [0])
+        self._city_rows = array("I")
+        for key in city_keys:
+            self._city_rows.extend(cities[key])
+            self._city_starts.append(len(self._city_rows))
+
+    # ----- rows -----
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def airport(self, row: int) -> Airport:
+        return Airport(
+            self._iata[row * 3:row * 3 + 3],
+            self._names[row],
+            self._cities[row],
+            self._countries[row * 2:row * 2 + 2].strip(),
+        )
+
+    def nbytes(self) -> int:
+        arrays = (
+            self._key_kinds, self._key_rows, self._gram_starts, self._gram_positions,
+            self._city_starts, self._city_rows,
+        )
+        return (
+            sys.getsizeof(self._iata) + sys.getsizeof(self._countries)
+            + self._names.nbytes() + self._cities.nbytes()
+            + self._keys.nbytes() + self._city_keys.nbytes()
+            + sum(a.itemsize * len(a) for a in arrays)
+        )
+
+    # ----- cities -----
+
+    def _city_position(self, key: str) -> Optional[int]:
+        pos = _lower_bound(self._city_keys, key)
+        if pos < len(self._city_keys) and self._city_keys[pos] == key:
+            return pos
+        return None
+
+    def airports_for_city(self, key: str) -> List[Airport]:
+        pos = self._city_position(key)
+        if pos is None:
+            return []
+        rows = self._city_rows[self._city_starts[pos]:self._city_starts[pos + 1]]
+        return [self.airport(row) for row in rows]
+
+    def city_keys(self) -> List[str]:
+        return [self._city_keys[i] for i in range(len(self._city_keys))]
+
+    def city_label(self, key: str) -> str:
+        airports = self.airports_for_city(key)
+        return airports[0].city if airports else key.split("|")[0].title()
+
+    def city_of(self, row: int) -> str:
+        return city_key(self._cities[row], self._countries[row * 2:row * 2 + 2].strip())
+
+    def resolve_city(self, text: str) -> Optional[str]:
+        # Free text / alias / IATA code -> city key, preferring exact city names.
+        query = normalize(text)
+        query = CITY_ALIASES.get(query, query)
+        rows = self.search_rows(query, limit=1)
+        return self.city_of(rows[0]) if rows else None
+
+    def search_cities(self, query: str, limit: int = 10) -> List[str]:
+        seen = []
+        for row in self.search_rows(query, limit=limit * 4):
+            key = self.city_of(row)
+            if key not in seen:
+                seen.append(key)
+                if len(seen) == limit:
+                    break
+        return seen
+
+    # ----- search -----
+
+    def search(self, query: str, limit: int = 10) -> List[Airport]:
+        return [self.airport(row) for row in self.search_rows(query, limit)]
+
+    def search_rows(self, query: str, limit: int = 10) -> List[int]:
+        tokens = normalize(query).split()
+        if not tokens:
+            return []
+        primary_at = max(range(len(tokens)), key=lambda i: len(tokens[i]))
+        primary = tokens[primary_at]
+        others = tokens[:primary_at] + tokens[primary_at + 1:]
+
+        scores = {}  # row -> best (lower is better) score
+        full = " ".join(tokens)
+        max_scan = limit * _SCAN_PER_RESULT
+        self._collect_prefix(full, scores, bonus=0, max_scan=max_scan)
+        if full != primary:
+            self._collect_prefix(primary, scores, bonus=1, max_scan=max_scan)
+        if not scores and len(primary) >= 3:
+            self._collect_fuzzy(primary, scores, max_dist=1 if len(primary) <= 7 else 2)
+
+        if others:
+            scores = {row: s for row, s in scores.items() if self._row_matches(row, others)}
+        ranked = sorted(scores, key=lambda row: (scores[row], len(self._cities[row]), row))
+        return ranked[:limit]
+
+    def _collect_prefix(self, prefix: str, scores: dict, bonus: int, max_scan: int) -> None:
+        keys = self._keys
+        pos = _lower_bound(keys, prefix)
+        end = min(len(keys), pos + max_scan)
+        while pos < end:
+            key = keys[pos]
+            if not key.startswith(prefix):
+                break
+            kind = self._key_kinds[pos]
+            score = kind * 2 + (key != prefix) + bonus * 4
+            row = self._key_rows[pos]
+            if score < scores.get(row, 99):
+                scores[row] = score
+            pos += 1
+
+    def _collect_fuzzy(self, word: str, scores: dict, max_dist: int) -> None:
+        # Typo tolerance: prefix edit distance against keys sharing the first
+        # letter. Only reached when prefix search found nothing. An edit (a
+        # swap of neighbours counts as one) breaks at most 3 of the query's
+        # bigrams, so keys sharing fewer than all but 3 * max_dist are skipped
+        # without running the DP.
+        keys = self._keys
+        lo = _lower_bound(keys, word[0])
+        hi = _lower_bound(keys, chr(ord(word[0]) + 1))
+        head = word[:_HEAD - max_dist]
+        grams = set(_bigrams(head))
+        needed = max(1, len(head) - 1 - 3 * max_dist)
+
+        shared = {}
+        starts, positions = self._gram_starts, self._gram_positions
+        for gram in grams:
+            start, stop = starts[gram], starts[gram + 1]
+            i = bisect_left(positions, lo, start, stop)
+            while i < stop and positions[i] < hi:
+                pos = positions[i]
+                shared[pos] = shared.get(pos, 0) + 1
+                i += 1
+
+        distances = {}
+        for pos, count in shared.items():
+            if count < needed:
+                continue
+            key = keys[pos]
+            if key not in distances:
+                distances[key] = _prefix_distance(word, key, max_dist)
+            distance = distances[key]
+            if distance is not None:
+                row = self._key_rows[pos]
+                score = 10 + distance * 4 + self._key_kinds[pos]
+                if score < scores.get(row, 99):
+                    scores[row] = score
+
+    def _row_matches(self, row: int, tokens: List[str]) -> bool:
+        words = f"{self._iata[row * 3:row * 3 + 3]} {self._cities[row]} {self._names[row]}"
+        words = normalize(words).split()
+        return all(any(w.startswith(t) for w in words) for t in tokens)
+
+
+def _lower_bound(column: _StringColumn, value: str) -> int:
+    lo, hi = 0, len(column)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if column[mid] < value:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+_BIGRAMS = 64 * 64
+
+
+def _bigrams(text: str):
+    return [(ord(a) % 64) * 64 + ord(b) % 64 for a, b in zip(text, text[1:])]
+
+
+def _prefix_distance(word: str, key: str, max_dist: int) -> Optional[int]:
+    # Smallest edit distance between `word` and any prefix of `key`, with a
+    # swap of neighbouring letters ("lodnon") as one edit, using a DP band of
+    # width 2 * max_dist + 1 and bailing out once it is exceeded.
+    key = key[:len(word) + max_dist]
+    n = len(key)
+    if n < len(word) - max_dist:
+        return None
+    big = max_dist + 1
+    before = None
+    previous = list(range(n + 1))
+    for i, ch in enumerate(word, 1):
+        lo, hi = max(1, i - max_dist), min(n, i + max_dist)
+        current = [big] * (n + 1)
+        current[0] = i if i <= max_dist else big
+        best = current[0]
+        for j in range(lo, hi + 1):
+            cost = previous[j - 1] + (ch != key[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            if before is not None and j > 1 and ch == key[j - 2] and word[i - 2] == key[j - 1] \
+                    and before[j - 2] + 1 < cost:
+                cost = before[j - 2] + 1
+            current[j] = cost
+            if cost < best:
+                best = cost
+        if best > max_dist:
+            return None
+        before, previous = previous, current
+    best = min(previous[max(0, len(word) - max_dist):])
+    return best if best <= max_dist else None
+
+
+# ================== LOADING ==================
+
+_OURAIRPORTS_RANKS = {"large_airport": 1, "medium_airport": 2, "small_airport": 3}
+
+
+def read_airports_csv(path: str):
+    # (iata, name, city, country, rank) per airport
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        fields = reader.fieldnames or []
+        if "iata_code" in fields:  # OurAirports export
+            for row in reader:
+                rank = _OURAIRPORTS_RANKS.get(row.get("type"))
+                if row.get("iata_code") and row.get("scheduled_service") == "yes" and rank:
+                    yield row["iata_code"], row["name"], row.get("municipality") or "", row["iso_country"], rank
+        else:
+            for row in reader:
+                yield row["iata"], row["name"], row["city"], row["country"], int(row.get("rank") or 1)
+
+
+_INDEX: Optional[AirportIndex] = None
+_INDEX_LOCK = threading.Lock()
+
+
+def airport_index() -> AirportIndex:
+    global _INDEX
+    if _INDEX is None:
+        with _INDEX_LOCK:
+            if _INDEX is None:
+                path = env_str("AIRPORTS_CSV", BUNDLED_AIRPORTS_CSV)
+                _INDEX = AirportIndex(read_airports_csv(path))
+    return _INDEX
+
+
+# Shown in the From/To pickers before anything is typed; also the default
+# route set for warm_cache.py.
+PRESET_CITY_NAMES = (
+    "hyderabad", "mumbai", "delhi", "bengaluru", "chennai", "kolkata", "pune", "ahmedabad", "kochi",
+)
+
+
+def preset_cities() -> List[str]:
+    index = airport_index()
+    return [key for key in dict.fromkeys(index.resolve_city(name) for name in PRESET_CITY_NAMES) if key]
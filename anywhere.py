@@ -0,0 +1,146 @@
+import contextvars
+import statistics
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from aio import deadline
+from airports import airport_index, preset_cities
+from config import env_int, env_str
+from fanout import fan_out
+from flights import FlightRecord, fetch_flights, parse_flights, quota_refusal, rank_flights
+from quota import QuotaExceeded
+
+# ================== "ANYWHERE" DESTINATION SEARCH ==================
+# Fixed dates, open destination: one fare lookup per candidate city (its
+# main airport only, rank 1 in the airport index, to keep quota down), run a
+# few at a time under one shared deadline, ranked as the answers come in. No
+# itinerary is planned until the user picks a destination. Once the search
+# budget refuses a lookup, the destinations left are marked REFUSED unsearched.
+#
+# ANYWHERE_SCOPE=presets (default) searches the preset cities;
+# ANYWHERE_SCOPE=index every city in the airport index, home country first,
+# capped at ANYWHERE_MAX_DESTINATIONS.
+
+ANYWHERE = "__anywhere__"  # the To picker's option for this search
+REFUSED = "refused"  # a destination the search budget turned down
+
+
+@dataclass
+class DestinationFare:
+    city_key: str
+    city: str
+    airport: str
+    cheapest: float
+    median: float            # of the top-k fares, a steadier "typical" price
+    fares: int
+    best: FlightRecord
+
+
+def anywhere_destinations(source_key: Optional[str], scope: Optional[str] = None,
+                          limit: Optional[int] = None) -> List[str]:
+    index = airport_index()
+    scope = scope or env_str("ANYWHERE_SCOPE", "presets")
+    limit = limit if limit is not None else env_int("ANYWHERE_MAX_DESTINATIONS", 60)
+    if scope == "index":
+        home = source_key.split("|")[-1] if source_key else "in"
+        keys = sorted(index.city_keys(), key=lambda key: key.split("|")[-1] != home)
+    else:
+        keys = preset_cities()
+    return [key for key in keys if key != source_key][:limit]
+
+
+def destination_fare(city_key, source_code, departure_date, return_date, top_k=5,
+                     fetch=fetch_flights, **fetch_options) -> Optional[DestinationFare]:
+    # None when nothing came back with a price; SerpAPI errors raise, a budget refusal as QuotaExceeded
+    index = airport_index()
+    code = index.airports_for_city(city_key)[0].iata  # the city's main airport
+    data, _ = fetch(source_code, code, departure_date, return_date, **fetch_options)
+    refused = quota_refusal(data)
+    if refused is not None:
+        raise refused
+    if "error" in data:
+        raise RuntimeError(data["error"])
+    top = [f for f in rank_flights(parse_flights(data), k=top_k) if f.has_price]
+    if not top:
+        return None
+    return DestinationFare(
+        city_key=city_key, city=index.city_label(city_key), airport=code, cheapest=top[0].price,
+        median=statistics.median(f.price for f in top), fares=len(top), best=top[0],
+    )
+
+
+DESTINATION_SORTS = {
+    "cheapest": lambda fare: (fare.cheapest, fare.median),
+    "median": lambda fare: (fare.median, fare.cheapest),
+}
+
+
+def rank_destinations(fares: Dict[str, object], by: str = "cheapest") -> List[DestinationFare]:
+    return sorted((f for f in fares.values() if isinstance(f, DestinationFare)), key=DESTINATION_SORTS[by])
+
+
+def search_destinations(
+    city_keys: List[str],
+    lookup: Callable[[str], Optional[DestinationFare]],
+    max_concurrency: int = 6,
+    lookup_timeout: float = 20.0,
+    total_timeout: float = 60.0,
+) -> Iterator[Tuple[str, Optional[DestinationFare], Optional[BaseException]]]:
+    # The shared deadline also bounds the upstream calls, not just the waiting
+    with deadline(total_timeout):
+        yield from fan_out(
+            {key: (lambda key=key: lookup(key)) for key in city_keys},
+            max_concurrency=max_concurrency,
+            task_timeout=lookup_timeout,
+            deadline=time.monotonic() + total_timeout,
+        )
+
+
+class AnywhereJob:
+    # Same shape as FareMatrixJob: search_destinations() on its own thread,
+    # `results` read by the script thread between redraws.
+    def __init__(self, city_keys: List[str], lookup, signature=None, **limits):
+        self.signature = signature
+        self.total = len(city_keys)
+        self.results: Dict[str, object] = {}  # DestinationFare, None (no fare) or REFUSED
+        self.failed = 0
+        self.refused: Optional[QuotaExceeded] = None  # the first refusal, for the notice
+        self._cancelled = threading.Event()
+        self._finished = threading.Event()
+        context = contextvars.copy_context()
+        threading.Thread(
+            target=context.run, args=(self._run, city_keys, lookup, limits),
+            name="anywhere", daemon=True,
+        ).start()
+
+    def _run(self, city_keys, lookup, limits):
+        try:
+            for key, fare, error in search_destinations(city_keys, lambda key: self._lookup(lookup, key), **limits):
+                if self._cancelled.is_set():
+                    break
+                if isinstance(error, QuotaExceeded):
+                    self.results[key] = REFUSED
+                    self.refused = self.refused or error
+                    continue
+                self.results[key] = fare
+                self.failed += error is not None
+        finally:
+            self._finished.set()
+
+    def _lookup(self, lookup, key):
+        if self.refused is not None:
+            raise self.refused  # stop spending: the rest of the scan would be refused too
+        return lookup(key)
+
+    @property
+    def refused_destinations(self) -> int:
+        return sum(fare is REFUSED for fare in list(self.results.values()))
+
+    @property
+    def done(self) -> bool:
+        return self._finished.is_set()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
@@ -0,0 +1,357 @@
+"""JSON API over the search / itinerary engine, for integrations that do not
+want the Streamlit UI.
+
+    uvicorn api:app --workers 4 --port 8000
+    python api.py --workers 4 --port 8000
+
+    GET  /healthz
+    GET  /v1/cities?q=lond
+    GET  /v1/flights?from=kochi&to=delhi&depart=2026-12-01&return=2026-12-05[&sort=price&window=morning&k=8]
+    POST /v1/itinerary          {"from": "kochi", "to": "delhi", "depart": "2026-12-01", "return": "2026-12-05", ...}
+    POST /v1/itinerary/stream   same body; Server-Sent Events as the plan is written
+
+Keys come from SERPAPI_KEY / OPENAI_API_KEY in the environment. With
+API_TOKENS set (comma-separated), every /v1 call needs
+"Authorization: Bearer <token>". Each worker process has its own memory
+caches and shares the on-disk tier (CACHE_DIR) with the app.
+
+Upstream budgets (quota.py) are per client (API token, else address) and
+shared with the app. An itinerary the token budget can't cover comes back
+outline-only ("short": true), or as 429 with Retry-After.
+"""
+import argparse
+import asyncio
+import hmac
+import json
+from datetime import date
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from aio import Deadline
+from airports import airport_index
+from config import env_float, env_str
+from engine import city_airports, itinerary_trip, resolve_city, search_flights, start_itinerary
+from flights import DEPARTURE_WINDOWS, SORT_KEYS, rank_flights
+from http_clients import openai_client
+from itinerary import format_stats, is_outline_only, itinerary_markdown
+from quota import QuotaExceeded, use_session
+
+# ================== REQUEST PARSING ==================
+
+TRIP_DEFAULTS = {
+    "theme": "🧳 Solo Exploration",
+    "activities": "Relaxing on the beach, exploring historical sites",
+    "budget": "Economy",
+    "flight_class": "Economy",
+    "hotel_rating": "Any",
+    "visa_required": False,
+    "travel_insurance": False,
+}
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _city(value, field):
+    key = resolve_city(str(value or ""))
+    if key is None:
+        raise BadRequest(f"unknown city or airport for '{field}': {value!r}")
+    return key
+
+
+def _date(value, field):
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise BadRequest(f"'{field}' must be a YYYY-MM-DD date") from None
+
+
+def parse_route(params) -> dict:
+    source_key, destination_key = _city(params.get("from"), "from"), _city(params.get("to"), "to")
+    departure, ret = _date(params.get("depart"), "depart"), _date(params.get("return"), "return")
+    if ret < departure:
+        raise BadRequest("'return' is before 'depart'")
+    return {
+        "source_key": source_key,
+        "destination_key": destination_key,
+        "source_codes": city_airports(source_key, "HYD"),
+        "destination_codes": city_airports(destination_key, "DEL"),
+        "departure_date": departure,
+        "return_date": ret,
+    }
+
+
+def flight_json(flight, search) -> dict:
+    return {
+        "airline": flight.airline,
+        "price_inr": flight.price if flight.has_price else None,
+        "duration_min": flight.duration if flight.has_duration else None,
+        "stops": flight.stops,
+        "from": flight.departure_code,
+        "to": flight.arrival_code,
+        "departure": flight.departure_time,
+        "arrival": flight.arrival_time,
+        "logo": flight.logo,
+        "booking_link": search.booking_link(flight),
+    }
+
+
+def search_json(search, route, flights) -> dict:
+    info = search.cache_info
+    return {
+        "from": {"city": airport_index().city_label(route["source_key"]), "airports": route["source_codes"]},
+        "to": {"city": airport_index().city_label(route["destination_key"]), "airports": route["destination_codes"]},
+        "depart": str(search.departure_date),
+        "return": str(search.return_date),
+        "error": search.error,
+        "failed_pairs": ["-".join(pair) for pair in search.failed_pairs],
+        "cache": {"state": info.state, "age_s": round(info.age, 1)} if info else None,
+        "prices": {
+            "min": search.min_price,
+            "max": search.max_price,
+            "avg": None if search.avg_price is None else round(search.avg_price),
+        },
+        "flights": [flight_json(f, search) for f in flights],
+    }
+
+
+def _error(status, message):
+    return JSONResponse({"error": message}, status_code=status)
+
+
+def _quota_error(e: QuotaExceeded):
+    return JSONResponse(
+        {"error": str(e), "reason": e.reason}, status_code=429,
+        headers={"Retry-After": str(max(int(e.retry_after), 1))},
+    )
+
+
+def _authorized(request) -> bool:
+    tokens = [t.strip() for t in env_str("API_TOKENS", "").split(",") if t.strip()]
+    if not tokens:
+        return True
+    header = request.headers.get("authorization", "")
+    if not header.startswith("Bearer "):
+        return False
+    token = header[len("Bearer "):].encode()
+    return any(hmac.compare_digest(token, t.encode()) for t in tokens)
+
+
+def _use_client_budget(request) -> None:
+    # Budget session for the rest of this request (quota.py): its token, else its address
+    header = request.headers.get("authorization", "")
+    use_session(header if header.startswith("Bearer ") else request.client and request.client.host)
+
+
+# ================== ENDPOINTS ==================
+
+async def healthz(request):
+    return JSONResponse({"ok": True})
+
+
+async def cities(request):
+    if not _authorized(request):
+        return _error(401, "missing or wrong API token")
+    index = airport_index()
+    keys = index.search_cities(request.query_params.get("q", ""), limit=10)
+    return JSONResponse([
+        {"city": index.city_label(key), "airports": [a.iata for a in index.airports_for_city(key)]}
+        for key in keys
+    ])
+
+
+async def flights(request):
+    if not _authorized(request):
+        return _error(401, "missing or wrong API token")
+    _use_client_budget(request)
+    params = request.query_params
+    try:
+        route = parse_route(params)
+        sort_by, window = params.get("sort", "price"), params.get("window") or None
+        if sort_by not in SORT_KEYS and sort_by != "pareto":
+            raise BadRequest(f"'sort' must be one of {', '.join([*SORT_KEYS, 'pareto'])}")
+        if window is not None and window not in DEPARTURE_WINDOWS:
+            raise BadRequest(f"'window' must be one of {', '.join(DEPARTURE_WINDOWS)}")
+        k = min(max(int(params.get("k", 8)), 1), 50)
+    except (BadRequest, ValueError) as e:
+        return _error(400, str(e))
+
+    search = await run_in_threadpool(
+        search_flights, route["source_codes"], route["destination_codes"],
+        route["departure_date"], route["return_date"], env_str("SERPAPI_KEY", ""),
+        Deadline(env_float("SEARCH_DEADLINE", 90)),
+    )
+    shown = search.flights if (sort_by, window, k) == ("price", None, 8) else rank_flights(
+        search.records, k=k, by=sort_by, window=window
+    )
+    return JSONResponse(search_json(search, route, shown), status_code=502 if search.error else 200)
+
+
+async def _start_trip(request):
+    # (search json, cached, job) for a POSTed trip; raises BadRequest
+    try:
+        body = await request.json()
+    except ValueError:
+        raise BadRequest("body must be a JSON object") from None
+    if not isinstance(body, dict):
+        raise BadRequest("body must be a JSON object")
+    route = parse_route(body)
+    prefs = {**TRIP_DEFAULTS, **{k: v for k, v in body.items() if k in TRIP_DEFAULTS}}
+    try:
+        num_days = int(body.get("days") or max((route["return_date"] - route["departure_date"]).days, 1))
+    except (TypeError, ValueError):
+        raise BadRequest("'days' must be a number") from None
+    if not 1 <= num_days <= 30:
+        raise BadRequest("'days' must be between 1 and 30")
+
+    search_deadline = Deadline(env_float("SEARCH_DEADLINE", 90))
+
+    def start():
+        search = search_flights(
+            route["source_codes"], route["destination_codes"], route["departure_date"], route["return_date"],
+            env_str("SERPAPI_KEY", ""), search_deadline,
+        )
+        trip = itinerary_trip(
+            search, num_days, prefs["theme"], airport_index().city_label(route["source_key"]),
+            airport_index().city_label(route["destination_key"]), prefs["activities"], prefs["budget"],
+            prefs["flight_class"], prefs["hotel_rating"], bool(prefs["visa_required"]),
+            bool(prefs["travel_insurance"]),
+        )
+        cached, job = start_itinerary(
+            openai_client(env_str("OPENAI_API_KEY", "")), trip, search,
+            force=bool(body.get("regenerate")), search_deadline=search_deadline,
+        )
+        return search_json(search, route, search.flights), cached, job
+
+    return await run_in_threadpool(start)
+
+
+def itinerary_json(text: str, complete=None, short=None) -> dict:
+    markdown, parsed, parsed_complete = itinerary_markdown(text)
+    return {
+        "itinerary": parsed or None,
+        "markdown": markdown,
+        "complete": parsed_complete if complete is None else complete,
+        "short": is_outline_only(parsed) if short is None else short,
+    }
+
+
+def job_stats(job) -> dict:
+    stats = job.stats
+    return {
+        "first_token_s": stats.first_token_s,
+        "total_s": stats.total_s,
+        "prompt_tokens": stats.prompt_tokens,
+        "completion_tokens": stats.completion_tokens,
+        "finish_reason": stats.finish_reason,
+        "summary": format_stats(stats),
+        "shared": job.shared,
+    }
+
+
+async def itinerary(request):
+    if not _authorized(request):
+        return _error(401, "missing or wrong API token")
+    if not env_str("OPENAI_API_KEY", ""):
+        return _error(503, "OPENAI_API_KEY is not set")
+    _use_client_budget(request)
+    try:
+        search, cached, job = await _start_trip(request)
+    except BadRequest as e:
+        return _error(400, str(e))
+    except QuotaExceeded as e:
+        return _quota_error(e)
+    if cached is not None:
+        text, info = cached
+        return JSONResponse({**itinerary_json(text), "cached": True, "age_s": round(info.age, 1), "search": search})
+    try:
+        while not job.done:
+            if await request.is_disconnected():
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        if not job.done:
+            job.cancel()  # client went away
+    if not job.done:
+        return _error(499, "client closed request")
+    if job.error is not None:
+        return JSONResponse({"error": f"AI error: {job.error}", "search": search}, status_code=502)
+    return JSONResponse({
+        **itinerary_json(job.text, short=job.short), "cached": False, "stats": job_stats(job), "search": search,
+    })
+
+
+def _event(name: str, payload) -> str:
+    return f"event: {name}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+async def itinerary_stream(request):
+    if not _authorized(request):
+        return _error(401, "missing or wrong API token")
+    if not env_str("OPENAI_API_KEY", ""):
+        return _error(503, "OPENAI_API_KEY is not set")
+    _use_client_budget(request)
+    try:
+        search, cached, job = await _start_trip(request)
+    except BadRequest as e:
+        return _error(400, str(e))
+    except QuotaExceeded as e:
+        return _quota_error(e)
+
+    async def events():
+        # flights, then the plan each time it grows, then done / error
+        yield _event("flights", search)
+        if cached is not None:
+            yield _event("itinerary", {**itinerary_json(cached[0]), "cached": True})
+            yield _event("done", {"cached": True})
+            return
+        sent = None
+        try:
+            while True:
+                done = job.done
+                text = job.text
+                if text and text != sent:
+                    sent = text
+                    yield _event(
+                        "itinerary", itinerary_json(text, complete=False if not done else None, short=job.short)
+                    )
+                if done:
+                    break
+                await asyncio.sleep(env_float("API_STREAM_INTERVAL", 0.1))
+        finally:
+            if not job.done:
+                job.cancel()  # client went away
+        if job.error is not None:
+            yield _event("error", {"error": f"AI error: {job.error}"})
+        else:
+            yield _event("done", {"cached": False, "stats": job_stats(job)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+app = Starlette(routes=[
+    Route("/healthz", healthz),
+    Route("/v1/cities", cities),
+    Route("/v1/flights", flights),
+    Route("/v1/itinerary", itinerary, methods=["POST"]),
+    Route("/v1/itinerary/stream", itinerary_stream, methods=["POST"]),
+])
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Travel planner JSON API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+    uvicorn.run("api:app", host=args.host, port=args.port, workers=args.workers, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,26 @@
+import html
 import os
-from datetime import datetime
+import time
+import uuid
 
 import streamlit as st
-from serpapi import GoogleSearch
-from openai import OpenAI
+
+from aio import Deadline
+from airports import airport_index, preset_cities
+from anywhere import ANYWHERE, AnywhereJob, anywhere_destinations, destination_fare, rank_destinations
+from assets import logo_url, page_html, stylesheet_html
+from cache import format_age
+from config import env_float, env_int
+from engine import build_booking_link, city_airports, itinerary_trip, search_flights, start_itinerary
+from fare_history import fare_history
+from fare_matrix import FareMatrixJob, fare_heatmap_html, flex_dates, matrix_cells
+from flights import extract_top_flights, fetch_flights, flight_cache, quota_refusal, rank_flights
+from fx import FX_BASE, convert_prices, currency_symbol, format_money, rate_table
+from http_clients import openai_client, pool_stats
+from itinerary import format_stats, is_outline_only, itinerary_markdown
+from metrics import start_metrics_server
+from quota import QuotaExceeded, use_session
+from timings import span, trace, use_trace
 
 # ================== CONFIG & KEYS ==================
 
@@ -17,368 +34,112 @@ if not SERPAPI_KEY:
 if not OPENAI_API_KEY:
     st.warning("⚠️ OPENAI_API_KEY not set in secrets. AI itinerary will fail.")
 
-client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
-
-# ================== CITY → IATA MAP + PRESET CITIES ==================
-
-CITY_IATA_MAP = {
-    "hyderabad": [("Hyderabad - Rajiv Gandhi International", "HYD")],
-    "mumbai": [("Mumbai - Chhatrapati Shivaji Maharaj", "BOM")],
-    "delhi": [("Delhi - Indira Gandhi International", "DEL")],
-    "bangalore": [("Bengaluru - Kempegowda International", "BLR")],
-    "bengaluru": [("Bengaluru - Kempegowda International", "BLR")],
-    "chennai": [("Chennai International", "MAA")],
-    "kolkata": [("Kolkata - Netaji Subhas Chandra Bose", "CCU")],
-    "pune": [("Pune Airport", "PNQ")],
-    "ahmedabad": [("Ahmedabad - Sardar Vallabhbhai Patel", "AMD")],
-    "kochi": [("Kochi - Cochin International", "COK")],
-}
+# Prometheus-style metrics on http://127.0.0.1:$METRICS_PORT/metrics (off by default)
+start_metrics_server(env_int("METRICS_PORT", 0))
 
-PRESET_CITIES = list(CITY_IATA_MAP.keys())
-CITY_LABELS = {
-    "hyderabad": "Hyderabad",
-    "mumbai": "Mumbai",
-    "delhi": "Delhi",
-    "bangalore": "Bengaluru",
-    "bengaluru": "Bengaluru",
-    "chennai": "Chennai",
-    "kolkata": "Kolkata",
-    "pune": "Pune",
-    "ahmedabad": "Ahmedabad",
-    "kochi": "Kochi",
-}
+# Per-session SerpAPI / OpenAI budgets (quota.py) are keyed on this
+use_session(st.session_state.setdefault("quota_session", uuid.uuid4().hex))
 
-def get_airport_options(city_key: str):
-    return CITY_IATA_MAP.get(city_key.strip().lower(), [])
-
-# ================== GLOBAL STYLES (INCOGNITO) ==================
+# ================== AIRPORT INDEX + PRESET CITIES ==================
+# Cities and airports come from data/airports.csv (or AIRPORTS_CSV), indexed
+# once per process; see airports.py. Presets are what the pickers show before
+# the user types anything.
 
-st.markdown(
-    """
-    <style>
-    :root {
-        --bg-main: #202124;
-        --bg-panel: #292a2d;
-        --bg-elevated: #303134;
-        --border-subtle: #3c4043;
-        --text-main: #e8eaed;
-        --text-muted: #9aa0a6;
-        --accent: #8ab4f8;
-        --accent-soft: rgba(138, 180, 248, 0.18);
-    }
+PRESET_CITIES = preset_cities()
 
-    body {
-        background: var(--bg-main);
-        color: var(--text-main);
-        font-family: system-ui, -apple-system, BlinkMacSystemFont, "Segoe UI", sans-serif;
-    }
 
-    .main .block-container {
-        padding-top: 16px;
-        max-width: 1180px;
-    }
+def city_options(query: str, default: str):
+    # Matches for the typed text, or the presets when the box is empty
+    options = airport_index().search_cities(query) if query.strip() else list(PRESET_CITIES)
+    if not query.strip() and default not in options:
+        options.insert(0, default)
+    return options
 
-    /* HERO */
-    .hero {
-        border-radius: 20px;
-        padding: 24px 32px 56px 32px;
-        background:
-            linear-gradient(120deg, rgba(23,24,28,0.95) 0%, rgba(23,24,28,0.6) 35%, rgba(23,24,28,0.3) 100%),
-            url("https://images.pexels.com/photos/457882/pexels-photo-457882.jpeg") center/cover no-repeat;
-        color: var(--text-main);
-        position: relative;
-        margin-bottom: 40px;
-        box-shadow: 0 20px 50px rgba(0, 0, 0, 0.75);
-        border: 1px solid rgba(255, 255, 255, 0.03);
-    }
-    .hero-title {
-        font-size: 34px;
-        font-weight: 700;
-        letter-spacing: 0.01em;
-    }
-    .hero-sub {
-        font-size: 15px;
-        margin-top: 6px;
-        color: var(--text-muted);
-    }
-    .popular-wrapper {
-        margin-top: 22px;
-        display: flex;
-        gap: 14px;
-    }
-    .popular-card {
-        width: 180px;
-        border-radius: 16px;
-        background: #171717;
-        color: var(--text-main);
-        padding: 10px;
-        box-shadow: 0 10px 26px rgba(0, 0, 0, 0.8);
-        border: 1px solid rgba(255, 255, 255, 0.06);
-        transition: transform 0.16s ease-out, box-shadow 0.16s ease-out;
-    }
-    .popular-card:hover {
-        transform: translateY(-3px);
-        box-shadow: 0 16px 40px rgba(0, 0, 0, 0.9);
-    }
-    .popular-card img {
-        border-radius: 12px;
-        width: 100%;
-        height: 90px;
-        object-fit: cover;
-        margin-bottom: 8px;
-    }
-    .search-card {
-        position: absolute;
-        left: 32px;
-        right: 32px;
-        bottom: -32px;
-        background: rgba(32, 33, 36, 0.98);
-        border-radius: 18px;
-        padding: 10px 20px;
-        box-shadow: 0 18px 45px rgba(0, 0, 0, 0.9);
-        border: 1px solid var(--border-subtle);
-        backdrop-filter: blur(10px);
-    }
-    .search-label {
-        font-size: 11px;
-        text-transform: uppercase;
-        letter-spacing: 0.11em;
-        color: var(--text-muted);
-        margin-bottom: 4px;
-    }
-
-    /* SIDEBAR */
-    section[data-testid="stSidebar"] {
-        background: #171717;
-    }
-    section[data-testid="stSidebar"] > div {
-        padding-top: 16px;
-    }
-    .sidebar-card {
-        background: var(--bg-panel);
-        border-radius: 18px;
-        padding: 18px 14px 22px 14px;
-        box-shadow: 0 18px 50px rgba(0, 0, 0, 0.85);
-        border: 1px solid var(--border-subtle);
-    }
-    .sidebar-title {
-        display: flex;
-        align-items: center;
-        gap: 8px;
-        font-size: 17px;
-        font-weight: 600;
-        color: var(--text-main);
-        margin-bottom: 8px;
-    }
-    .sidebar-title-pill {
-        background: var(--accent-soft);
-        color: var(--accent);
-        border-radius: 999px;
-        padding: 4px 10px;
-        font-size: 11px;
-        text-transform: uppercase;
-        letter-spacing: 0.12em;
-        border: 1px solid rgba(138, 180, 248, 0.6);
-    }
-    .sidebar-section-label {
-        font-size: 11px;
-        text-transform: uppercase;
-        letter-spacing: 0.11em;
-        color: var(--text-muted);
-        margin-top: 14px;
-        margin-bottom: 4px;
-    }
-    .sidebar-card label {
-        color: var(--text-main) !important;
-        font-size: 14px;
-    }
-
-    /* INPUTS / SELECTS / SLIDER */
-    .stTextInput > div > div > input,
-    .stDateInput > div > input,
-    .stSelectbox > div > div {
-        background-color: var(--bg-elevated) !important;
-        color: var(--text-main) !important;
-        border-radius: 10px !important;
-        border: 1px solid var(--border-subtle) !important;
-    }
-    .stSelectbox > div > div > span {
-        color: var(--text-main) !important;
-    }
-    .stSlider > div > div > div {
-        background-color: #3c4043 !important;
-    }
-    .stSlider > div > div > div > div[role="slider"] {
-        background-color: var(--accent) !important;
-    }
-
-    /* PRIMARY BUTTONS */
-    .stButton button {
-        background: linear-gradient(135deg, var(--accent) 0%, #c58af9 100%) !important;
-        color: #0b1020 !important;
-        border-radius: 999px !important;
-        border: none !important;
-        font-weight: 600 !important;
-        box-shadow: 0 10px 30px rgba(0, 0, 0, 0.9) !important;
-        transition: transform 0.14s ease-out, box-shadow 0.14s ease-out, filter 0.14s ease-out;
-    }
-    .stButton button:hover {
-        transform: translateY(-1px);
-        box-shadow: 0 16px 40px rgba(0, 0, 0, 1) !important;
-        filter: brightness(1.05);
-    }
-
-    /* FLIGHT SECTION TITLE */
-    .flight-section-title {
-        background: var(--accent-soft);
-        color: var(--accent);
-        display: inline-flex;
-        align-items: center;
-        gap: 6px;
-        padding: 6px 14px;
-        border-radius: 999px;
-        font-weight: 600;
-        margin-bottom: 14px;
-        border: 1px solid rgba(138, 180, 248, 0.7);
-    }
-
-    /* FLIGHT CARDS */
-    .flight-card {
-        border-radius: 16px;
-        padding: 16px;
-        text-align: center;
-        background: var(--bg-panel);
-        margin-bottom: 18px;
-        box-shadow: 0 14px 32px rgba(0, 0, 0, 0.9);
-        border: 1px solid var(--border-subtle);
-        color: var(--text-main);
-        transition: transform 0.18s ease-out, box-shadow 0.18s ease-out;
-    }
-    .flight-card:hover {
-        transform: translateY(-3px) scale(1.01);
-        box-shadow: 0 20px 45px rgba(0, 0, 0, 1);
-    }
+# ================== GLOBAL STYLES (INCOGNITO) ==================
 
-    /* FOOTER */
-    .footer-strip {
-        margin-top: 24px;
-        padding: 8px 14px;
-        border-radius: 999px;
-        background: #171717;
-        color: var(--text-muted);
-        font-size: 12px;
-        display: inline-flex;
-        align-items: center;
-        gap: 8px;
-        border: 1px solid var(--border-subtle);
-    }
-    /* Custom airplane cursor for the whole app */
-    html, body, * {
-        cursor: url("https://icons.iconarchive.com/icons/designbolts/disney-planes-2013/72/Dusty-Plane-icon.png") 36 36, auto;
-    }
-    </style>
-    """,
-    unsafe_allow_html=True,
-)
+# Compiled once per process into a stylesheet the browser caches (assets.py)
+st.markdown(stylesheet_html(), unsafe_allow_html=True)
 
 # ================== FLIGHT + AI HELPERS ==================
 
-def format_datetime(iso_string: str) -> str:
-    try:
-        dt = datetime.strptime(iso_string, "%Y-%m-%d %H:%M")
-        return dt.strftime("%b-%d, %Y | %I:%M %p")
-    except Exception:
-        return "N/A"
-
-def fetch_flights(source_code, destination_code, dep_date, ret_date):
-    params = {
-        "engine": "google_flights",
-        "departure_id": source_code,
-        "arrival_id": destination_code,
-        "outbound_date": str(dep_date),
-        "return_date": str(ret_date),
-        "currency": "INR",
-        "hl": "en",
-        "api_key": SERPAPI_KEY,
-    }
-    search = GoogleSearch(params)
-    return search.get_dict()
-
-def extract_top_flights(flight_data, max_results=8):
-    best_flights = flight_data.get("best_flights", [])
-    other_flights = flight_data.get("other_flights", [])
-    all_flights = best_flights + other_flights
-
-    if not all_flights:
-        return []
+FLIGHT_CARD = (
+    '<div class="flight-card">'
+    '<img src="{logo}" alt="{airline} logo" />'
+    "<h3>{airline}</h3>"
+    "<p><strong>Departure:</strong> {departure}</p>"
+    "<p><strong>Arrival:</strong> {arrival}</p>"
+    "<p><strong>Duration:</strong> {duration} min</p>"
+    '<h2 class="flight-price">{price}</h2>'
+    '<a class="book-btn" href="{link}" target="_blank">🔗 Book on Google Flights</a>'
+    "</div>"
+)
 
-    sorted_flights = sorted(
-        all_flights,
-        key=lambda x: x.get("price", float("inf"))
-    )
-    return sorted_flights[:max_results]
 
-def build_booking_link(flight, source, destination, departure_date, return_date):
-    token = flight.get("booking_token")
-    if token:
-        return f"https://www.google.com/travel/flights?tfs={token}"
-    return (
-        "https://www.google.com/travel/flights?"
-        f"q=flights+from+{source}+to+{destination}"
-        f"+on+{departure_date}+return+{return_date}"
-    )
+def flight_cards_html(flights, results, prices=None, currency=FX_BASE):
+    # `prices`: the cards' fares in `currency`, converted by the caller
+    cards = []
+    for i, f in enumerate(flights):
+        price = prices[i] if prices is not None else f.price
+        link = build_booking_link(
+            f, f.departure_code or results["source"], f.arrival_code or results["destination"],
+            results["departure_date"], results["return_date"],
+        )
+        cards.append(FLIGHT_CARD.format(
+            logo=html.escape(logo_url(f.logo)),
+            airline=html.escape(f.airline),
+            departure=html.escape(f.departure_time),
+            arrival=html.escape(f.arrival_time),
+            duration=f.duration if f.has_duration else "N/A",
+            price=format_money(price, currency) if f.has_price else "Not Available",
+            link=html.escape(link),
+        ))
+    return '<div class="flight-grid">' + "".join(cards) + "</div>"
+
+
+def display_currency():
+    # (RateTable or None, currency) for prices on screen: INR unless the converter is on
+    state = st.session_state
+    if not state.get("currency_converter") or state.get("display_currency", FX_BASE) == FX_BASE:
+        return None, FX_BASE
+    return rate_table(), state["display_currency"]
 
 # ================== HERO + CITY DROPDOWNS ==================
 
 with st.container():
-    st.markdown(
-        """
-        <div class="hero">
-            <div class="hero-title">Spend your vacation<br>with our activities</div>
-            <div class="hero-sub">
-                Mountains • Plains • Beaches — curated trips tailored to your mood.
-            </div>
-            <div class="popular-wrapper">
-                <div class="popular-card">
-                    <img src="https://images.pexels.com/photos/325807/pexels-photo-325807.jpeg" />
-                    <strong>Trip to Scotland</strong><br>
-                    <span style="font-size:12px;color:#9aa0a6;">31 people going</span>
-                </div>
-                <div class="popular-card">
-                    <img src="https://images.pexels.com/photos/261102/pexels-photo-261102.jpeg" />
-                    <strong>Trip to Egypt</strong><br>
-                                        <span style="font-size:12px;color:#9aa0a6;">27 people going</span>
-                </div>
-                <div class="popular-card">
-                    <img src="https://images.pexels.com/photos/460672/pexels-photo-460672.jpeg" />
-                    <strong>Trip to Greece</strong><br>
-                    <span style="font-size:12px;color:#9aa0a6;">29 people going</span>
-                </div>
-            </div>
-            <div class="search-card">
-        """,
-        unsafe_allow_html=True,
-    )
+    st.markdown(page_html("hero.html"), unsafe_allow_html=True)
 
     sc1, sc2, sc3, sc4, sc5 = st.columns([2.2, 2.2, 1.6, 1.6, 1.1])
 
     with sc1:
         st.markdown('<div class="search-label">From (city)</div>', unsafe_allow_html=True)
+        from_query = st.text_input(
+            "from_query", key="from_query", placeholder="Type a city, airport or code",
+            label_visibility="collapsed",
+        )
+        from_default = airport_index().resolve_city("kochi")
+        from_options = city_options(from_query, from_default)
         source_city_key = st.selectbox(
             "from_city",
-            PRESET_CITIES,
-            index=PRESET_CITIES.index("kochi") if "kochi" in PRESET_CITIES else 0,
-            format_func=lambda k: CITY_LABELS.get(k, k.title()),
+            from_options,
+            index=from_options.index(from_default) if from_default in from_options else 0,
+            format_func=airport_index().city_label,
             label_visibility="collapsed",
         )
 
     with sc2:
         st.markdown('<div class="search-label">To (city)</div>', unsafe_allow_html=True)
+        to_query = st.text_input(
+            "to_query", key="to_query", placeholder="Type a city, airport or code",
+            label_visibility="collapsed",
+        )
+        # A destination picked from the "Anywhere" results becomes the default
+        to_default = st.session_state.get("picked_destination") or airport_index().resolve_city("delhi")
+        to_options = city_options(to_query, to_default) + [ANYWHERE]
         destination_city_key = st.selectbox(
             "to_city",
-            PRESET_CITIES,
-            index=PRESET_CITIES.index("delhi") if "delhi" in PRESET_CITIES else 0,
-            format_func=lambda k: CITY_LABELS.get(k, k.title()),
+            to_options,
+            index=to_options.index(to_default) if to_default in to_options else 0,
+            format_func=lambda key: "🌍 Anywhere" if key == ANYWHERE else airport_index().city_label(key),
             label_visibility="collapsed",
         )
 
@@ -397,18 +158,28 @@ with st.container():
     st.markdown("</div></div>", unsafe_allow_html=True)
 
 # Human‑readable city names for display
-source_city = CITY_LABELS.get(source_city_key, source_city_key.title())
-destination_city = CITY_LABELS.get(destination_city_key, destination_city_key.title())
+anywhere = destination_city_key == ANYWHERE
+source_city = airport_index().city_label(source_city_key) if source_city_key else "Hyderabad"
+if anywhere:
+    destination_city, destination_codes = "Anywhere", ["ANY"]
+else:
+    destination_city = airport_index().city_label(destination_city_key) if destination_city_key else "Delhi"
+    destination_codes = city_airports(destination_city_key, "DEL")
 
-# Automatically pick IATA from mapping (first airport per city)
-src_airports = get_airport_options(source_city_key)
-dst_airports = get_airport_options(destination_city_key)
-source = src_airports[0][1] if src_airports else "HYD"
-destination = dst_airports[0][1] if dst_airports else "DEL"
+source_codes = city_airports(source_city_key, "HYD")
+source, destination = source_codes[0], destination_codes[0]
 
 # ================== SIDEBAR ==================
+# The sidebar, the trip panel and each results section are fragments:
+# touching a widget inside one reruns only that function and sends only its
+# elements, instead of re-executing the whole script (styles, hero, results).
 
-with st.sidebar:
+def request_app_rerun():
+    # on_change for widgets whose value is also shown outside their fragment
+    st.session_state["_rerun_app"] = True
+
+@st.fragment
+def render_sidebar():
     st.markdown(
         """
         <div class="sidebar-card">
@@ -421,13 +192,19 @@ with st.sidebar:
     )
 
     st.markdown('<div class="sidebar-section-label">Budget preference</div>', unsafe_allow_html=True)
-    budget = st.radio("Budget preference", ["Economy", "Standard", "Luxury"], index=0, label_visibility="collapsed")
+    st.radio(
+        "Budget preference", ["Economy", "Standard", "Luxury"], index=0,
+        key="budget", on_change=request_app_rerun, label_visibility="collapsed",
+    )
 
     st.markdown('<div class="sidebar-section-label">Flight class</div>', unsafe_allow_html=True)
-    flight_class = st.radio("Flight class", ["Economy", "Business", "First Class"], index=0, label_visibility="collapsed")
+    st.radio(
+        "Flight class", ["Economy", "Business", "First Class"], index=0,
+        key="flight_class", label_visibility="collapsed",
+    )
 
     st.markdown('<div class="sidebar-section-label">Preferred hotel rating</div>', unsafe_allow_html=True)
-    hotel_rating = st.selectbox("Hotel rating", ["Any", "3⭐", "4⭐", "5⭐"], label_visibility="collapsed")
+    st.selectbox("Hotel rating", ["Any", "3⭐", "4⭐", "5⭐"], key="hotel_rating", label_visibility="collapsed")
 
     st.markdown('<div class="sidebar-section-label">Packing checklist</div>', unsafe_allow_html=True)
     packing_items = {
@@ -441,220 +218,448 @@ with st.sidebar:
         st.checkbox(item, value=checked)
 
     st.markdown('<div class="sidebar-section-label">Travel essentials</div>', unsafe_allow_html=True)
-    visa_required = st.checkbox("🛃 Check Visa Requirements")
-    travel_insurance = st.checkbox("🛡️ Get Travel Insurance")
-    currency_converter = st.checkbox("💱 Currency Exchange Rates")
+    st.checkbox("🛃 Check Visa Requirements", key="visa_required")
+    st.checkbox("🛡️ Get Travel Insurance", key="travel_insurance")
+    st.checkbox("💱 Currency Exchange Rates", key="currency_converter", on_change=request_app_rerun)
+    if st.session_state.get("currency_converter"):
+        # Fares stay in INR upstream; switching converts what is on screen (fx.py)
+        table = rate_table()
+        st.selectbox(
+            "Show prices in", table.codes, index=table.codes.index("USD") if "USD" in table.codes else 0,
+            key="display_currency", on_change=request_app_rerun,
+        )
+        shown = st.session_state["display_currency"]
+        if shown != FX_BASE:
+            as_of = time.strftime("%d %b %Y", time.gmtime(table.as_of))
+            st.caption(
+                f"1 {shown} = ₹{1 / table.rate(shown):,.2f} · "
+                + (f"rates of {as_of}" if table.source == "live" else f"offline rates of {as_of}")
+            )
 
     st.markdown("</div>", unsafe_allow_html=True)
 
-# ================== 2‑COLUMN MAIN LAYOUT ==================
+    if st.session_state.pop("_rerun_app", False):
+        st.rerun()
 
-main_col, summary_col = st.columns([3, 1.1])
+with st.sidebar:
+    render_sidebar()
+
+# ================== 2‑COLUMN MAIN LAYOUT ==================
 
-with main_col:
-    st.markdown("### 😴 Trip details")
+@st.fragment
+def render_trip_panel():
+    main_col, summary_col = st.columns([3, 1.1])
 
-    td_left, td_right = st.columns([1.1, 1])
-    with td_left:
-        num_days = st.slider("Trip duration (days)", 1, 14, 5)
-        travel_theme = st.selectbox(
-            "Select your travel theme",
-            ["💑 Couple Getaway", "👨‍👩‍👧‍👦 Family Vacation", "🏔️ Adventure Trip", "🧳 Solo Exploration"],
+    with main_col:
+        st.markdown("### 😴 Trip details")
+
+        td_left, td_right = st.columns([1.1, 1])
+        with td_left:
+            num_days = st.slider("Trip duration (days)", 1, 14, 5, key="num_days")
+            travel_theme = st.selectbox(
+                "Select your travel theme",
+                ["💑 Couple Getaway", "👨‍👩‍👧‍👦 Family Vacation", "🏔️ Adventure Trip", "🧳 Solo Exploration"],
+                key="travel_theme",
+            )
+            st.select_slider(
+                "Flexible dates (± days)",
+                options=[0, 1, 2, 3],
+                value=0,
+                key="flex_days",
+                help="Also compare fares for nearby departure and return dates.",
+            )
+        with td_right:
+            st.text_area(
+                "What activities do you enjoy?",
+                "Relaxing on the beach, exploring historical sites",
+                height=90,
+                key="activity_preferences",
+            )
+
+    with summary_col:
+        st.markdown(
+            """
+            <div style="
+                background:#292a2d;
+                border-radius:16px;
+                padding:14px 14px 16px 14px;
+                border:1px solid #3c4043;
+                box-shadow:0 10px 30px rgba(0,0,0,0.8);
+                font-size:13px;
+            ">
+                <div style="font-weight:600;margin-bottom:6px;">🧾 Trip summary</div>
+            """,
+            unsafe_allow_html=True,
         )
-    with td_right:
-        activity_preferences = st.text_area(
-            "What activities do you enjoy?",
-            "Relaxing on the beach, exploring historical sites",
-            height=90,
+        st.markdown(f"- From: **{source_city} ({source})**", unsafe_allow_html=True)
+        st.markdown(f"- To: **{destination_city} ({destination})**", unsafe_allow_html=True)
+        st.markdown(f"- Dates: **{departure_date} → {return_date}**", unsafe_allow_html=True)
+        st.markdown(f"- Duration: **{num_days} days**", unsafe_allow_html=True)
+        st.markdown(f"- Budget: **{st.session_state.get('budget', 'Economy')}**", unsafe_allow_html=True)
+        st.markdown(f"- Theme: **{travel_theme}**", unsafe_allow_html=True)
+        st.markdown(
+            """
+            <hr style="border:0;border-top:1px solid #3c4043;margin:8px 0 6px 0;">
+            <div style="font-size:12px;color:#9aa0a6;">
+                ✨ Live fares + AI itinerary.<br>
+                Perfect for quick trip decisions.
+            </div>
+            </div>
+            """,
+            unsafe_allow_html=True,
         )
 
-with summary_col:
-    st.markdown(
-        """
-        <div style="
-            background:#292a2d;
-            border-radius:16px;
-            padding:14px 14px 16px 14px;
-            border:1px solid #3c4043;
-            box-shadow:0 10px 30px rgba(0,0,0,0.8);
-            font-size:13px;
-        ">
-            <div style="font-weight:600;margin-bottom:6px;">🧾 Trip summary</div>
-        """,
-        unsafe_allow_html=True,
-    )
-    st.markdown(f"- From: **{source_city} ({source})**", unsafe_allow_html=True)
-    st.markdown(f"- To: **{destination_city} ({destination})**", unsafe_allow_html=True)
-    st.markdown(f"- Dates: **{departure_date} → {return_date}**", unsafe_allow_html=True)
-    st.markdown(f"- Duration: **{num_days} days**", unsafe_allow_html=True)
-    st.markdown(f"- Budget: **{budget}**", unsafe_allow_html=True)
-    st.markdown(f"- Theme: **{travel_theme}**", unsafe_allow_html=True)
-    st.markdown(
-        """
-        <hr style="border:0;border-top:1px solid #3c4043;margin:8px 0 6px 0;">
-        <div style="font-size:12px;color:#9aa0a6;">
-            ✨ Live fares + AI itinerary.<br>
-            Perfect for quick trip decisions.
-        </div>
-        </div>
-        """,
-        unsafe_allow_html=True,
+render_trip_panel()
+
+# ================== SEARCH + BACKGROUND JOBS ==================
+
+def search_signature():
+    # Everything a search's background work depends on, read from widget state
+    # so fragments see edits made since the last full run.
+    state = st.session_state
+    return (
+        source, destination, str(departure_date), str(return_date),
+        state["num_days"], state["travel_theme"], state["activity_preferences"],
+        state["budget"], state["flight_class"], state["hotel_rating"],
+        state["visa_required"], state["travel_insurance"], state["flex_days"],
     )
 
-# ================== MAIN ACTION ==================
+def cancel_stale_jobs(force=False):
+    # A new search, or edited inputs, make in-flight itinerary / fare-matrix
+    # jobs obsolete, so they are cancelled instead of burning tokens and quota.
+    signature = search_signature()
+    for job_key in ("itinerary_job", "fare_matrix_job", "anywhere_job"):
+        job = st.session_state.get(job_key)
+        if job is not None and not job.done and (force or job.signature != signature):
+            job.cancel()
+
+def run_anywhere_search():
+    # Cheapest fare to every candidate city; the itinerary waits for a pick
+    state = st.session_state
+    for job_key in ("itinerary_job", "fare_matrix_job"):
+        state.pop(job_key, None)
+    lookup_timeout = env_float("ANYWHERE_LOOKUP_TIMEOUT", 20)
+    top_k = env_int("ANYWHERE_TOP_K", 5)
+
+    def lookup(city_key):
+        return destination_fare(
+            city_key, source, departure_date, return_date, top_k=top_k,
+            timeout=lookup_timeout, api_key=SERPAPI_KEY,
+        )
 
-if search_clicked:
-    with main_col:
-        # ----- Fetch flights -----
+    state["anywhere_job"] = AnywhereJob(
+        anywhere_destinations(source_city_key),
+        lookup,
+        signature=search_signature(),
+        max_concurrency=env_int("ANYWHERE_CONCURRENCY", 6),
+        lookup_timeout=lookup_timeout,
+        total_timeout=env_float("ANYWHERE_TIMEOUT", 60),
+    )
+    state["search_results"] = {
+        "anywhere": True,
+        "source": source,
+        "source_city": source_city,
+        "departure_date": departure_date,
+        "return_date": return_date,
+        "top_k": top_k,
+    }
+
+def run_search(force_itinerary=False):
+    state = st.session_state
+    if anywhere:
+        run_anywhere_search()
+        return
+    state.pop("anywhere_job", None)
+    signature = search_signature()
+    num_days, flex_days = state["num_days"], state["flex_days"]
+    # One time budget for the whole search: the flight lookup gets a share of
+    # it and the itinerary whatever is left (see aio.py)
+    search_deadline = Deadline(env_float("SEARCH_DEADLINE", 90))
+
+    # ----- Fetch flights (every source x destination airport pair) -----
+    with st.columns([3, 1.1])[0]:
         with st.spinner("✈️ Finding the best real-time flight options for you..."):
-            try:
-                flight_data = fetch_flights(source, destination, departure_date, return_date)
-                cheapest_flights = extract_top_flights(flight_data, max_results=8)
-            except Exception as e:
-                st.error(f"Error fetching flights: {e}")
-                cheapest_flights = []
-
-        # Prepare summary for AI
-        flight_summary = "No flights found."
-        min_price = max_price = avg_price = None
+            search = search_flights(
+                source_codes, destination_codes, departure_date, return_date,
+                api_key=SERPAPI_KEY, search_deadline=search_deadline,
+            )
+    cheapest_flights = search.flights
+
+    # ----- Start slow work in the background -----
+    state.pop("itinerary_job", None)
+    state.pop("fare_matrix_job", None)
+
+    cached_itinerary = itinerary_notice = None
+    if OPENAI_API_KEY:
+        # Shared per process (see http_clients.py), created on the first search
+        # rather than on page load; SERPAPI_BASE_URL / OPENAI_BASE_URL point the
+        # clients elsewhere, e.g. at the stand-ins in benchmarks/stubs.py.
+        client = openai_client(OPENAI_API_KEY)
+        trip = itinerary_trip(
+            search, num_days, state["travel_theme"], source_city, destination_city,
+            state["activity_preferences"], state["budget"], state["flight_class"], state["hotel_rating"],
+            state["visa_required"], state["travel_insurance"],
+        )
+        try:
+            cached_itinerary, job = start_itinerary(
+                client, trip, search, signature=signature, force=force_itinerary, search_deadline=search_deadline,
+            )
+        except QuotaExceeded as e:
+            itinerary_notice, job = str(e), None
+        if job is not None:
+            state["itinerary_job"] = job
+
+    dep_dates = ret_dates = []
+    if flex_days:
+        dep_dates, ret_dates = flex_dates(departure_date, return_date, flex_days)
+        cell_timeout = env_float("FARE_MATRIX_CELL_TIMEOUT", 20)
+        # The matrix follows the airport pair the cheapest fare came from
+        route = (source, destination)
         if cheapest_flights:
-            lines, prices = [], []
-            for f in cheapest_flights:
-                p = f.get("price")
-                if isinstance(p, (int, float)):
-                    prices.append(p)
-                lines.append(
-                    f"- {f.get('airline', 'Airline')} | ₹{p} | {f.get('total_duration', 'N/A')} min"
-                )
-            flight_summary = "\n".join(lines)
-            if prices:
-                min_price, max_price = min(prices), max(prices)
-                avg_price = sum(prices) / len(prices)
-
-        # ----- AI itinerary -----
-        ai_itinerary = "AI itinerary not available (missing OPENAI_API_KEY)."
-        if client:
-            with st.spinner("🤖 Our advanced AI is crafting your personalized travel plan..."):
-                try:
-                    if min_price is not None:
-                        budget_hint = (
-                            f"Flight price range (from live data): min ₹{min_price}, "
-                            f"max ₹{max_price}, avg ₹{int(avg_price)}."
-                        )
-                    else:
-                        budget_hint = "No flight price data available."
-
-                    prompt = f"""
-You are an expert travel planner for Indian travellers.
-
-Create a detailed {num_days}-day itinerary for a {travel_theme.lower()} trip
-from {source_city} ({source}) to {destination_city} ({destination}).
-
-Traveller preferences:
-- Activities: {activity_preferences}
-- Budget level: {budget}
-- Flight class: {flight_class}
-- Hotel rating preference: {hotel_rating}
-- Visa required: {visa_required}
-- Travel insurance: {travel_insurance}
-
-Real flight options (from SerpAPI / Google Flights):
-{flight_summary}
-
-Cost information:
-{budget_hint}
-
-Use the flight price range and budget level to choose realistic hotels, activities,
-and total budget in INR.
-
-Return a Markdown-formatted answer with:
-- Overview
-- Best flight choice + reasoning
-- 3 hotel suggestions (area + rough nightly price)
-- Day-by-day itinerary ({num_days} days; morning/afternoon/evening)
-- Cost breakdown (flights, hotels, food/local travel, activities)
-- One-line summary about whether it fits a typical {budget} Indian traveller.
-                    """
-                    completion = client.chat.completions.create(
-                        model="gpt-4o-mini",
-                        messages=[
-                            {
-                                "role": "system",
-                                "content": "You are a helpful, detail-oriented travel planner for Indian travellers.",
-                            },
-                            {"role": "user", "content": prompt},
-                        ],
-                        temperature=0.7,
-                    )
-                    ai_itinerary = completion.choices[0].message.content
-                except Exception as e:
-                    ai_itinerary = f"AI Error: {e}"
+            route = (
+                cheapest_flights[0].departure_code or source,
+                cheapest_flights[0].arrival_code or destination,
+            )
+
+        def cheapest_fare(dep, ret):
+            data, _ = fetch_flights(*route, dep, ret, timeout=cell_timeout, api_key=SERPAPI_KEY)
+            refused = quota_refusal(data)
+            if refused is not None:
+                raise refused  # marked in the grid, not shown as "no fare"
+            top = extract_top_flights(data, max_results=1)
+            return top[0].price if top and top[0].has_price else None
+
+        state["fare_matrix_job"] = FareMatrixJob(
+            matrix_cells(dep_dates, ret_dates),
+            cheapest_fare,
+            signature=signature,
+            max_concurrency=env_int("FARE_MATRIX_CONCURRENCY", 6),
+            cell_timeout=cell_timeout,
+            total_timeout=env_float("FARE_MATRIX_TIMEOUT", 45),
+        )
+
+    state["search_results"] = {
+        "anywhere": False,
+        "source": source,
+        "destination": destination,
+        "pairs": search.pairs,
+        "failed_pairs": search.failed_pairs,
+        "history_route": search.history_route,
+        "departure_date": departure_date,
+        "return_date": return_date,
+        "error": search.error,
+        "flights": cheapest_flights,
+        "records": search.records,
+        "cache_info": search.cache_info,
+        "min_price": search.min_price,
+        "max_price": search.max_price,
+        "avg_price": search.avg_price,
+        "flex_days": flex_days,
+        "num_days": num_days,
+        "dep_dates": dep_dates,
+        "ret_dates": ret_dates,
+        "cached_itinerary": cached_itinerary,
+        "itinerary_notice": itinerary_notice,
+    }
+
+# ================== RESULTS ==================
+
+FLIGHT_SORTS = {
+    "price": "Cheapest",
+    "duration": "Fastest",
+    "stops": "Fewest stops",
+    "pareto": "Best trade-off (price / time / stops)",
+}
+DEPARTURE_WINDOW_LABELS = {
+    None: "Any time",
+    "morning": "Morning (5am–12pm)",
+    "afternoon": "Afternoon (12–5pm)",
+    "evening": "Evening (5–9pm)",
+    "night": "Night (9pm–5am)",
+}
+
+def price_history(results):
+    # Past searches for this city pair and these dates, not just today's 8 cards
+    with span("fare_history") as s:
+        history = fare_history().route_analytics(
+            [results["history_route"]], results["departure_date"], results["return_date"]
+        )
+        s.set(fetches=history.fetches if history else 0)
+    return history
+
+
+def render_price_history(history, min_price, prices, currency):
+    # `prices`: the history columns in `currency` (see render_flight_results)
+    if history is None:
+        st.caption("📈 Price history appears once this trip (route and dates) has been searched a few times.")
+        return
+
+    low_label, median_label = "Cheapest fare", "Median cheapest fare"
+    if currency != FX_BASE:
+        low_label, median_label = f"{low_label} ({currency})", f"{median_label} ({currency})"
+    st.line_chart(
+        {
+            "date": history.days.astype("datetime64[D]"),
+            low_label: prices["daily_low"],
+            median_label: prices["daily_median"],
+        },
+        x="date",
+        y=[low_label, median_label],
+        height=220,
+    )
+    p25, p50, p75 = (format_money(v, currency) for v in prices["percentiles"])
+    verdict = {
+        "good": "🟢 Good price",
+        "typical": "🟡 Typical price",
+        "high": "🔴 High price",
+    }[history.verdict(min_price)]
+    caption = (
+        f"{verdict}: {format_money(prices['summary'][0], currency)} is at or below the best fare of "
+        f"{1 - history.percentile_rank(min_price):.0%} of {history.fetches} past searches · "
+        f"usual range {p25}–{p75}, median {p50}"
+    )
+    if history.trend_per_week is not None:
+        caption += f" · trend {history.trend_per_week:+.1%} per week"
+    st.caption(caption)
+
+
+@st.fragment
+def render_flight_results():
+    results = st.session_state.get("search_results")
+    if not results or results["anywhere"]:
+        return
+    cheapest_flights = results["flights"]
+    cache_info = results["cache_info"]
+    min_price, max_price, avg_price = results["min_price"], results["max_price"], results["avg_price"]
+
+    with st.columns([3, 1.1])[0]:
+        if results["error"]:
+            st.error(results["error"])
 
         # ----- Flights display (rows of 3) -----
         st.markdown(
             '<div class="flight-section-title">✈️ Cheapest Flight Options (Live from SerpAPI)</div>',
             unsafe_allow_html=True,
         )
+        if cache_info is not None:
+            stats = flight_cache().stats()
+            if cache_info.state == "miss":
+                freshness = "fetched live from SerpAPI"
+            elif cache_info.state == "shared":
+                freshness = "fetched live, shared with an identical search in flight"
+            elif cache_info.state == "stale":
+                freshness = f"cached {format_age(cache_info.age)} ago, refreshing in background"
+            elif cache_info.state == "expired":
+                freshness = f"cached {format_age(cache_info.age)} ago (live search paused: search quota reached)"
+            else:
+                freshness = f"cached {format_age(cache_info.age)} ago"
+            caption = (
+                f"🗄️ Fares {freshness} · cache hits {stats['hits'] + stats['stale_hits']}"
+                f" / misses {stats['misses']} ({stats['hit_ratio']:.0%} hit ratio)"
+            )
+            if stats["coalesced"]:
+                caption += f" · {stats['coalesced']} fetches shared with identical searches"
+            st.caption(caption)
+        if len(results["pairs"]) > 1:
+            failed = results["failed_pairs"]
+            note = f"🛫 Searched {len(results['pairs'])} airport pairs"
+            if failed:
+                note += " · nothing back from " + ", ".join(f"{s}→{d}" for s, d in failed)
+            st.caption(note)
 
         if cheapest_flights:
-            num_cols = 3
-            for row_start in range(0, len(cheapest_flights), num_cols):
-                row_flights = cheapest_flights[row_start: row_start + num_cols]
-                cols = st.columns(len(row_flights))
-
-                for col, f in zip(cols, row_flights):
-                    with col:
-                        logo = f.get("airline_logo", "")
-
-                        raw_airline = f.get("airline")
-                        segment_airline = f.get("flights", [{}])[0].get("airline")
-                        airline = raw_airline or segment_airline or "Airline"
-
-                        price = f.get("price", "Not Available")
-                        duration = f.get("total_duration", "N/A")
-                        flights_info = f.get("flights", [{}])
-                        dep = flights_info[0].get("departure_airport", {})
-                        arr = flights_info[-1].get("arrival_airport", {})
-                        dep_time = format_datetime(dep.get("time", "N/A"))
-                        arr_time = format_datetime(arr.get("time", "N/A"))
-                        booking_link = build_booking_link(
-                            f, source, destination, departure_date, return_date
-                        )
+            sort_col, window_col = st.columns(2)
+            with sort_col:
+                sort_by = st.selectbox(
+                    "Sort flights by",
+                    list(FLIGHT_SORTS),
+                    format_func=FLIGHT_SORTS.get,
+                    key="flight_sort",
+                )
+            with window_col:
+                window = st.selectbox(
+                    "Departure time",
+                    list(DEPARTURE_WINDOW_LABELS),
+                    format_func=DEPARTURE_WINDOW_LABELS.get,
+                    key="departure_window",
+                )
+            shown_flights = rank_flights(results["records"], k=8, by=sort_by, window=window)
+            if not shown_flights:
+                st.caption("No flights depart in that window.")
+
+            history = price_history(results) if min_price is not None else None
+            # Cards, summary and history in the display currency: one conversion pass
+            table, currency = display_currency()
+            with use_trace(st.session_state.get("trace")), span("convert_prices", currency=currency):
+                prices = convert_prices(
+                    table, currency,
+                    cards=[f.price if f.has_price else float("nan") for f in shown_flights],
+                    summary=[min_price, max_price, avg_price] if min_price is not None else [],
+                    daily_low=history.daily_low if history else [],
+                    daily_median=history.daily_median if history else [],
+                    percentiles=[history.percentiles[q] for q in (25, 50, 75)] if history else [],
+                )
 
-                        st.markdown(
-                            f"""
-                            <div class="flight-card">
-                                <img src="{logo}" width="80" alt="Flight Logo" />
-                                <h3 style="margin: 10px 0;">{airline}</h3>
-                                <p><strong>Departure:</strong> {dep_time}</p>
-                                <p><strong>Arrival:</strong> {arr_time}</p>
-                                <p><strong>Duration:</strong> {duration} min</p>
-                                <h2 style="color: #34a853; margin-top: 4px;">₹ {price}</h2>
-                                <a href="{booking_link}" target="_blank" style="
-                                    display: inline-block;
-                                    padding: 8px 18px;
-                                    font-size: 15px;
-                                    font-weight: 600;
-                                    color: #0b1020;
-                                    background: linear-gradient(135deg,#8ab4f8,#c58af9);
-                                    text-decoration: none;
-                                    border-radius: 999px;
-                                    margin-top: 10px;
-                                ">🔗 Book on Google Flights</a>
-                            </div>
-                            """,
-                            unsafe_allow_html=True,
-                        )
+            with use_trace(st.session_state.get("trace")), span("render_cards") as render_span:
+                # One markdown element for the whole grid: one delta per rerun
+                cards_html = flight_cards_html(shown_flights, results, prices["cards"], currency)
+                st.markdown(cards_html, unsafe_allow_html=True)
+                render_span.set(cards=len(shown_flights), html_bytes=len(cards_html.encode("utf-8")))
 
             if min_price is not None:
-                st.info(
-                    f"💡 Flight price summary: min ₹{min_price}, "
-                    f"max ₹{max_price}, avg ≈ ₹{int(avg_price)}"
-                )
+                low, high, avg = (format_money(v, currency) for v in prices["summary"])
+                st.info(f"💡 Flight price summary: min {low}, max {high}, avg ≈ {avg}")
+                render_price_history(history, min_price, prices, currency)
         else:
             st.warning("⚠️ No flight data available. Try changing dates or airports.")
 
-                       # ----- Itinerary + footer -----
+# Sections fed by a background job poll it with `run_every` while it runs.
+# Each poll is a fragment rerun, so the script thread stays free for other
+# widgets; when the job finishes, one full rerun drops the timer again.
+
+def render_fare_matrix(polling=False):
+    results = st.session_state.get("search_results")
+    job = st.session_state.get("fare_matrix_job")
+    if not results or results["anywhere"] or job is None:
+        return
+    cancel_stale_jobs()
+
+    with st.columns([3, 1.1])[0]:
+        st.markdown(
+            f'<div class="flight-section-title">📅 Fares for ±{results["flex_days"]} days</div>',
+            unsafe_allow_html=True,
+        )
+        fares = dict(job.results)
+        table, currency = display_currency()
+        priced = [cell for cell, fare in fares.items() if isinstance(fare, (int, float))]
+        converted = convert_prices(table, currency, fares=[fares[cell] for cell in priced])["fares"]
+        st.markdown(
+            fare_heatmap_html(
+                results["dep_dates"], results["ret_dates"], {**fares, **dict(zip(priced, converted.tolist()))},
+                selected=(results["departure_date"], results["return_date"]),
+                currency_symbol=currency_symbol(currency),
+            ),
+            unsafe_allow_html=True,
+        )
+        if not job.done:
+            st.progress(len(fares) / max(job.total, 1), text=f"{len(fares)} of {job.total} date combinations")
+        elif job.failed:
+            st.caption(f"⏱️ {job.failed} date combinations timed out or failed and are shown as —.")
+        if job.refused is not None:
+            st.caption(f"🚫 {job.refused_cells} date combinations were not searched: {job.refused}.")
+
+    if polling and job.done:
+        st.rerun()
+
+def render_itinerary(polling=False):
+    results = st.session_state.get("search_results")
+    if not results or results["anywhere"]:
+        return
+    job = st.session_state.get("itinerary_job")
+    cancel_stale_jobs()
+
+    with st.columns([3, 1.1])[0]:
+        # ----- Itinerary -----
         st.subheader("🗺️ Your AI itinerary (budget‑aware)")
 
         # Glassmorphic card around the itinerary
@@ -689,9 +694,58 @@ Return a Markdown-formatted answer with:
             unsafe_allow_html=True,
         )
 
-        # Collapsible long content
+        # Collapsible long content, filled in as the model writes it
         with st.expander("View full day‑by‑day plan", expanded=True):
-            st.markdown(ai_itinerary, unsafe_allow_html=True)
+            if results["cached_itinerary"] is not None:
+                ai_itinerary, itinerary_info = results["cached_itinerary"]
+                ai_itinerary, parsed, _ = itinerary_markdown(ai_itinerary)
+                st.markdown(ai_itinerary, unsafe_allow_html=True)
+                note_col, button_col = st.columns([3, 1])
+                note_col.caption(
+                    f"♻️ Reused an itinerary generated {format_age(itinerary_info.age)} ago "
+                    "for the same trip preferences."
+                    + (" Outline only: the AI budget is running low." if is_outline_only(parsed) else "")
+                )
+                if button_col.button("🔄 Regenerate", key="regenerate_itinerary_button"):
+                    st.session_state["regenerate_itinerary"] = True
+                    st.rerun()
+            elif results["itinerary_notice"]:
+                st.markdown(f"🚦 AI itinerary not available right now. {results['itinerary_notice']}.")
+            elif job is None:
+                st.markdown("AI itinerary not available (missing OPENAI_API_KEY).", unsafe_allow_html=True)
+            elif not job.text and not job.done:
+                st.markdown("🤖 Our advanced AI is crafting your personalized travel plan...")
+            else:
+                # Structured output is drawn section by section, each day once it is complete
+                ai_itinerary, parsed, complete = itinerary_markdown(job.text)
+                if not job.done and parsed:
+                    days = parsed.get("days", [])
+                    planned = sum(1 for day in days if not day.get("pending"))
+                    if (job.parallel or job.short) and "days" not in parsed:
+                        ai_itinerary += "\n\n⏳ Sketching the trip outline…"
+                    elif job.parallel:
+                        ai_itinerary += f"\n\n⏳ {planned} of {results['num_days']} days planned…"
+                    elif "cost_breakdown" not in parsed and planned < results["num_days"]:
+                        ai_itinerary += f"\n\n⏳ Planning day {planned + 1} of {results['num_days']}…"
+                    else:
+                        ai_itinerary += "\n\n⏳ Adding up costs…"
+                elif job.done and not complete and job.error is None:
+                    ai_itinerary += "\n\n⚠️ The plan was cut short; press Search to try again."
+                if job.error is not None:
+                    ai_itinerary += f"\n\nAI Error: {job.error}"
+                st.markdown(ai_itinerary + ("" if job.done or parsed else " ▌"), unsafe_allow_html=True)
+                if job.short:
+                    st.caption("✂️ Outline only: the AI budget is running low, so the days are not written out.")
+                if job.cancelled:
+                    st.caption("⏹️ Stopped because the trip inputs changed — press Search to plan again.")
+                elif job.done:
+                    stats_line = format_stats(job.stats)
+                    if job.shared:
+                        stats_line = " · ".join(
+                            filter(None, [stats_line, "shared with an identical request already in flight"])
+                        )
+                    if stats_line:
+                        st.caption(f"⚡ {stats_line}")
 
         st.markdown(
             """
@@ -701,7 +755,136 @@ Return a Markdown-formatted answer with:
             unsafe_allow_html=True,
         )
 
+    if polling and (job is None or job.done):
+        st.rerun()
+
+DESTINATION_SORT_LABELS = {"cheapest": "Cheapest fare", "median": "Typical fare (median of the top fares)"}
+
+def pick_destination(city_key, label):
+    # on_click of "Plan this trip": fill in the To picker and search again
+    st.session_state["picked_destination"] = city_key
+    st.session_state["to_query"] = label
+    st.session_state["_search_picked"] = True
+
+def render_anywhere(polling=False):
+    results = st.session_state.get("search_results")
+    job = st.session_state.get("anywhere_job")
+    if not results or not results["anywhere"] or job is None:
+        return
+    cancel_stale_jobs()
+
+    with st.columns([3, 1.1])[0]:
         st.markdown(
-            '<div class="footer-strip">✨ Built for Indian travellers • Live fares by SerpAPI • Itineraries by AI</div>',
+            f'<div class="flight-section-title">🌍 Cheapest places to fly from {html.escape(results["source_city"])}'
+            f' · {results["departure_date"]} → {results["return_date"]}</div>',
             unsafe_allow_html=True,
         )
+        sort_by = st.selectbox(
+            "Rank destinations by", list(DESTINATION_SORT_LABELS), format_func=DESTINATION_SORT_LABELS.get,
+            key="destination_sort",
+        )
+        fares = dict(job.results)
+        ranked = rank_destinations(fares, by=sort_by)[:env_int("ANYWHERE_SHOWN", 12)]
+        table, currency = display_currency()
+        prices = convert_prices(
+            table, currency, cheapest=[f.cheapest for f in ranked], median=[f.median for f in ranked]
+        )
+        for n, (fare, cheapest, median) in enumerate(zip(ranked, prices["cheapest"], prices["median"]), 1):
+            text_col, button_col = st.columns([4, 1])
+            best = fare.best
+            text_col.markdown(
+                f"**{n}. {fare.city}** ({fare.airport}) · from **{format_money(cheapest, currency)}** "
+                f"· typical {format_money(median, currency)} over {fare.fares} fares · {best.airline}, "
+                + ("nonstop" if not best.stops else f"{best.stops} stop{'' if best.stops == 1 else 's'}")
+            )
+            button_col.button(
+                "Plan this trip", key=f"pick_{fare.city_key}", on_click=pick_destination,
+                args=(fare.city_key, fare.city), use_container_width=True,
+            )
+        if not job.done:
+            st.progress(len(fares) / max(job.total, 1), text=f"{len(fares)} of {job.total} destinations checked")
+        else:
+            empty = sum(1 for fare in fares.values() if fare is None) - job.failed
+            notes = []
+            if job.failed:
+                notes.append(f"{job.failed} timed out or failed")
+            if empty > 0:
+                notes.append(f"{empty} had no fares")
+            if notes:
+                st.caption(f"⏱️ Of {job.total} destinations, " + " and ".join(notes) + ".")
+            if job.refused is not None:
+                st.caption(f"🚫 {job.refused_destinations} destinations were not searched: {job.refused}.")
+            if not ranked and job.refused is None:
+                st.warning("⚠️ No fares found for these dates. Try other dates.")
+
+    if polling and job.done:
+        st.rerun()
+
+def render_polling_fragment(render, job_key):
+    job = st.session_state.get(job_key)
+    polling = job is not None and not job.done
+    run_every = env_float("UI_POLL_INTERVAL", 0.3) if polling else None
+    st.fragment(render, run_every=run_every)(polling)
+
+# ================== DEBUG PANEL ==================
+# Opt-in (DEBUG_PANEL=1 or ?debug=1): every span of the last search, so a
+# slow search can be pinned on SerpAPI, the LLM or card rendering.
+
+def debug_panel_enabled():
+    return env_int("DEBUG_PANEL", 0) == 1 or st.query_params.get("debug") == "1"
+
+def render_debug_panel():
+    search_trace = st.session_state.get("trace")
+    if search_trace is None or not debug_panel_enabled():
+        return
+    rows = search_trace.rows()
+    totals = {}
+    for row in rows:
+        if row["duration_ms"] is not None:
+            totals[row["span"]] = totals.get(row["span"], 0) + row["duration_ms"]
+    with st.columns([3, 1.1])[0]:
+        with st.expander(f"🛠️ Debug · trace {search_trace.id}"):
+            st.caption(
+                f"SerpAPI {totals.get('search_airport_pairs', 0):.0f} ms · "
+                f"LLM {totals.get('chat_completion', 0):.0f} ms · "
+                f"prompt {totals.get('build_prompt', 0):.1f} ms · "
+                f"ranking {totals.get('extract_top_flights', 0):.1f} ms · "
+                f"cards {totals.get('render_cards', 0):.1f} ms"
+            )
+            st.dataframe(rows, use_container_width=True, hide_index=True)
+            pools = pool_stats()
+            if "serpapi" in pools:
+                serp = pools["serpapi"]
+                st.caption(
+                    f"🔌 SerpAPI pool: {serp['requests']} requests over {serp['connections_opened']} "
+                    f"connections ({serp['reuse_ratio']:.0%} reused), {serp['idle_connections']} idle"
+                )
+            if "openai" in pools:
+                st.caption(
+                    f"🔌 OpenAI pool: {pools['openai']['open_connections']} open, "
+                    f"{pools['openai']['idle_connections']} idle"
+                )
+
+# ================== MAIN ACTION ==================
+
+# "Regenerate" on a cached itinerary reruns the search, bypassing that cache.
+regenerate_itinerary = st.session_state.pop("regenerate_itinerary", False)
+# Picking a destination from the "Anywhere" results searches it straight away
+search_clicked = search_clicked or st.session_state.pop("_search_picked", False)
+cancel_stale_jobs(force=search_clicked or regenerate_itinerary)
+if search_clicked or regenerate_itinerary:
+    with trace("search") as search_trace:
+        st.session_state["trace"] = search_trace
+        run_search(force_itinerary=regenerate_itinerary)
+
+render_flight_results()
+render_polling_fragment(render_anywhere, "anywhere_job")
+render_polling_fragment(render_fare_matrix, "fare_matrix_job")
+render_polling_fragment(render_itinerary, "itinerary_job")
+
+if st.session_state.get("search_results"):
+    st.columns([3, 1.1])[0].markdown(
+        '<div class="footer-strip">✨ Built for Indian travellers • Live fares by SerpAPI • Itineraries by AI</div>',
+        unsafe_allow_html=True,
+    )
+    render_debug_panel()
@@ -0,0 +1,234 @@
+"""Page images and the stylesheet, served from ./static instead of inline or third-party hosts.
+
+    python assets.py          # download the hero / popular-trip / cursor images and build the CSS (e.g. at deploy)
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from config import env_float, env_int, env_str
+
+logger = logging.getLogger(__name__)
+
+# ================== STATIC ASSETS ==================
+# Streamlit serves ./static at app/static/ (server.enableStaticServing in
+# .streamlit/config.toml). Images are referenced as
+# app/static/cache/<name>?v=<content hash>, so a changed file gets a new URL
+# and any copy may be cached forever. Streamlit itself answers with ETag /
+# Last-Modified (a 304 on reload); put long headers on that path at the
+# proxy, e.g. nginx:
+#
+#   location /app/static/ { add_header Cache-Control "public, max-age=31536000, immutable"; ... }
+#
+# Remote images are downloaded into static/cache/ in the background the
+# first time they are asked for; until then the page keeps the remote URL.
+# Airline logos from SerpAPI results go through the same path.
+# REMOTE_ASSET_CACHING=0 turns the downloads off (offline benchmarks).
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+CACHE_SUBDIR = "cache"
+
+# Sized for how they are shown, not the originals (several MB each)
+PAGE_ASSETS: Dict[str, str] = {
+    "hero.jpg": "https://images.pexels.com/photos/457882/pexels-photo-457882.jpeg?auto=compress&cs=tinysrgb&w=1600",
+    "trip-scotland.jpg": "https://images.pexels.com/photos/325807/pexels-photo-325807.jpeg?auto=compress&cs=tinysrgb&w=400",
+    "trip-egypt.jpg": "https://images.pexels.com/photos/261102/pexels-photo-261102.jpeg?auto=compress&cs=tinysrgb&w=400",
+    "trip-greece.jpg": "https://images.pexels.com/photos/460672/pexels-photo-460672.jpeg?auto=compress&cs=tinysrgb&w=400",
+    "cursor.png": "https://icons.iconarchive.com/icons/designbolts/disney-planes-2013/72/Dusty-Plane-icon.png",
+}
+
+_SAFE_NAME = re.compile(r"\w[\w.-]{0,80}")
+_LOCK = threading.Lock()
+_PENDING: set = set()
+_FAILED: Dict[str, float] = {}
+_VERSIONS: Dict[str, tuple] = {}
+_DOWNLOADS: Optional[ThreadPoolExecutor] = None
+
+
+def _local_path(name: str) -> str:
+    return os.path.join(STATIC_DIR, CACHE_SUBDIR, name)
+
+
+def _version(path: str) -> Optional[str]:
+    # Content hash, recomputed only when the file changes
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    with _LOCK:
+        cached = _VERSIONS.get(path)
+        if cached and cached[0] == (stat.st_mtime_ns, stat.st_size):
+            return cached[1]
+    with open(path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:10]
+    with _LOCK:
+        _VERSIONS[path] = ((stat.st_mtime_ns, stat.st_size), digest)
+    return digest
+
+
+def download(name: str, url: str) -> bool:
+    import requests
+
+    path = _local_path(name)
+    try:
+        response = requests.get(url, timeout=env_float("ASSET_FETCH_TIMEOUT", 10), stream=True)
+        response.raise_for_status()
+        limit = env_int("ASSET_MAX_BYTES", 2 * 1024 * 1024)
+        content = response.raw.read(limit + 1, decode_content=True)
+        if len(content) > limit:
+            raise ValueError(f"larger than {limit} bytes")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(content)
+        os.replace(path + ".tmp", path)
+        return True
+    except Exception as e:
+        logger.warning("could not cache %s from %s: %s", name, url, e)
+        with _LOCK:
+            _FAILED[name] = time.monotonic()
+        return False
+    finally:
+        with _LOCK:
+            _PENDING.discard(name)
+
+
+def _schedule(name: str, url: str) -> None:
+    global _DOWNLOADS
+    if env_int("REMOTE_ASSET_CACHING", 1) != 1:
+        return
+    with _LOCK:
+        failed_at = _FAILED.get(name)
+        if name in _PENDING or (failed_at and time.monotonic() - failed_at < env_float("ASSET_RETRY_AFTER", 600)):
+            return
+        _PENDING.add(name)
+        if _DOWNLOADS is None:
+            _DOWNLOADS = ThreadPoolExecutor(max_workers=2, thread_name_prefix="assets")
+        downloads = _DOWNLOADS
+    downloads.submit(download, name, url)
+
+
+def cached_url(name: str, url: str) -> str:
+    """Local app/static URL for `url` if it is cached, else `url` (and start caching it)."""
+    version = _version(_local_path(name))
+    if version is not None:
+        return f"app/static/{CACHE_SUBDIR}/{name}?v={version}"
+    if url:
+        _schedule(name, url)
+    return url
+
+
+def asset_url(name: str) -> str:
+    return cached_url(name, PAGE_ASSETS[name])
+
+
+def logo_url(url: str) -> str:
+    # gstatic airline logos: .../airline_logos/70px/6E.png -> logos/70px-6E.png
+    if not url:
+        return url
+    name = "-".join(urlparse(url).path.rstrip("/").split("/")[-2:])
+    if not _SAFE_NAME.fullmatch(name):
+        name = hashlib.sha1(url.encode()).hexdigest()[:16]
+    return cached_url(f"logos/{name}", url)
+
+
+# ================== PAGE TEMPLATES ==================
+# The page CSS and the hero markup live in page/ and are compiled once per
+# process, and again when an image they use lands in static/cache/:
+# {{asset:NAME}} becomes that image's current URL, CSS comments and
+# indentation are dropped.
+#
+# The CSS is written to static/build/app.<content hash>.css. Where Streamlit
+# serves that file as text/css the page links it, so each browser downloads
+# it once (the name changes with the content) and a rerun sends one <link>
+# line instead of ~7 KB of CSS. Streamlit's Tornado server (1.37 to at least
+# 1.45) only types files on its SAFE_APP_STATIC_FILE_EXTENSIONS list
+# (images, fonts, PDF...) and serves the rest as text/plain with nosniff,
+# which browsers refuse to apply as a stylesheet; there the CSS is inlined. STYLESHEET_INLINE=1 / 0 forces
+# either way (e.g. 0 behind a proxy that serves static/ itself). The hero
+# markup has to be in the page itself; it is only built once instead of on
+# every run.
+
+PAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "page")
+BUILD_SUBDIR = "build"
+
+_ASSET_REF = re.compile(r"\{\{asset:([\w.-]+)\}\}")
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_CSS_SPACE = re.compile(r"\s*([{};,>])\s*")
+_COMPILED: Dict[str, tuple] = {}  # template name -> ((mtime, image URLs), compiled)
+
+
+def minify_css(css: str) -> str:
+    css = " ".join(_CSS_COMMENT.sub("", css).split())
+    # Spaces before ':' stay: `a :hover` and `a:hover` are different selectors
+    css = _CSS_SPACE.sub(r"\1", css).replace(": ", ":")
+    return css.replace(";}", "}")
+
+
+def _build_url(name: str) -> str:
+    # An image URL as seen from static/build/, where the stylesheet is served
+    url = asset_url(name)
+    prefix = "app/static/"
+    return "../" + url[len(prefix):] if url.startswith(prefix) else url
+
+
+def _compile(name: str, build) -> object:
+    path = os.path.join(PAGE_DIR, name)
+    key = (os.stat(path).st_mtime_ns, tuple(asset_url(asset) for asset in PAGE_ASSETS))
+    with _LOCK:
+        cached = _COMPILED.get(name)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with open(path, encoding="utf-8") as f:
+        compiled = build(f.read())
+    with _LOCK:
+        _COMPILED[name] = (key, compiled)
+    return compiled
+
+
+def _build_stylesheet(source: str) -> tuple:
+    css = _ASSET_REF.sub(lambda m: _build_url(m.group(1)), minify_css(source))
+    name = f"app.{hashlib.sha1(css.encode()).hexdigest()[:10]}.css"
+    path = os.path.join(STATIC_DIR, BUILD_SUBDIR, name)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(css)
+        os.replace(path + ".tmp", path)
+    return f"app/static/{BUILD_SUBDIR}/{name}", css
+
+
+def _static_serves_css() -> bool:
+    try:
+        from streamlit.web.server.app_static_file_handler import SAFE_APP_STATIC_FILE_EXTENSIONS
+    except ImportError:
+        return True  # the Starlette server, which types every file by its extension
+    return ".css" in SAFE_APP_STATIC_FILE_EXTENSIONS
+
+
+def stylesheet_html() -> str:
+    """The page's styles: a <link> to the compiled stylesheet, or it inlined."""
+    url, css = _compile("app.css", _build_stylesheet)
+    inline = env_str("STYLESHEET_INLINE", "")
+    if inline == "1" or (inline != "0" and not _static_serves_css()):
+        return f"<style>{css}</style>"
+    return f'<link rel="stylesheet" href="{url}">'
+
+
+def page_html(name: str) -> str:
+    """An HTML template from page/ with its image URLs filled in."""
+    return _compile(name, lambda source: _ASSET_REF.sub(lambda m: asset_url(m.group(1)), source))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    for asset_name, asset_source in PAGE_ASSETS.items():
+        if download(asset_name, asset_source):
+            print(f"{asset_name:<20} {os.path.getsize(_local_path(asset_name)) / 1024:>8.1f} KiB")
+    stylesheet_path, stylesheet_css = _compile("app.css", _build_stylesheet)
+    print(f"{stylesheet_path:<20} {len(stylesheet_css) / 1024:>8.1f} KiB")
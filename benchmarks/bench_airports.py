@@ -0,0 +1,108 @@
+"""Airport index benchmark: build time, memory footprint and query latency.
+
+    python benchmarks/bench_airports.py                  # bundled data/airports.csv
+    python benchmarks/bench_airports.py --csv airports.csv  # e.g. a full OurAirports export
+    python benchmarks/bench_airports.py --synthetic 20000   # bundled rows + generated ones
+"""
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from airports import BUNDLED_AIRPORTS_CSV, Airport, AirportIndex, read_airports_csv  # noqa: E402
+
+QUERIES = [
+    # search-as-you-type prefixes
+    "h", "hy", "hyd", "hyder", "lon", "london", "new y", "sao p", "ban", "kochi",
+    # codes
+    "DEL", "LHR", "JFK", "BOM",
+    # airport names / multi-word
+    "heathrow", "indira gandhi", "kempegowda", "charles de",
+    # typos
+    "hyderbad", "munbai", "lodnon", "tokio", "bangalroe", "sydnee",
+]
+
+
+def synthetic_rows(count, seed=7):
+    rng = random.Random(seed)
+    used = set()
+    for _ in range(count):
+        code = "".join(rng.choice(string.ascii_uppercase) for _ in range(3))
+        while code in used:
+            code = "".join(rng.choice(string.ascii_uppercase) for _ in range(3))
+        used.add(code)
+        city = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 11))).title()
+        name = f"{city} {rng.choice(['International', 'Regional', 'Municipal', 'Field'])}"
+        yield code, name, city, rng.choice(["IN", "US", "GB", "DE", "BR", "AU"])
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--csv", default=BUNDLED_AIRPORTS_CSV)
+    parser.add_argument("--synthetic", type=int, default=0, help="extra generated airports")
+    parser.add_argument("--builds", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=200, help="repetitions of the query mix")
+    args = parser.parse_args()
+
+    rows = list(read_airports_csv(args.csv))
+    if args.synthetic:
+        # 3-letter codes are finite; synthetic codes may shadow real ones.
+        real = {r[0] for r in rows}
+        rows += [r for r in synthetic_rows(min(args.synthetic, 17000)) if r[0] not in real]
+
+    build_times = []
+    for _ in range(args.builds):
+        start = time.perf_counter()
+        index = AirportIndex(rows)
+        build_times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    index = AirportIndex(rows)
+    after = tracemalloc.take_snapshot()
+    index_bytes = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+
+    before = tracemalloc.take_snapshot()
+    as_tuples = [Airport(*r[:4]) for r in rows]
+    after = tracemalloc.take_snapshot()
+    tuple_bytes = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    tracemalloc.stop()
+    del as_tuples
+
+    latencies = {q: [] for q in QUERIES}
+    for _ in range(args.rounds):
+        for query in QUERIES:
+            start = time.perf_counter()
+            index.search(query, limit=10)
+            latencies[query].append((time.perf_counter() - start) * 1e6)
+    everything = [x for samples in latencies.values() for x in samples]
+
+    print(f"airports indexed     : {len(index):,}")
+    print(f"build time           : median {statistics.median(build_times) * 1e3:.1f} ms "
+          f"(min {min(build_times) * 1e3:.1f} ms over {args.builds} builds)")
+    print(f"index footprint      : {index.nbytes() / 1024:.0f} KiB packed arrays "
+          f"({index_bytes / 1024:.0f} KiB retained per tracemalloc)")
+    print(f"same rows as tuples  : {tuple_bytes / 1024:.0f} KiB (Airport namedtuples, no search keys)")
+    print(f"query latency (all)  : p50 {percentile(everything, 50):.0f} µs, "
+          f"p95 {percentile(everything, 95):.0f} µs, p99 {percentile(everything, 99):.0f} µs, "
+          f"max {max(everything):.0f} µs")
+    print()
+    print(f"{'query':<16}{'p50 µs':>10}{'p99 µs':>10}  top results")
+    for query, samples in latencies.items():
+        top = ", ".join(a.iata for a in index.search(query, limit=3))
+        print(f"{query:<16}{percentile(samples, 50):>10.0f}{percentile(samples, 99):>10.0f}  {top}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""JSON API throughput on cached flight searches, against local stand-ins.
+
+    python benchmarks/bench_api.py                          # one uvicorn worker per CPU, 10 s
+    python benchmarks/bench_api.py --workers 8 --clients 128 --duration 20
+
+Starts the stand-ins and `python api.py --workers N` in a subprocess,
+warms the flight cache for a handful of routes, then keeps --clients
+concurrent GET /v1/flights requests in flight for --duration seconds and
+reports requests per second and latency percentiles. Every worker fills
+its own memory cache from the shared disk tier on its first requests.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+ROUTES = [("kochi", "delhi"), ("mumbai", "goa"), ("delhi", "bengaluru"), ("chennai", "kolkata"), ("hyderabad", "jaipur")]
+DATES = ("2026-12-01", "2026-12-05")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+async def load(base_url, clients, duration):
+    import httpx
+
+    urls = [f"{base_url}/v1/flights?from={a}&to={b}&depart={DATES[0]}&return={DATES[1]}" for a, b in ROUTES]
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as http:
+        # Warm every worker's cache (and the shared disk tier) first
+        for _ in range(4):
+            await asyncio.gather(*(http.get(url) for url in urls * 8))
+        stop_at = time.perf_counter() + duration
+
+        async def client(n):
+            nonlocal errors
+            i = n
+            while time.perf_counter() < stop_at:
+                started = time.perf_counter()
+                response = await http.get(urls[i % len(urls)])
+                latencies.append(time.perf_counter() - started)
+                errors += response.status_code != 200
+                i += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client(n) for n in range(clients)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    from stubs import start_in_background
+
+    _, stub_url = start_in_background(serp_latency=0.3)
+    port = free_port()
+    env = dict(
+        os.environ, SERPAPI_BASE_URL=stub_url, OPENAI_BASE_URL=stub_url + "/v1", SERPAPI_KEY="bench",
+        OPENAI_API_KEY="sk-bench", CACHE_DIR=tempfile.mkdtemp(prefix="bench-cache-"),
+    )
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "api.py"), "--port", str(port), "--workers", str(args.workers)],
+        cwd=ROOT, env=env,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        import httpx
+
+        for _ in range(100):
+            try:
+                if httpx.get(base_url + "/healthz", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        latencies, errors, elapsed = asyncio.run(load(base_url, args.clients, args.duration))
+    finally:
+        server.terminate()
+        server.wait(10)
+
+    print(f"workers {args.workers} · clients {args.clients} · {len(latencies)} requests in {elapsed:.1f} s")
+    print(f"throughput : {len(latencies) / elapsed:,.0f} req/s (cached GET /v1/flights), {errors} non-200")
+    print(f"latency    : p50 {statistics.median(latencies) * 1000:.1f} ms · "
+          f"p95 {percentile(latencies, 0.95) * 1000:.1f} ms · p99 {percentile(latencies, 0.99) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""End-to-end app benchmark against local SerpAPI / OpenAI stand-ins.
+
+    python benchmarks/bench_app.py                               # 5 cold searches, COK -> DEL
+    python benchmarks/bench_app.py --to london --rounds 10       # multi-airport fan-out
+    python benchmarks/bench_app.py --save-baseline bench.json    # record per-stage p50s
+    python benchmarks/bench_app.py --baseline bench.json         # exit 1 on regressions
+
+Drives app.py headlessly with Streamlit's AppTest: each round clicks
+Search, then waits for the background itinerary. Per-stage times come from
+timings.py. Caches are disabled unless --warm is given, so every round pays
+for the flight fetch and the LLM call. No real quota is used.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+STAGES = [
+    "search_click",          # click -> results page rendered (AppTest run)
+    "search_airport_pairs",  # all airport pairs, incl. fan-out
+    "fetch_flights",         # one pair, incl. cache lookup
+    "extract_top_flights",   # parse + rank
+    "build_prompt",
+    "render_cards",
+    "llm_first_token",
+    "chat_completion",       # whole LLM call, streamed to the end
+    "itinerary_done",        # click -> itinerary finished
+]
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def run_rounds(args):
+    from streamlit.testing.v1 import AppTest
+
+    import timings
+
+    for _ in range(args.warmup + args.rounds):
+        if _ == args.warmup:
+            timings.reset()
+        at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=args.timeout)
+        at.secrets["SERPAPI_KEY"] = "bench"
+        at.secrets["OPENAI_API_KEY"] = "sk-bench"
+        at.run()
+        if args.source:
+            at.text_input(key="from_query").set_value(args.source).run()
+        if args.to:
+            at.text_input(key="to_query").set_value(args.to).run()
+
+        clicked = time.perf_counter()
+        at.button[0].click().run()
+        timings.record("search_click", time.perf_counter() - clicked)
+        if at.exception:
+            raise SystemExit(f"app raised: {at.exception[0].value}")
+
+        job = at.session_state["itinerary_job"] if "itinerary_job" in at.session_state else None
+        if job is not None:
+            job.wait(args.timeout)
+            timings.record("itinerary_done", time.perf_counter() - clicked)
+            if job.error:
+                raise SystemExit(f"itinerary failed: {job.error}")
+    return timings.snapshot()
+
+
+def summarize(samples):
+    summary = {}
+    for stage in STAGES + sorted(set(samples) - set(STAGES)):
+        values = samples.get(stage)
+        if values:
+            summary[stage] = {
+                "n": len(values),
+                "p50_ms": statistics.median(values) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "max_ms": max(values) * 1000,
+            }
+    return summary
+
+
+def compare(summary, baseline, threshold, min_delta_ms):
+    regressions = []
+    for stage, stats in summary.items():
+        before = baseline.get(stage, {}).get("p50_ms")
+        if before is None:
+            continue
+        now = stats["p50_ms"]
+        if now > before * threshold and now - before > min_delta_ms:
+            regressions.append((stage, before, now))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1, help="untimed rounds first (imports, JIT caches)")
+    parser.add_argument("--source", default="", help="text typed into the From box")
+    parser.add_argument("--to", default="", help="text typed into the To box")
+    parser.add_argument("--warm", action="store_true", help="keep flight / itinerary caches on")
+    parser.add_argument("--serp-latency", type=float, default=0.3)
+    parser.add_argument("--llm-ttft", type=float, default=0.6)
+    parser.add_argument("--llm-token-delay", type=float, default=0.005)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--baseline", metavar="PATH")
+    parser.add_argument("--threshold", type=float, default=1.25, help="allowed p50 ratio vs the baseline")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="ignore smaller absolute slowdowns")
+    args = parser.parse_args()
+
+    from stubs import start_in_background
+
+    server, base_url = start_in_background(
+        serp_latency=args.serp_latency, llm_ttft=args.llm_ttft, llm_token_delay=args.llm_token_delay,
+    )
+    os.environ["SERPAPI_BASE_URL"] = base_url
+    os.environ["OPENAI_BASE_URL"] = base_url + "/v1"
+    os.environ["CACHE_DIR"] = tempfile.mkdtemp(prefix="bench-cache-")
+    os.environ["REMOTE_ASSET_CACHING"] = "0"
+    if not args.warm:
+        for name in ("FLIGHT_CACHE_TTL", "FLIGHT_CACHE_STALE_TTL", "ITINERARY_CACHE_TTL"):
+            os.environ[name] = "0"
+
+    summary = summarize(run_rounds(args))
+    print(f"{args.rounds} rounds · stand-in SerpAPI {args.serp_latency * 1000:.0f} ms, "
+          f"LLM first token {args.llm_ttft * 1000:.0f} ms + {args.llm_token_delay * 1000:.0f} ms/word · "
+          f"requests {server.RequestHandlerClass.requests}")
+    print(f"\n{'stage':<22}{'n':>5}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for stage, stats in summary.items():
+        print(f"{stage:<22}{stats['n']:>5}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['max_ms']:>10.2f}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"\nbaseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(summary, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"\nREGRESSIONS (p50 > {args.threshold:.2f}x baseline):")
+            for stage, before, now in regressions:
+                print(f"  {stage:<22}{before:>10.2f} ms -> {now:.2f} ms ({now / before:.2f}x)")
+            sys.exit(1)
+        print(f"\nno regressions against {args.baseline} (threshold {args.threshold:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Fare history benchmark: ingest rate, column load and analytics latency.
+
+    python benchmarks/bench_fare_history.py                      # 2M fares on 4 routes
+    python benchmarks/bench_fare_history.py --rows 5000000 --routes 1
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fare_history import ROW_DTYPE, FareHistory  # noqa: E402
+from flights import FlightRecord  # noqa: E402
+
+AIRLINES = ["IndiGo", "Air India", "Vistara", "SpiceJet", "Akasa Air", "Emirates", "British Airways"]
+
+
+def synthetic_fetches(route, fetches, per_fetch, seed=7):
+    # One fetch = one user search: per_fetch fares, ten minutes apart
+    rng = random.Random(seed)
+    now = int(time.time())
+    for n in range(fetches):
+        fetched_at = now - (fetches - n) * 600
+        base = 6000 + 1500 * ((n // 144) % 7) + rng.randint(-500, 500)
+        dep_day = 739900 + rng.randint(0, 60)
+        for _ in range(per_fetch):
+            yield (route, n, fetched_at, dep_day, dep_day + 3, base + rng.randint(0, 9000),
+                   rng.randint(90, 900), rng.randint(0, 2), rng.choice(AIRLINES))
+
+
+def python_analytics(rows):
+    # The same per-fetch cheapest / daily low as analyze(), walking tuples
+    cheapest = {}
+    for _, fetch_id, fetched_at, _, _, price, *_ in rows:
+        best = cheapest.get(fetch_id)
+        if best is None or price < best[0]:
+            cheapest[fetch_id] = (price, fetched_at // 86400)
+    daily = {}
+    for price, day in cheapest.values():
+        daily.setdefault(day, []).append(price)
+    prices = sorted(p for p, _ in cheapest.values())
+    return {day: (min(v), statistics.median(v)) for day, v in daily.items()}, prices[len(prices) // 2]
+
+
+def timed(fn, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return result, statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2_000_000, help="fares in total")
+    parser.add_argument("--routes", type=int, default=4)
+    parser.add_argument("--per-fetch", type=int, default=40, help="fares per SerpAPI response")
+    args = parser.parse_args()
+
+    routes = [f"R{i:02d}-DEL" for i in range(args.routes)]
+    fetches = max(1, args.rows // args.per_fetch // args.routes)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        history = FareHistory(os.path.join(tmp, "fares.sqlite3"))
+
+        start = time.perf_counter()
+        with history._db:
+            for i, route in enumerate(routes):
+                history._db.executemany(
+                    "INSERT INTO fares VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    synthetic_fetches(route, fetches, args.per_fetch, seed=i),
+                )
+        ingest = time.perf_counter() - start
+        total = fetches * args.per_fetch * len(routes)
+
+        one_fetch = [
+            FlightRecord(7000 + i, 120, 0, 600, "IndiGo", "", "R00", "DEL", "10:00", "12:00", "")
+            for i in range(args.per_fetch)
+        ]
+        _, append_ms = timed(lambda: history.append(routes[0], "2026-12-01", "2026-12-04", one_fetch), repeat=20)
+
+        start = time.perf_counter()
+        for route in routes:
+            history.columns(route)
+        cold_load = time.perf_counter() - start
+        # A new process starts from the .npy snapshots written above
+        reopened = FareHistory(history.path)
+        start = time.perf_counter()
+        for route in routes:
+            reopened.columns(route)
+        warm_load = time.perf_counter() - start
+        reopened._db.close()
+
+        history.append(routes[0], "2026-12-01", "2026-12-04", one_fetch)
+        _, topup_ms = timed(lambda: history.columns(routes[0]), repeat=1)
+        _, steady_ms = timed(lambda: history.columns(routes[0]))
+
+        analytics, one_route_ms = timed(lambda: history.route_analytics(routes[:1], lookback_days=3650))
+        _, all_routes_ms = timed(lambda: history.route_analytics(routes, lookback_days=3650))
+
+        rows = history._db.execute("SELECT * FROM fares WHERE route = ?", (routes[0],)).fetchall()
+        _, python_ms = timed(lambda: python_analytics(rows), repeat=1)
+        column_bytes = history.columns(routes[0]).size * ROW_DTYPE.itemsize
+        db_bytes = os.path.getsize(history.path)
+        history._db.close()
+
+    per_route = total // len(routes)
+    print(f"fares stored         : {total:,} ({len(routes)} routes, {args.per_fetch} per fetch)")
+    print(f"bulk ingest          : {ingest:.1f} s ({total / ingest:,.0f} fares/s), SQLite file {db_bytes / 2**20:.0f} MiB")
+    print(f"append one fetch     : {append_ms:.2f} ms ({args.per_fetch} fares)")
+    print(f"cold column load     : {cold_load * 1000:.0f} ms for all routes "
+          f"({column_bytes / 2**20:.1f} MiB numeric columns per route)")
+    print(f"restart, snapshots   : {warm_load * 1000:.0f} ms for all routes")
+    print(f"incremental top-up   : {topup_ms:.2f} ms after one new fetch, {steady_ms:.2f} ms with nothing new")
+    print(f"analytics, 1 route   : {one_route_ms:.1f} ms over {per_route:,} fares ({analytics.fetches:,} fetches, "
+          f"{len(analytics.days)} days)")
+    print(f"analytics, {len(routes)} routes  : {all_routes_ms:.1f} ms over {total:,} fares")
+    print(f"same, Python loops   : {python_ms:.0f} ms for 1 route ({python_ms / one_route_ms:.0f}x slower)")
+    p = analytics.percentiles
+    print(f"route R00-DEL        : p10 ₹{p[10]:,.0f} · p50 ₹{p[50]:,.0f} · p90 ₹{p[90]:,.0f} · "
+          f"trend {analytics.trend_per_week or 0:+.1%}/week · ₹7,000 is {analytics.verdict(7000)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Cost of switching the display currency: rate lookup plus converting every price on screen.
+
+    python benchmarks/bench_fx.py
+    python benchmarks/bench_fx.py --history-days 365 --matrix 7 --repeat 2000
+
+Builds the INR columns one results page shows (8 cards, the price summary,
+--history-days of daily low / median fares and their percentiles, a
+--matrix x --matrix flexible-date grid) and times, per switch:
+    rate table    fx.rate_table(), served from the in-memory cache tier
+    one pass      fx.convert_prices() over all columns at once
+    per value     the same conversion as a Python loop, value by value
+Rates come from the bundled seed file (FX_RATES_URL=off): no network.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--history-days", type=int, default=90)
+    parser.add_argument("--matrix", type=int, default=7, help="flexible-date grid side (±3 days = 7)")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ.update(FX_RATES_URL="off", CACHE_DIR=tempfile.mkdtemp(prefix="bench-fx-"))
+    import numpy as np
+
+    from fx import convert_prices, format_money, rate_table
+
+    rng = np.random.default_rng(7)
+    columns = {
+        "cards": rng.uniform(4000, 9000, 8),
+        "summary": rng.uniform(4000, 9000, 3),
+        "daily_low": rng.uniform(4000, 9000, args.history_days),
+        "daily_median": rng.uniform(4000, 9000, args.history_days),
+        "percentiles": rng.uniform(4000, 9000, 3),
+        "matrix": rng.uniform(4000, 9000, args.matrix * args.matrix),
+    }
+    values = sum(len(v) for v in columns.values())
+    table = rate_table()
+    currencies = [code for code in table.codes if code != "INR"]
+
+    def one_pass():
+        for currency in currencies:
+            convert_prices(table, currency, **columns)
+
+    def per_value():
+        for currency in currencies:
+            {name: [float(v) * table.rate(currency) for v in column] for name, column in columns.items()}
+
+    lookup = timed(rate_table, args.repeat)
+    vectorized = timed(one_pass, max(args.repeat // 10, 10)) / len(currencies)
+    looped = timed(per_value, max(args.repeat // 10, 10)) / len(currencies)
+    formatted = timed(lambda: [format_money(v, "USD") for v in columns["cards"]], args.repeat)
+
+    print(f"{values:,} prices on screen ({args.history_days} days of history, {args.matrix}x{args.matrix} grid), "
+          f"{len(table.codes)} currencies ({table.source} rates)")
+    print(f"rate table : {lookup * 1e6:8.1f} µs per lookup")
+    print(f"one pass   : {vectorized * 1e6:8.1f} µs per currency switch")
+    print(f"per value  : {looped * 1e6:8.1f} µs per currency switch ({looped / vectorized:.0f}x the one pass)")
+    print(f"8 card labels formatted in {formatted * 1e6:.1f} µs · 0 upstream searches per switch")
+
+
+if __name__ == "__main__":
+    main()
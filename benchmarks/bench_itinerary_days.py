@@ -0,0 +1,94 @@
+"""Itinerary wall-clock by trip length: one streamed answer vs parallel days.
+
+    python benchmarks/bench_itinerary_days.py                    # local stand-in, no key needed
+    python benchmarks/bench_itinerary_days.py --days 3 7 14 --concurrency 4
+    OPENAI_API_KEY=sk-... python benchmarks/bench_itinerary_days.py --live
+
+For each trip length, generates the structured itinerary as one streamed
+answer and as an outline followed by one call per day, and reports time to
+the first words, time until every day is on screen, total time and tokens.
+The stand-in streams one word per --llm-token-delay, so one-shot time grows
+with the number of days while the parallel mode grows by waves of
+--concurrency days.
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_itinerary_tokens import TRIP  # noqa: E402
+
+
+def run(client, num_days, parallel):
+    from itinerary import (
+        ItineraryJob, build_outline_prompt, build_structured_prompt, itinerary_markdown, itinerary_max_tokens,
+        itinerary_messages, itinerary_response_format, outline_max_tokens, outline_response_format,
+    )
+
+    trip = dict(TRIP, num_days=num_days)
+    if parallel:
+        job = ItineraryJob(
+            client, itinerary_messages(build_outline_prompt(**trip)), max_tokens=outline_max_tokens(num_days),
+            response_format=outline_response_format(), trip=trip,
+        )
+    else:
+        job = ItineraryJob(
+            client, itinerary_messages(build_structured_prompt(**trip)),
+            max_tokens=itinerary_max_tokens(num_days, "json"), response_format=itinerary_response_format("json"),
+        )
+    started = time.perf_counter()
+    all_days_s = None
+    while not job.done:
+        _, parsed, _ = itinerary_markdown(job.text)
+        days = [day for day in parsed.get("days", []) if not day.get("pending")]
+        if all_days_s is None and len(days) >= num_days:
+            all_days_s = time.perf_counter() - started
+        time.sleep(0.02)
+    if job.error is not None:
+        raise SystemExit(f"generation failed: {job.error}")
+    _, parsed, complete = itinerary_markdown(job.text)
+    done_days = sum(1 for day in parsed.get("days", []) if not day.get("pending") and not day.get("failed"))
+    return job.stats, all_days_s or job.stats.total_s, done_days, complete
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, nargs="+", default=[3, 7, 14])
+    parser.add_argument("--concurrency", type=int, default=8, help="ITINERARY_DAY_CONCURRENCY")
+    parser.add_argument("--live", action="store_true", help="call OpenAI with OPENAI_API_KEY")
+    parser.add_argument("--llm-ttft", type=float, default=0.4, help="stand-in only")
+    parser.add_argument("--llm-token-delay", type=float, default=0.01, help="stand-in only, seconds per word")
+    args = parser.parse_args()
+
+    os.environ["ITINERARY_DAY_CONCURRENCY"] = str(args.concurrency)
+    if args.live:
+        api_key = os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            raise SystemExit("--live needs OPENAI_API_KEY")
+    else:
+        from stubs import start_in_background
+
+        _, base_url = start_in_background(llm_ttft=args.llm_ttft, llm_token_delay=args.llm_token_delay)
+        os.environ["OPENAI_BASE_URL"] = base_url + "/v1"
+        api_key = "sk-bench"
+
+    from http_clients import openai_client
+
+    client = openai_client(api_key)
+    print(f"{'days':>4}  {'mode':<9}{'ttft s':>8}{'days s':>8}{'total s':>9}{'tokens':>8}{'calls':>7}  days/complete")
+    for num_days in args.days:
+        for parallel in (False, True):
+            stats, all_days_s, done_days, complete = run(client, num_days, parallel)
+            print(f"{num_days:>4}  {'parallel' if parallel else 'one-shot':<9}{stats.first_token_s or 0:>8.2f}"
+                  f"{all_days_s:>8.2f}{stats.total_s or 0:>9.2f}{stats.total_tokens or 0:>8}"
+                  f"{1 + stats.day_calls:>7}  {done_days}/{'yes' if complete else 'no'}")
+    if not args.live:
+        print("\nstand-in tokens are replayed words; use --live for real timings")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Itinerary token report: free-form Markdown vs structured JSON with budgets.
+
+    python benchmarks/bench_itinerary_tokens.py                   # local stand-in, no key needed
+    OPENAI_API_KEY=sk-... python benchmarks/bench_itinerary_tokens.py --live --days 3 7 14
+
+For each trip length, generates the itinerary both ways (the original
+Markdown prompt without a cap, and ITINERARY_FORMAT=json with its compact
+prompt and max_tokens budget) and reports prompt / completion tokens, time
+to first token, total time and cost. Against the stand-in, a "token" is a
+word of the replayed fixture, so only the prompt side and the budgets mean
+much; --live spends real tokens (a few cents for the default run).
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# gpt-4o-mini list prices, USD per 1M tokens
+PRICE_IN, PRICE_OUT = 0.15, 0.60
+
+TRIP = dict(
+    travel_theme="Cultural", source_city="Kochi", source="COK", destination_city="Delhi", destination="DEL",
+    activity_preferences="Food walks, forts, museums and local markets", budget="Luxury",
+    flight_class="Economy", hotel_rating="5⭐", visa_required=False, travel_insurance=True,
+    flight_summary="\n".join([
+        "- IndiGo | ₹5480 | 190 min", "- Air India | ₹6380 | 185 min", "- Vistara | ₹6920 | 200 min",
+        "- SpiceJet | ₹5710 | 310 min", "- Akasa Air | ₹5990 | 195 min", "- Air India Express | ₹6100 | 340 min",
+        "- IndiGo | ₹7020 | 420 min", "- Air India | ₹8240 | 505 min",
+    ]),
+    budget_hint="Flight price range (from live data): min ₹5480, max ₹8240, avg ₹6480.",
+)
+
+
+def run(client, num_days, fmt):
+    from itinerary import (
+        ItineraryStats, build_itinerary_prompt, build_structured_prompt, itinerary_markdown,
+        itinerary_max_tokens, itinerary_messages, itinerary_response_format, stream_itinerary,
+    )
+
+    if fmt == "markdown":
+        prompt, max_tokens = build_itinerary_prompt(num_days=num_days, **TRIP), None
+    else:
+        prompt, max_tokens = build_structured_prompt(num_days=num_days, **TRIP), itinerary_max_tokens(num_days, fmt)
+    stats = ItineraryStats(started_at=time.perf_counter())
+    text = "".join(stream_itinerary(
+        client, itinerary_messages(prompt), stats,
+        max_tokens=max_tokens, response_format=itinerary_response_format(fmt),
+    ))
+    _, parsed, complete = itinerary_markdown(text)
+    days = len(parsed.get("days", [])) if fmt == "json" else text.count("### Day ")
+    return stats, max_tokens, days, complete
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, nargs="+", default=[3, 7, 14])
+    parser.add_argument("--live", action="store_true", help="call OpenAI with OPENAI_API_KEY")
+    parser.add_argument("--llm-ttft", type=float, default=0.4, help="stand-in only")
+    parser.add_argument("--llm-token-delay", type=float, default=0.01, help="stand-in only, seconds per word")
+    args = parser.parse_args()
+
+    if args.live:
+        api_key = os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            raise SystemExit("--live needs OPENAI_API_KEY")
+    else:
+        from stubs import start_in_background
+
+        _, base_url = start_in_background(llm_ttft=args.llm_ttft, llm_token_delay=args.llm_token_delay)
+        os.environ["OPENAI_BASE_URL"] = base_url + "/v1"
+        api_key = "sk-bench"
+
+    from http_clients import openai_client
+
+    client = openai_client(api_key)
+    print(f"{'days':>4}  {'format':<9}{'prompt':>8}{'output':>8}{'budget':>8}{'ttft s':>8}{'total s':>9}"
+          f"{'USD':>10}  days/complete")
+    for num_days in args.days:
+        rows = {}
+        for fmt in ("markdown", "json"):
+            stats, max_tokens, days, complete = run(client, num_days, fmt)
+            cost = ((stats.prompt_tokens or 0) * PRICE_IN + (stats.completion_tokens or 0) * PRICE_OUT) / 1e6
+            rows[fmt] = (stats, cost)
+            print(f"{num_days:>4}  {fmt:<9}{stats.prompt_tokens or 0:>8}{stats.completion_tokens or 0:>8}"
+                  f"{max_tokens or '-':>8}{stats.first_token_s or 0:>8.2f}{stats.total_s or 0:>9.2f}"
+                  f"{cost:>10.5f}  {days}/{'yes' if complete else 'no'}"
+                  + (" (cut off)" if stats.finish_reason == "length" else ""))
+        (before, before_cost), (after, after_cost) = rows["markdown"], rows["json"]
+        if before.total_tokens and after.total_tokens:
+            print(f"{'':>4}  {'saved':<9}{1 - after.prompt_tokens / before.prompt_tokens:>8.0%}"
+                  f"{1 - after.completion_tokens / before.completion_tokens:>8.0%}{'':>8}{'':>8}"
+                  f"{1 - after.total_s / before.total_s:>9.0%}{1 - after_cost / before_cost:>10.0%}")
+    if not args.live:
+        print("\nstand-in tokens are replayed words; use --live for real counts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Websocket payload per page load, search and re-sort, against local stand-ins.
+
+    python benchmarks/bench_payload.py
+    python benchmarks/bench_payload.py --to london
+
+Counts every ForwardMsg the script sends to the browser (what travels over
+the websocket) while AppTest drives app.py: the first page load, the Search
+click and a change of the flight sort (AppTest reruns the whole script for
+it; a browser reruns only the results fragment). Also lists the image URLs
+the page makes the browser fetch.
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+IMAGE_URL = re.compile(r'(?:src="|url\(")([^"]+)"')
+
+
+class Recorder:
+    def __init__(self):
+        self.messages = self.deltas = self.bytes = 0
+        self.images = set()
+
+    def __call__(self, msg):
+        self.messages += 1
+        self.bytes += msg.ByteSize()
+        if msg.HasField("delta"):
+            self.deltas += 1
+            if msg.delta.new_element.HasField("markdown"):
+                self.images.update(IMAGE_URL.findall(msg.delta.new_element.markdown.body))
+
+    def take(self):
+        result = (self.messages, self.deltas, self.bytes, sorted(self.images))
+        self.__init__()
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--to", default="", help="text typed into the To box")
+    args = parser.parse_args()
+
+    from stubs import start_in_background
+
+    _, base_url = start_in_background(serp_latency=0, llm_ttft=0, llm_token_delay=0)
+    os.environ["SERPAPI_BASE_URL"] = base_url
+    os.environ["OPENAI_BASE_URL"] = base_url + "/v1"
+    os.environ["CACHE_DIR"] = tempfile.mkdtemp(prefix="bench-cache-")
+    os.environ["REMOTE_ASSET_CACHING"] = "0"
+
+    from streamlit.runtime.forward_msg_queue import ForwardMsgQueue
+    from streamlit.testing.v1 import AppTest
+
+    recorder = Recorder()
+    enqueue = ForwardMsgQueue.enqueue
+
+    def recording_enqueue(self, msg):
+        recorder(msg)
+        return enqueue(self, msg)
+
+    ForwardMsgQueue.enqueue = recording_enqueue
+
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    at.secrets["SERPAPI_KEY"] = "bench"
+    at.secrets["OPENAI_API_KEY"] = "sk-bench"
+    at.run()
+    if args.to:
+        at.text_input(key="to_query").set_value(args.to).run()
+    results = [("page load", recorder.take())]
+
+    at.button[0].click().run()
+    if at.exception:
+        raise SystemExit(f"app raised: {at.exception[0].value}")
+    results.append(("search click", recorder.take()))
+    at.session_state["itinerary_job"].wait(60)
+    recorder.take()
+
+    at.selectbox(key="flight_sort").set_value("duration").run()
+    results.append(("re-sort flights", recorder.take()))
+
+    print(f"{'step':<18}{'messages':>10}{'deltas':>8}{'KiB':>10}")
+    for step, (messages, deltas, size, _) in results:
+        print(f"{step:<18}{messages:>10}{deltas:>8}{size / 1024:>10.1f}")
+    print("\nimages referenced:")
+    for url in sorted({url for _, (*_, images) in results for url in images}):
+        print(f"  {'local ' if url.startswith('app/static/') else 'remote'}  {url}")
+
+
+if __name__ == "__main__":
+    main()
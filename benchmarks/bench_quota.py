@@ -0,0 +1,101 @@
+"""Quota pacing over a simulated day of bursty search traffic, no network.
+
+    python benchmarks/bench_quota.py
+    python benchmarks/bench_quota.py --daily 2000 --demand 1.5 --burst-share 0.1
+
+Replays one UTC day of flight searches (a daytime curve plus a spike at
+--spike-hour) against quota.Budget on a simulated clock, twice: paced
+(QUOTA_BURST_SHARE=--burst-share) and with the daily quota alone (share 1:
+the whole allowance is there from midnight). A refused search falls back
+to an expired cached copy for --kept of the routes, else is refused. Per
+hour: searches asked for, served live, served from expired cache and
+refused; then how many minutes of the day had searches asked for but none
+served live.
+"""
+import argparse
+import calendar
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DAY_START = calendar.timegm((2026, 11, 2, 0, 0, 0))
+
+
+def arrivals(total, spike_hour, spike_share, seed):
+    # Seconds into the day: most traffic in the daytime, a share in one spike
+    rng = random.Random(seed)
+    times = []
+    for _ in range(total):
+        if rng.random() < spike_share:
+            hours = rng.gauss(spike_hour, 0.25)
+        else:
+            hours = rng.triangular(7, 23.9, 14)
+        times.append(min(max(hours, 0.0), 23.999) * 3600)
+    return sorted(times)
+
+
+def replay(times, daily, burst_share, kept, seed):
+    from quota import Budget, QuotaExceeded
+
+    os.environ.update(
+        SERPAPI_DAILY_QUOTA=str(daily), QUOTA_BURST_SHARE=str(burst_share), SERPAPI_SESSION_BURST="0",
+    )
+    now = [DAY_START]
+    budget = Budget(path=os.path.join(tempfile.mkdtemp(prefix="bench-quota-"), "quota.sqlite3"),
+                    clock=lambda: now[0])
+    rng = random.Random(seed)
+    hours = [{"asked": 0, "live": 0, "stale": 0, "refused": 0} for _ in range(24)]
+    minutes = {}  # minute -> any live search in it
+    for t in times:
+        now[0] = DAY_START + t
+        hour = hours[int(t // 3600)]
+        hour["asked"] += 1
+        minute = int(t // 60)
+        minutes.setdefault(minute, False)
+        try:
+            budget.spend("serpapi", 1, wait=0)
+            hour["live"] += 1
+            minutes[minute] = True
+        except QuotaExceeded:
+            hour["stale" if rng.random() < kept else "refused"] += 1
+    return hours, sum(not live for live in minutes.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--daily", type=int, default=2000, help="SERPAPI_DAILY_QUOTA")
+    parser.add_argument("--demand", type=float, default=1.5, help="searches asked for, as a multiple of the quota")
+    parser.add_argument("--burst-share", type=float, default=0.1, help="QUOTA_BURST_SHARE when paced")
+    parser.add_argument("--spike-hour", type=float, default=10.5)
+    parser.add_argument("--spike-share", type=float, default=0.25, help="share of the day's traffic in the spike")
+    parser.add_argument("--kept", type=float, default=0.6, help="share of searches with an expired cached copy")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    times = arrivals(int(args.daily * args.demand), args.spike_hour, args.spike_share, args.seed)
+    paced, paced_dark = replay(times, args.daily, args.burst_share, args.kept, args.seed)
+    walled, walled_dark = replay(times, args.daily, 1.0, args.kept, args.seed)
+
+    print(f"{len(times):,} searches asked for against a daily quota of {args.daily:,} "
+          f"(spike at {args.spike_hour:g}h, {args.kept:.0%} with an expired cached copy)\n")
+    print(f"{'':>5} {'':>6}   {'paced (burst ' + format(args.burst_share, '.0%') + ')':^22}   {'quota only':^22}")
+    print(f"{'hour':>5} {'asked':>6}   {'live':>6} {'stale':>7} {'refused':>7}   {'live':>6} {'stale':>7} {'refused':>7}")
+    for hour, (p, w) in enumerate(zip(paced, walled)):
+        if not p["asked"]:
+            continue
+        print(f"{hour:>5} {p['asked']:>6}   {p['live']:>6} {p['stale']:>7} {p['refused']:>7}   "
+              f"{w['live']:>6} {w['stale']:>7} {w['refused']:>7}")
+    for label, hours, dark in (("paced", paced, paced_dark), ("quota only", walled, walled_dark)):
+        live = sum(h["live"] for h in hours)
+        stale = sum(h["stale"] for h in hours)
+        refused = sum(h["refused"] for h in hours)
+        print(f"\n{label:<11}: {live:,} live · {stale:,} from expired cache · {refused:,} refused · "
+              f"{dark:,} min with searches but none live", end="")
+    print()
+
+
+if __name__ == "__main__":
+    main()
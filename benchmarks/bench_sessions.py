@@ -0,0 +1,359 @@
+"""Many concurrent app sessions against local stand-ins: throughput, latency, memory and loop lag.
+
+    python benchmarks/bench_sessions.py                                      # 50 sessions, 60 s
+    python benchmarks/bench_sessions.py --sessions 300 --ramp 30 --think 10 --duration 120
+    python benchmarks/bench_sessions.py --cold --no-itinerary                # every search pays SerpAPI
+
+Starts the stand-ins and `streamlit run app.py` in a subprocess, then opens
+--sessions websocket sessions the way browser tabs do, spread over --ramp
+seconds. Each session loads the page, then until --duration is up: thinks
+(exponential, mean --think seconds), types a route into From / To and
+clicks Search. Like the browser it keeps answering `run_every` polls until
+the itinerary is done, so background jobs cost what they cost in production.
+
+Reports
+    throughput   searches and itineraries finished per second
+    latency      click -> results drawn, click -> itinerary done (p50/p95/p99)
+    memory       server RSS before the sessions, at peak, and per session
+                 (includes one-off growth, so use 100+ sessions to size)
+    loop lag     Streamlit's server loop (round trip of /_stcore/health) and
+                 the app's I/O loop (travel_planner_event_loop_lag_seconds)
+    generator    this process' own loop lag. If it is high, the numbers
+                 measure the load generator, not the server: run fewer
+                 sessions per generator, or several generators.
+
+Linux only for the memory figures (they read /proc).
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+ROUTES = [("kochi", "delhi"), ("mumbai", "goa"), ("delhi", "bengaluru"), ("chennai", "kolkata"), ("hyderabad", "jaipur")]
+WIDGETS = ("button", "text_input")
+FINISHED_EARLY_FOR_RERUN = 2
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)  # as in aio.py
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+async def watch_lag(samples, interval=0.1):
+    # How late this loop runs a due timer
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(loop.time() - started - interval, 0.0))
+
+
+# ================== ONE BROWSER SESSION ==================
+
+class Session:
+    def __init__(self, url, n, timeout):
+        self.url, self.n, self.timeout = url, n, timeout
+        self.widgets = {}     # label -> widget id, from the elements drawn
+        self.values = {}      # label -> text typed; resent on every rerun, as the browser does
+        self.polls = {}       # fragment id -> run_every interval
+        self.page_hash = ""
+        self.finished = asyncio.Queue()
+
+    async def _receive(self, ws):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        async for raw in ws:
+            msg = ForwardMsg()
+            msg.ParseFromString(raw)
+            kind = msg.WhichOneof("type")
+            if kind == "delta":
+                element = msg.delta.new_element
+                widget = element.WhichOneof("type")
+                if widget in WIDGETS:
+                    self.widgets[getattr(element, widget).label] = getattr(element, widget).id
+            elif kind == "new_session":
+                self.page_hash = msg.new_session.page_script_hash
+                if not msg.new_session.fragment_ids_this_run:
+                    self.polls.clear()  # a full run registers its pollers again
+            elif kind == "auto_rerun":
+                self.polls[msg.auto_rerun.fragment_id] = msg.auto_rerun.interval
+            elif kind == "stop_auto_rerun":
+                for fragment_id in msg.stop_auto_rerun.fragment_ids:
+                    self.polls.pop(fragment_id, None)
+            elif kind == "script_finished":
+                self.finished.put_nowait(msg.script_finished)
+
+    async def rerun(self, ws, click=None, fragment_id=""):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+
+        msg = BackMsg()
+        state = msg.rerun_script
+        state.query_string = ""
+        state.page_script_hash = self.page_hash
+        if fragment_id:
+            state.fragment_id = fragment_id
+            state.is_auto_rerun = True
+        for label, value in self.values.items():
+            widget = state.widget_states.widgets.add()
+            widget.id, widget.string_value = self.widgets[label], value
+        if click:
+            widget = state.widget_states.widgets.add()
+            widget.id, widget.trigger_value = self.widgets[click], True
+        await ws.send(msg.SerializeToString())
+        # A fragment that calls st.rerun() ends early, then the full run follows
+        while await asyncio.wait_for(self.finished.get(), self.timeout) == FINISHED_EARLY_FOR_RERUN:
+            pass
+
+    async def search(self, ws, route, with_itinerary):
+        self.values["from_query"], self.values["to_query"] = route
+        clicked = time.perf_counter()
+        await self.rerun(ws, click="Search")
+        results_at = time.perf_counter()
+        if not with_itinerary:
+            return results_at - clicked, None
+        # Answer run_every polls until no section is waiting on a job
+        while self.polls:
+            fragment_id, interval = next(iter(self.polls.items()))
+            await asyncio.sleep(interval)
+            await self.rerun(ws, fragment_id=fragment_id)
+        return results_at - clicked, time.perf_counter() - clicked
+
+    async def run(self, stop_at, args, stats, max_searches=None):
+        import websockets
+
+        async with websockets.connect(
+            self.url, subprotocols=["streamlit"], max_size=None, ping_interval=None,
+            open_timeout=self.timeout,
+        ) as ws:
+            receiver = asyncio.create_task(self._receive(ws))
+            try:
+                await self.rerun(ws)
+                stats["open"] += 1
+                i = 0
+                while i != max_searches:
+                    think = random.expovariate(1 / args.think) if args.think > 0 else 0
+                    if time.perf_counter() + think >= stop_at:
+                        break
+                    await asyncio.sleep(think)
+                    results_s, itinerary_s = await self.search(
+                        ws, ROUTES[(self.n + i) % len(ROUTES)], not args.no_itinerary,
+                    )
+                    stats["results"].append(results_s)
+                    if itinerary_s is not None:
+                        stats["itinerary"].append(itinerary_s)
+                    stats["last_done"] = time.perf_counter()
+                    i += 1
+                if max_searches is None:
+                    # Stay connected until the end, so memory is measured with every session open
+                    await asyncio.sleep(max(stop_at - time.perf_counter(), 0))
+            finally:
+                receiver.cancel()
+
+
+# ================== LOAD ==================
+
+async def probe_health(base_url, samples, stop_at, interval=0.2):
+    import httpx
+
+    async with httpx.AsyncClient(timeout=30) as http:
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            await http.get(base_url + "/_stcore/health")
+            samples.append(time.perf_counter() - started)
+            await asyncio.sleep(interval)
+
+
+async def load(base_url, args, server_pid):
+    ws_url = base_url.replace("http", "ws", 1) + "/_stcore/stream"
+    def new_stats():
+        return {"open": 0, "results": [], "itinerary": [], "errors": 0, "last_done": None, "rss": []}
+
+    # One untimed search first: imports, airport index, first connections
+    await Session(ws_url, 0, args.timeout).run(
+        time.perf_counter() + args.timeout, argparse.Namespace(**{**vars(args), "think": 0}), new_stats(),
+        max_searches=1,
+    )
+    stats = new_stats()
+    idle_health = []
+    await probe_health(base_url, idle_health, time.perf_counter() + 2, interval=0.1)
+    rss_before = rss_mb(server_pid)
+    io_lag_before = await scrape_lag(args.metrics_port)
+
+    generator_lag, health = [], []
+    started = time.perf_counter()
+    stop_at = started + args.duration
+    lag_task = asyncio.create_task(watch_lag(generator_lag))
+
+    async def session(n):
+        await asyncio.sleep(args.ramp * n / max(args.sessions, 1))
+        try:
+            await Session(ws_url, n, args.timeout).run(stop_at, args, stats)
+        except Exception as e:
+            stats["errors"] += 1
+            if stats["errors"] <= 3:
+                print(f"session {n}: {type(e).__name__}: {e}", file=sys.stderr)
+
+    async def sample_rss():
+        while time.perf_counter() < stop_at:
+            stats["rss"].append((stats["open"], rss_mb(server_pid)))
+            await asyncio.sleep(0.5)
+
+    await asyncio.gather(
+        *(session(n) for n in range(args.sessions)),
+        probe_health(base_url, health, stop_at), sample_rss(),
+    )
+    lag_task.cancel()
+    io_lag = diff_lag(await scrape_lag(args.metrics_port), io_lag_before)
+    elapsed = (stats["last_done"] or time.perf_counter()) - started
+    return stats, elapsed, rss_before, idle_health, health, io_lag, generator_lag
+
+
+async def scrape_lag(port):
+    # {le: cumulative count} of the app's I/O loop lag histogram
+    import httpx
+
+    async with httpx.AsyncClient(timeout=10) as http:
+        text = (await http.get(f"http://127.0.0.1:{port}/metrics")).text
+    buckets = {}
+    for line in text.splitlines():
+        if line.startswith("travel_planner_event_loop_lag_seconds_bucket"):
+            le = line.split('le="')[1].split('"')[0]
+            buckets[float(le)] = float(line.rsplit(" ", 1)[1])
+    return buckets
+
+
+def diff_lag(after, before):
+    return {le: count - before.get(le, 0) for le, count in after.items()}
+
+
+def bucket_quantile(buckets, q):
+    # Upper bound of the bucket holding the q-quantile
+    total = max(buckets.values(), default=0)
+    for le in sorted(buckets):
+        if total and buckets[le] >= q * total:
+            return le
+    return None
+
+
+def bucket_label(le):
+    return f"> {LAG_BUCKETS[-1] * 1000:g} ms" if le == float("inf") else f"≤ {le * 1000:g} ms"
+
+
+def describe(samples, unit=1000):
+    if not samples:
+        return "no samples"
+    return (f"p50 {statistics.median(samples) * unit:,.0f} · p95 {percentile(samples, 0.95) * unit:,.0f} · "
+            f"p99 {percentile(samples, 0.99) * unit:,.0f} · max {max(samples) * unit:,.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--ramp", type=float, default=10.0, help="seconds over which sessions connect")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds from the first connection")
+    parser.add_argument("--think", type=float, default=5.0, help="mean seconds between a session's searches")
+    parser.add_argument("--no-itinerary", action="store_true", help="stop timing at the flight results")
+    parser.add_argument("--cold", action="store_true", help="flight / itinerary caches off")
+    parser.add_argument("--serp-latency", type=float, default=0.3)
+    parser.add_argument("--llm-ttft", type=float, default=0.6)
+    parser.add_argument("--llm-token-delay", type=float, default=0.005)
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for one script run")
+    args = parser.parse_args()
+
+    from stubs import start_in_background
+
+    stub, stub_url = start_in_background(
+        serp_latency=args.serp_latency, llm_ttft=args.llm_ttft, llm_token_delay=args.llm_token_delay,
+    )
+    workdir = tempfile.mkdtemp(prefix="bench-sessions-")
+    secrets = os.path.join(workdir, "secrets.toml")
+    with open(secrets, "w") as f:
+        f.write('SERPAPI_KEY = "bench"\nOPENAI_API_KEY = "sk-bench"\n')
+    port, args.metrics_port = free_port(), free_port()
+    env = dict(
+        os.environ, SERPAPI_BASE_URL=stub_url, OPENAI_BASE_URL=stub_url + "/v1",
+        CACHE_DIR=os.path.join(workdir, "cache"), REMOTE_ASSET_CACHING="0", METRICS_PORT=str(args.metrics_port),
+    )
+    if args.cold:
+        for name in ("FLIGHT_CACHE_TTL", "FLIGHT_CACHE_STALE_TTL", "ITINERARY_CACHE_TTL"):
+            env[name] = "0"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", os.path.join(ROOT, "app.py"),
+         "--server.headless", "true", "--server.port", str(port), "--server.fileWatcherType", "none",
+         "--browser.gatherUsageStats", "false", "--secrets.files", secrets],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        import httpx
+
+        for _ in range(150):
+            try:
+                if httpx.get(base_url + "/_stcore/health", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        stats, elapsed, rss_before, idle_health, health, io_lag, generator_lag = asyncio.run(
+            load(base_url, args, server.pid)
+        )
+    finally:
+        server.terminate()
+        server.wait(10)
+
+    searches, itineraries = stats["results"], stats["itinerary"]
+    print(f"{args.sessions} sessions ({stats['open']} connected, {stats['errors']} failed) · "
+          f"think {args.think:g} s · {elapsed:.0f} s · caches {'off' if args.cold else 'on'} · "
+          f"stand-in SerpAPI {args.serp_latency * 1000:.0f} ms, LLM first token {args.llm_ttft * 1000:.0f} ms")
+    print(f"throughput : {len(searches) / elapsed:.2f} searches/s"
+          + (f", {len(itineraries) / elapsed:.2f} itineraries/s" if itineraries else "")
+          + f" · stand-in calls {stub.RequestHandlerClass.requests}")
+    print(f"results    : {describe(searches)}")
+    if itineraries:
+        print(f"itinerary  : {describe(itineraries)}")
+
+    rss = [(n, mb) for n, mb in stats["rss"] if mb is not None]
+    if rss_before is not None and rss:
+        peak_open, peak = max(rss, key=lambda r: r[1])
+        per_session = (peak - rss_before) / max(peak_open, 1)
+        print(f"memory     : RSS {rss_before:,.0f} MB before, peak {peak:,.0f} MB with {peak_open} sessions "
+              f"≈ {per_session:,.2f} MB per session")
+    else:
+        print("memory     : n/a (needs /proc)")
+
+    print(f"server loop: health check {describe(health)} (idle p50 {statistics.median(idle_health) * 1000:.1f} ms)")
+    if io_lag and max(io_lag.values()) > 0:
+        print(f"I/O loop   : lag p50 {bucket_label(bucket_quantile(io_lag, 0.5))} · "
+              f"p99 {bucket_label(bucket_quantile(io_lag, 0.99))} ({max(io_lag.values()):.0f} samples)")
+    print(f"generator  : loop lag {describe(generator_lag)}")
+    if generator_lag and percentile(generator_lag, 0.99) > 0.1:
+        print("             ⚠️ the load generator itself is saturated; spread sessions over more processes")
+
+
+if __name__ == "__main__":
+    main()
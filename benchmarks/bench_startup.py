@@ -0,0 +1,202 @@
+"""Cold start: import time of the app's modules and time to first paint, against local stand-ins.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 5
+
+Import time: a fresh interpreter imports what app.py imports, under
+`python -X importtime`. The report lists the slowest top-level packages and
+whether the openai / serpapi SDKs were among them (they load on the first
+search, not at startup).
+
+First paint: starts `streamlit run app.py` --runs times and reports the
+median of
+    server ready    process start -> /_stcore/health answers
+    first paint     websocket open -> first element drawn
+    page complete   websocket open -> script run finished
+for the first session of each process (cold: the app's imports, airport
+index, compiled page templates) and a second one (warm), with the bytes
+sent per page load and the size of the stylesheet the browser fetches once.
+"""
+import argparse
+import ast
+import asyncio
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+LAZY_SDKS = ("openai", "serpapi")
+STYLESHEET = re.compile(r'<link rel="stylesheet" href="([^"]+)"')
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# ================== IMPORT TIME ==================
+
+def app_imports():
+    with open(os.path.join(ROOT, "app.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def _import_lines(stderr):
+    # (module, cumulative seconds, imported by another module?) per `-X importtime` line
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            yield name.strip(), int(cumulative) / 1e6, name.startswith("  ")
+
+
+def import_times(modules):
+    # (wall seconds, {top-level package: cumulative seconds}, every module imported)
+    code = (
+        "import time; started = time.perf_counter(); "
+        f"import {', '.join(modules)}; print(time.perf_counter() - started)"
+    )
+    done = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    # Interpreter startup (site, encodings) is not the app's
+    startup = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "pass"], capture_output=True, text=True, check=True,
+    ).stderr
+    startup = {name for name, _, _ in _import_lines(startup)}
+    packages, imported = {}, set()
+    for name, cumulative, nested in _import_lines(done.stderr):
+        imported.add(name.split(".")[0])
+        if not nested and name not in startup:
+            package = name.split(".")[0]
+            packages[package] = packages.get(package, 0) + cumulative
+    return float(done.stdout.strip().splitlines()[-1]), packages, imported
+
+
+# ================== FIRST PAINT ==================
+
+async def page_load(base_url):
+    # (first paint s, page complete s, bytes received, stylesheet URL) for one new session
+    import websockets
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+    opened = time.perf_counter()
+    first_paint, received, stylesheet = None, 0, None
+    async with websockets.connect(
+        base_url.replace("http", "ws", 1) + "/_stcore/stream", subprotocols=["streamlit"], max_size=None,
+    ) as ws:
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        await ws.send(msg.SerializeToString())
+        async for raw in ws:
+            received += len(raw)
+            forward = ForwardMsg()
+            forward.ParseFromString(raw)
+            kind = forward.WhichOneof("type")
+            if kind == "delta":
+                first_paint = first_paint or time.perf_counter() - opened
+                match = STYLESHEET.search(forward.delta.new_element.markdown.body)
+                stylesheet = stylesheet or (match and match.group(1))
+            elif kind == "script_finished":
+                return first_paint, time.perf_counter() - opened, received, stylesheet
+
+
+def start_server(port, env):
+    return subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", os.path.join(ROOT, "app.py"),
+         "--server.headless", "true", "--server.port", str(port), "--server.fileWatcherType", "none",
+         "--browser.gatherUsageStats", "false", "--secrets.files", env["BENCH_SECRETS"]],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def one_start(env):
+    import httpx
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = start_server(port, env)
+    try:
+        while True:
+            try:
+                if httpx.get(base_url + "/_stcore/health", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.perf_counter() - started > 60:
+                raise SystemExit("server did not start within 60 s")
+            time.sleep(0.02)
+        ready = time.perf_counter() - started
+        cold = asyncio.run(page_load(base_url))
+        warm = asyncio.run(page_load(base_url))
+        css_bytes = None
+        if cold[3]:
+            css_bytes = len(httpx.get(f"{base_url}/{cold[3]}", timeout=5).content)
+        return ready, cold, warm, css_bytes
+    finally:
+        server.terminate()
+        server.wait(10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=8, help="slowest packages to list")
+    args = parser.parse_args()
+
+    modules = app_imports()
+    wall, packages, imported = import_times(modules)
+    print(f"imports    : {wall * 1000:,.0f} ms for app.py's {len(modules)} imports (fresh interpreter)")
+    for package, seconds in sorted(packages.items(), key=lambda p: -p[1])[:args.top]:
+        print(f"             {package:<16}{seconds * 1000:>8,.0f} ms")
+    eager = [sdk for sdk in LAZY_SDKS if sdk in imported]
+    print(f"             SDKs at startup: {', '.join(eager) if eager else 'none (' + ', '.join(LAZY_SDKS) + ' load on first search)'}")
+
+    from stubs import start_in_background
+
+    _, stub_url = start_in_background()
+    workdir = tempfile.mkdtemp(prefix="bench-startup-")
+    secrets = os.path.join(workdir, "secrets.toml")
+    with open(secrets, "w") as f:
+        f.write('SERPAPI_KEY = "bench"\nOPENAI_API_KEY = "sk-bench"\n')
+    env = dict(
+        os.environ, SERPAPI_BASE_URL=stub_url, OPENAI_BASE_URL=stub_url + "/v1",
+        CACHE_DIR=os.path.join(workdir, "cache"), REMOTE_ASSET_CACHING="0", BENCH_SECRETS=secrets,
+    )
+
+    runs = [one_start(env) for _ in range(args.runs)]
+    ready = statistics.median(r[0] for r in runs)
+    print(f"\nserver     : ready {ready * 1000:,.0f} ms after process start (median of {args.runs})")
+    for label, i in (("cold page", 1), ("warm page", 2)):
+        first_paint = statistics.median(r[i][0] for r in runs)
+        complete = statistics.median(r[i][1] for r in runs)
+        received = statistics.median(r[i][2] for r in runs)
+        print(f"{label:<11}: first paint {first_paint * 1000:,.0f} ms · complete {complete * 1000:,.0f} ms · "
+              f"{received / 1024:,.1f} KiB sent")
+    css_bytes = runs[-1][3]
+    if css_bytes is not None:
+        print(f"stylesheet : {css_bytes / 1024:,.1f} KiB, fetched once per browser ({runs[-1][1][3]})")
+    else:
+        print("stylesheet : inline <style>, sent with every page load")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Flight lookup tail latency with retries, hedging and a deadline, against local stand-ins.
+
+    python benchmarks/bench_tail_latency.py
+    python benchmarks/bench_tail_latency.py --searches 400 --slow-rate 0.1 --error-rate 0.02 --deadline 5
+
+The stand-in answers most searches in --latency seconds, a --slow-rate share
+in --slow-latency seconds and an --error-rate share with a 503. Every mode
+runs the same number of uncached fetch_flights() calls, a few at a time:
+
+    plain      no retries, no hedging, no deadline (the old behaviour)
+    retries    SERPAPI_MAX_RETRIES with jittered backoff, under --deadline
+    hedged     retries + SERPAPI_HEDGE=1 (duplicate after the recent p95)
+
+and reports latency percentiles (failed searches included, at the time they
+gave up), failures and upstream requests per search.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import nullcontext
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    "plain": {"SERPAPI_MAX_RETRIES": "0", "SERPAPI_HEDGE": "0"},
+    "retries": {"SERPAPI_MAX_RETRIES": "2", "SERPAPI_HEDGE": "0"},
+    "hedged": {"SERPAPI_MAX_RETRIES": "2", "SERPAPI_HEDGE": "1"},
+}
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def run_mode(mode, searches, concurrency, deadline_s, offset):
+    from aio import deadline
+    from fanout import fan_out
+    from flights import fetch_flights
+    from http_clients import pool_stats
+
+    os.environ.update(MODES[mode])
+    requests_before = pool_stats().get("serpapi", {}).get("requests", 0)
+
+    def one(n):
+        # Distinct dates, so nothing is served from the cache or coalesced
+        dep = date(2027, 1, 1) + timedelta(days=offset + n)
+        started = time.perf_counter()
+        try:
+            with deadline(deadline_s) if mode != "plain" else nullcontext():
+                data, _ = fetch_flights("COK", "DEL", dep, dep + timedelta(days=3), force_refresh=True, api_key="x")
+            failed = "error" in data
+        except Exception:
+            failed = True
+        # A failed search is waited for too, so it counts in the latency
+        return time.perf_counter() - started, failed
+
+    latencies, failures = [], 0
+    for _, (elapsed, failed), _ in fan_out({n: (lambda n=n: one(n)) for n in range(searches)},
+                                           max_concurrency=concurrency):
+        latencies.append(elapsed)
+        failures += failed
+    sent = pool_stats()["serpapi"]["requests"] - requests_before
+    return latencies, failures, sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--searches", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--deadline", type=float, default=8.0, help="seconds per search (SEARCH_DEADLINE share)")
+    args = parser.parse_args()
+
+    from stubs import start_in_background
+
+    _, base_url = start_in_background(
+        serp_latency=args.latency, serp_slow_rate=args.slow_rate,
+        serp_slow_latency=args.slow_latency, serp_error_rate=args.error_rate,
+    )
+    os.environ["SERPAPI_BASE_URL"] = base_url
+    os.environ["CACHE_DIR"] = tempfile.mkdtemp(prefix="bench-cache-")
+
+    print(f"{'mode':<9}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'max s':>8}{'failed':>8}{'req/search':>12}")
+    for i, mode in enumerate(MODES):
+        latencies, failures, sent = run_mode(mode, args.searches, args.concurrency, args.deadline,
+                                             offset=i * args.searches)
+        print(f"{mode:<9}{statistics.median(latencies):>8.2f}{percentile(latencies, 0.95):>8.2f}"
+              f"{percentile(latencies, 0.99):>8.2f}{max(latencies):>8.2f}"
+              f"{failures / args.searches:>8.1%}{sent / args.searches:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""Local stand-ins for SerpAPI (Google Flights) and the OpenAI chat API.
+
+    python benchmarks/stubs.py --port 8765
+    SERPAPI_BASE_URL=http://127.0.0.1:8765 OPENAI_BASE_URL=http://127.0.0.1:8765/v1 streamlit run app.py
+
+GET /search serves the recorded Google Flights response in
+fixtures/google_flights/<FROM>-<TO>.json. Routes without a recording reuse
+COK-DEL.json with the airport codes swapped. Dates are rewritten to the
+ones asked for. POST /v1/chat/completions replays fixtures/itinerary.md,
+streamed word by word (SSE) when the request asks for a stream, with its
+days repeated up to the "<N>-day" the prompt asks for. Requests with a
+JSON schema response_format get fixtures/itinerary.json instead: the
+whole itinerary, the outline of a long trip ("outline" schema: no days,
+an area + theme per day) or one "Day <n> of" ("day" schema). Either
+stops early with finish_reason "length" at the request's max_tokens (one
+word = one token here).
+
+For tail-latency tests, a share of searches can be made slow
+(--serp-slow-rate / --serp-slow-latency) or answered with a 503
+(--serp-error-rate).
+"""
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+DEFAULT_ROUTE = ("COK", "DEL")
+OUTLINE_KEYS = ("overview", "flight_choice", "hotels", "plan", "cost_breakdown", "summary")
+
+
+def load_fixture(departure_id, arrival_id, outbound_date, return_date):
+    path = os.path.join(FIXTURES, "google_flights", f"{departure_id}-{arrival_id}.json")
+    route = (departure_id, arrival_id)
+    if not os.path.exists(path):
+        path = os.path.join(FIXTURES, "google_flights", "%s-%s.json" % DEFAULT_ROUTE)
+        route = DEFAULT_ROUTE
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    params = json.loads(text)["search_parameters"]
+    text = text.replace(params["outbound_date"], outbound_date or params["outbound_date"])
+    text = text.replace(params["return_date"], return_date or params["return_date"])
+    if route != (departure_id, arrival_id):
+        text = text.replace(f'"id": "{route[0]}"', f'"id": "{departure_id}"')
+        text = text.replace(f'"id": "{route[1]}"', f'"id": "{arrival_id}"')
+    return text.encode("utf-8")
+
+
+def split_words(text):
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+def requested_days(messages, default):
+    match = re.search(r"(\d+)-day", " ".join(m.get("content", "") for m in messages))
+    return int(match.group(1)) if match else default
+
+
+def markdown_words(messages):
+    with open(os.path.join(FIXTURES, "itinerary.md"), encoding="utf-8") as f:
+        text = f.read()
+    head, _, rest = text.partition("### Day ")
+    days_text, _, tail = ("### Day " + rest).partition("## Cost")
+    days = re.split(r"(?=### Day )", days_text)[1:]
+    num_days = requested_days(messages, len(days))
+    days = [re.sub(r"### Day \d+", f"### Day {i + 1}", days[i % len(days)]) for i in range(num_days)]
+    return split_words(head + "".join(days) + "## Cost" + tail)
+
+
+def structured_words(messages, schema="itinerary"):
+    with open(os.path.join(FIXTURES, "itinerary.json"), encoding="utf-8") as f:
+        data = json.load(f)
+    days = data["days"]
+    if schema == "day":
+        match = re.search(r"Day (\d+) of", " ".join(m.get("content", "") for m in messages))
+        day = int(match.group(1)) if match else 1
+        return split_words(json.dumps(dict(days[(day - 1) % len(days)], day=day), ensure_ascii=False, indent=1))
+    num_days = requested_days(messages, len(days))
+    days = [dict(days[i % len(days)], day=i + 1) for i in range(num_days)]
+    if schema == "outline":
+        plan = [{"day": d["day"], "area": d["title"], "theme": d["morning"].split(".")[0]} for d in days]
+        data = {key: plan if key == "plan" else data[key] for key in OUTLINE_KEYS}
+    else:
+        data["days"] = days
+    return split_words(json.dumps(data, ensure_ascii=False, indent=1))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Set by make_server()
+    serp_latency = 0.0
+    serp_slow_rate = 0.0
+    serp_slow_latency = 0.0
+    serp_error_rate = 0.0
+    llm_ttft = 0.0
+    llm_token_delay = 0.0
+    requests = {"search": 0, "chat": 0}
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/search":
+            self.send_error(404)
+            return
+        self.requests["search"] += 1
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        roll = random.random()
+        if roll < self.serp_error_rate:
+            time.sleep(self.serp_latency)
+            self.send_error(503, "stand-in overload")
+            return
+        slow = roll < self.serp_error_rate + self.serp_slow_rate
+        time.sleep(self.serp_slow_latency if slow else self.serp_latency)
+        body = load_fixture(
+            query.get("departure_id", DEFAULT_ROUTE[0]), query.get("arrival_id", DEFAULT_ROUTE[1]),
+            query.get("outbound_date"), query.get("return_date"),
+        )
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client gave up (deadline, or the other copy of a hedged request won)
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/v1/chat/completions":
+            self.send_error(404)
+            return
+        self.requests["chat"] += 1
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt_tokens = sum(len(m.get("content", "").split()) for m in request.get("messages", []))
+        response_format = request.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            words = structured_words(request.get("messages", []), response_format["json_schema"].get("name"))
+        else:
+            words = markdown_words(request.get("messages", []))
+        finish_reason = "stop"
+        if request.get("max_tokens") and len(words) > request["max_tokens"]:
+            words, finish_reason = words[:request["max_tokens"]], "length"
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(words),
+            "total_tokens": prompt_tokens + len(words),
+        }
+        model = request.get("model", "stub")
+        time.sleep(self.llm_ttft)
+
+        if not request.get("stream"):
+            time.sleep(self.llm_token_delay * len(words))
+            body = json.dumps({
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+                "model": model, "usage": usage,
+                "choices": [{
+                    "index": 0, "finish_reason": finish_reason,
+                    "message": {"role": "assistant", "content": "".join(words)},
+                }],
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            for i, word in enumerate(words):
+                if i:
+                    time.sleep(self.llm_token_delay)
+                self._event(self._chunk(model, [{"index": 0, "delta": {"content": word}}]))
+            self._event(self._chunk(model, [{"index": 0, "delta": {}, "finish_reason": finish_reason}]))
+            if (request.get("stream_options") or {}).get("include_usage"):
+                self._event(dict(self._chunk(model, []), usage=usage))
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client cancelled the stream
+
+    def _chunk(self, model, choices):
+        return {
+            "id": "chatcmpl-stub", "object": "chat.completion.chunk",
+            "created": int(time.time()), "model": model, "choices": choices,
+        }
+
+    def _event(self, payload):
+        self.wfile.write(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+        self.wfile.flush()
+
+
+def make_server(port=0, serp_latency=0.0, llm_ttft=0.0, llm_token_delay=0.0,
+                serp_slow_rate=0.0, serp_slow_latency=0.0, serp_error_rate=0.0):
+    handler = type("Handler", (StubHandler,), {
+        "serp_latency": serp_latency,
+        "serp_slow_rate": serp_slow_rate,
+        "serp_slow_latency": serp_slow_latency,
+        "serp_error_rate": serp_error_rate,
+        "llm_ttft": llm_ttft,
+        "llm_token_delay": llm_token_delay,
+        "requests": {"search": 0, "chat": 0},
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_background(**options):
+    """Start the stand-ins on a free port; returns (server, base_url)."""
+    server = make_server(**options)
+    threading.Thread(target=server.serve_forever, name="stubs", daemon=True).start()
+    return server, "http://127.0.0.1:%d" % server.server_address[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--serp-latency", type=float, default=0.3, help="seconds per flight search")
+    parser.add_argument("--llm-ttft", type=float, default=0.6, help="seconds before the first token")
+    parser.add_argument("--llm-token-delay", type=float, default=0.01, help="seconds between streamed words")
+    parser.add_argument("--serp-slow-rate", type=float, default=0.0, help="share of searches that are slow")
+    parser.add_argument("--serp-slow-latency", type=float, default=10.0, help="seconds for a slow search")
+    parser.add_argument("--serp-error-rate", type=float, default=0.0, help="share of searches answered with 503")
+    args = parser.parse_args()
+    server = make_server(
+        args.port, args.serp_latency, args.llm_ttft, args.llm_token_delay,
+        args.serp_slow_rate, args.serp_slow_latency, args.serp_error_rate,
+    )
+    print(f"SERPAPI_BASE_URL=http://127.0.0.1:{args.port}")
+    print(f"OPENAI_BASE_URL=http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
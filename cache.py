@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, NamedTuple, Optional
+
+from config import cache_dir
+from singleflight import SingleFlight
+
+# ================== TIERED TTL CACHE ==================
+# Two tiers: a per-process LRU dict in front of a SQLite file that survives
+# restarts and is shared by every worker on the box. Entries younger than
+# `ttl` are fresh; entries up to `ttl + stale_ttl` old are served as-is while
+# a background refresh replaces them (stale-while-revalidate). Concurrent
+# misses on one key share a single load (single-flight). Older entries are
+# kept for another `keep_ttl` seconds, for peek() only: a last resort when
+# the upstream can't be asked (see quota.py).
+
+_REFRESH_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+
+
+class CacheInfo(NamedTuple):
+    state: str  # "fresh", "stale", "miss", "shared" (joined an in-flight load) or "expired"
+    age: float  # seconds since the value was stored (0 for a miss)
+
+
+def make_key(parts) -> str:
+    raw = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def format_age(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds // 3600}h {(seconds % 3600) // 60:02d}m"
+
+
+class TieredCache:
+    def __init__(self, name: str, ttl: float, stale_ttl: float = 0.0,
+                 max_entries: int = 512, max_disk_entries: Optional[int] = None,
+                 path: Optional[str] = None, keep_ttl: float = 0.0):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.keep_ttl = keep_ttl
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.path = path or os.path.join(cache_dir(), "travel_planner.sqlite3")
+
+        self._memory: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._refreshing: set = set()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._stats = {
+            "hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "refreshes": 0, "refresh_errors": 0,
+        }
+        self._loads = SingleFlight(f"cache:{name}")
+
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        with self._db_lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL,"
+                " stored_at REAL NOT NULL, value TEXT NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            self._db.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND stored_at < ?",
+                (self.name, time.time() - self.ttl - self.stale_ttl - self.keep_ttl),
+            )
+
+    # ----- tiers -----
+
+    def _read(self, key: str):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT stored_at, value FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.name, key),
+            ).fetchone()
+        if row is None:
+            return None
+        entry = (row[0], json.loads(row[1]))
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: str, entry) -> None:
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def set(self, key: str, value: Any) -> None:
+        entry = (time.time(), value)
+        self._remember(key, entry)
+        with self._db_lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, stored_at, value) VALUES (?, ?, ?, ?)",
+                (self.name, key, entry[0], json.dumps(value)),
+            )
+            if self.max_disk_entries is not None:
+                self._db.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+                    " SELECT key FROM cache_entries WHERE namespace = ?"
+                    " ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                    (self.name, self.name, self.max_disk_entries),
+                )
+
+    # ----- lookups -----
+
+    def lookup(self, parts):
+        # Peek without loading: (value, CacheInfo) for a fresh entry, else None.
+        entry = self._read(make_key(parts))
+        if entry is not None and time.time() - entry[0] <= self.ttl:
+            self._count("hits")
+            return entry[1], CacheInfo("fresh", time.time() - entry[0])
+        self._count("misses")
+        return None
+
+    def peek(self, parts):
+        # Any entry still kept, however old: (value, CacheInfo) or None. Not counted.
+        entry = self._read(make_key(parts))
+        if entry is None:
+            return None
+        age = time.time() - entry[0]
+        if age > self.ttl + self.stale_ttl + self.keep_ttl:
+            return None
+        state = "fresh" if age <= self.ttl else "stale" if age <= self.ttl + self.stale_ttl else "expired"
+        return entry[1], CacheInfo(state, age)
+
+    def store(self, parts, value: Any) -> None:
+        self.set(make_key(parts), value)
+
+    def get_or_load(self, parts, loader: Callable[[], Any],
+                    cacheable: Callable[[Any], bool] = lambda value: True,
+                    force_refresh: bool = False):
+        key = make_key(parts)
+        entry = None if force_refresh else self._read(key)
+        if entry is not None:
+            age = time.time() - entry[0]
+            if age <= self.ttl:
+                self._count("hits")
+                return entry[1], CacheInfo("fresh", age)
+            if age <= self.ttl + self.stale_ttl:
+                self._count("stale_hits")
+                self._refresh_in_background(key, loader, cacheable)
+                return entry[1], CacheInfo("stale", age)
+
+        self._count("misses")
+
+        def load():
+            # A load that finished between our read and this flight already stored it
+            if not force_refresh:
+                entry = self._read(key)
+                if entry is not None and time.time() - entry[0] <= self.ttl:
+                    return entry[1], CacheInfo("fresh", time.time() - entry[0])
+            value = loader()
+            if cacheable(value):
+                self.set(key, value)
+            return value, CacheInfo("miss", 0.0)
+
+        (value, info), shared = self._loads.do(key, load)
+        if shared:
+            self._count("coalesced")
+            return value, CacheInfo("shared", 0.0)
+        return value, info
+
+    def _refresh_in_background(self, key, loader, cacheable) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                value = loader()
+                if cacheable(value):
+                    self.set(key, value)
+                self._count("refreshes")
+            except Exception:
+                self._count("refresh_errors")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        _REFRESH_POOL.submit(refresh)
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self._stats[stat] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["hits"] + stats["stale_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+# ================== PROCESS-WIDE REGISTRY ==================
+
+_CACHES: dict = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_cache(name: str, **options) -> TieredCache:
+    with _CACHES_LOCK:
+        cache = _CACHES.get(name)
+        if cache is None:
+            cache = _CACHES[name] = TieredCache(name, **options)
+        return cache
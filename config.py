@@ -0,0 +1,48 @@
+import os
+
+# ================== RUNTIME SETTINGS ==================
+# Settings are read from the environment when first needed. Streamlit promotes
+# root-level keys of .streamlit/secrets.toml to environment variables, so a
+# knob can live in either place:
+#
+#   FLIGHT_CACHE_TTL = 900         # seconds a fare result counts as fresh
+#   FLIGHT_CACHE_STALE_TTL = 3600  # extra seconds it may be served while refreshing
+#   FLIGHT_CACHE_MAX_ENTRIES = 512 # in-memory LRU size per process
+#   CACHE_DIR = ".cache"           # where the on-disk SQLite tier lives
+#   FARE_HISTORY_PATH = ""         # default: $CACHE_DIR/fare_history.sqlite3
+#   FARE_HISTORY_LOOKBACK_DAYS = 90  # window for price history and verdicts
+#   SEARCH_DEADLINE = 90           # seconds for a whole search, flights + itinerary
+#   SEARCH_FLIGHTS_SHARE = 0.3     # share of that the flight lookup may use
+#   SERPAPI_DAILY_QUOTA = 0        # searches per UTC day, 0 = no quota (see quota.py)
+#   SERPAPI_MONTHLY_QUOTA = 0      # searches per UTC month
+#   OPENAI_DAILY_QUOTA = 0         # tokens per UTC day; OPENAI_MONTHLY_QUOTA likewise
+#   SERPAPI_SESSION_BURST = 60     # per-session bucket: searches at once...
+#   SERPAPI_SESSION_PER_MINUTE = 10  # ...and refill (OPENAI_*: 20000 / 4000 tokens)
+#   QUOTA_QUEUE_WAIT = 5           # seconds a request may wait for its budget
+#   FX_RATES_URL = "https://open.er-api.com/v6/latest/INR"  # "off" = bundled rates only
+#   FX_RATES_TTL = 21600           # seconds a fetched rate table counts as fresh (see fx.py)
+
+
+def env_str(name: str, default: str = "") -> str:
+    value = os.environ.get(name)
+    return default if value is None or value == "" else value
+
+
+def env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def cache_dir() -> str:
+    path = env_str("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+    os.makedirs(path, exist_ok=True)
+    return path
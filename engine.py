@@ -0,0 +1,253 @@
+from dataclasses import dataclass
+import logging
+from typing import List, Optional, Tuple
+
+from aio import Deadline, deadline
+from airports import airport_index
+from config import env_float, env_int
+from fare_history import fare_history, history_route
+from flights import (
+    FlightRecord, Pair, airport_pairs, fetch_flights, oldest_cache_info, parse_flights, rank_flights,
+    search_airport_pairs,
+)
+from itinerary import (
+    SYSTEM_PROMPT,
+    ItineraryJob,
+    build_itinerary_prompt,
+    build_outline_prompt,
+    build_structured_prompt,
+    estimate_tokens,
+    itinerary_cache,
+    itinerary_cache_key,
+    itinerary_format,
+    itinerary_max_tokens,
+    itinerary_messages,
+    itinerary_response_format,
+    outline_max_tokens,
+    outline_response_format,
+    use_parallel_days,
+)
+from quota import QuotaExceeded, budget, degraded
+from timings import span
+
+logger = logging.getLogger(__name__)
+
+# ================== SEARCH ENGINE ==================
+# What one search does, with no UI attached: resolve cities to airports,
+# fetch and rank fares on every airport pair, summarise prices and start
+# (or reuse) the itinerary. The Streamlit app (app.py) and the JSON API
+# (api.py) are thin layers over these functions.
+
+
+# ----- places -----
+
+def resolve_city(text: str) -> Optional[str]:
+    return airport_index().resolve_city(text) if text and text.strip() else None
+
+
+def city_airports(city_key: Optional[str], fallback: str) -> List[str]:
+    # Every airport of the city is searched; the first one labels the route
+    codes = [a.iata for a in airport_index().airports_for_city(city_key)] if city_key else []
+    return codes or [fallback]
+
+
+# ----- flights -----
+
+def build_booking_link(flight, source, destination, departure_date, return_date):
+    token = flight.booking_token
+    if token:
+        return f"https://www.google.com/travel/flights?tfs={token}"
+    return (
+        "https://www.google.com/travel/flights?"
+        f"q=flights+from+{source}+to+{destination}"
+        f"+on+{departure_date}+return+{return_date}"
+    )
+
+
+@dataclass
+class FlightSearch:
+    source: str
+    destination: str
+    pairs: List[Pair]
+    departure_date: object
+    return_date: object
+    records: List[FlightRecord]
+    flights: List[FlightRecord]          # the cheapest, best first
+    cache_info: Optional[object]         # of the stalest pair on screen
+    failed_pairs: List[Pair]             # only when other pairs did answer
+    error: Optional[str]
+    history_route: str = ""              # the city pair's route in fare_history.py
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    avg_price: Optional[float] = None
+
+    def booking_link(self, flight: FlightRecord) -> str:
+        return build_booking_link(
+            flight, flight.departure_code or self.source, flight.arrival_code or self.destination,
+            self.departure_date, self.return_date,
+        )
+
+    def flight_summary(self) -> str:
+        if not self.flights:
+            return "No flights found."
+        return "\n".join(
+            f"- {f.airline} | ₹{f.price if f.has_price else None} | "
+            f"{f.duration if f.has_duration else 'N/A'} min"
+            for f in self.flights
+        )
+
+    def budget_hint(self) -> str:
+        if self.min_price is None:
+            return "No flight price data available."
+        return (
+            f"Flight price range (from live data): min ₹{self.min_price}, "
+            f"max ₹{self.max_price}, avg ₹{int(self.avg_price)}."
+        )
+
+
+def search_flights(source_codes, destination_codes, departure_date, return_date, api_key=None,
+                   search_deadline: Optional[Deadline] = None, k: int = 8) -> FlightSearch:
+    """Fetch every source x destination airport pair and rank the fares.
+
+    With a search deadline the lookup may use SEARCH_FLIGHTS_SHARE of it.
+    """
+    pairs = airport_pairs(source_codes, destination_codes)
+    pair_timeout = env_float("AIRPORT_PAIR_TIMEOUT", 20)
+    total_timeout = env_float("AIRPORT_PAIRS_TIMEOUT", 25)
+    if search_deadline is not None:
+        flights_deadline = search_deadline.split(env_float("SEARCH_FLIGHTS_SHARE", 0.3))
+    else:
+        flights_deadline = Deadline(total_timeout)
+    with span("search_airport_pairs", pairs=len(pairs)), deadline(flights_deadline):
+        flight_data, cache_infos, pair_errors = search_airport_pairs(
+            pairs,
+            lambda src, dst: fetch_flights(
+                src, dst, departure_date, return_date, timeout=pair_timeout, api_key=api_key,
+            ),
+            max_concurrency=env_int("AIRPORT_PAIR_CONCURRENCY", 4),
+            pair_timeout=pair_timeout,
+            total_timeout=min(total_timeout, flights_deadline.remaining()),
+        )
+    with span("extract_top_flights") as s:
+        records = parse_flights(flight_data)
+        cheapest = rank_flights(records, k=k)
+        s.set(records=len(records))
+
+    error = None
+    if pair_errors and not cache_infos:
+        error = "Error fetching flights: " + "; ".join(sorted(set(pair_errors.values())))
+    search = FlightSearch(
+        source=source_codes[0], destination=destination_codes[0], pairs=pairs,
+        departure_date=departure_date, return_date=return_date, records=records, flights=cheapest,
+        cache_info=oldest_cache_info(cache_infos), failed_pairs=sorted(pair_errors) if cache_infos else [],
+        error=error, history_route=history_route(source_codes, destination_codes),
+    )
+    prices = [f.price for f in cheapest if f.has_price]
+    if prices:
+        search.min_price, search.max_price = min(prices), max(prices)
+        search.avg_price = sum(prices) / len(prices)
+    if any(info.state == "miss" for info in cache_infos):
+        record_search(search)
+    return search
+
+
+def record_search(search: FlightSearch) -> None:
+    # One past search per user search that reached SerpAPI: every pair's
+    # fares under the city pair's route, so its cheapest is the cross-pair one
+    try:
+        fare_history().append(search.history_route, search.departure_date, search.return_date, search.records)
+    except Exception:
+        logger.exception("could not record fares for %s", search.history_route)
+
+
+# ----- itinerary -----
+# A plan spends its estimated tokens (prompt + answer budget) from the OpenAI
+# budget before it starts; the generation settles the difference once the
+# real usage is known. When the budget can't cover a full plan, the trip gets
+# an outline-only one (areas and themes per day, hotels, costs), about a
+# third of the tokens; when it can't cover that either, QuotaExceeded says
+# when to try again.
+
+DAY_PROMPT_TOKENS = 120  # one parallel day call's prompt, roughly
+
+
+def itinerary_token_cost(prompt: str, max_tokens: int, parallel_days: int = 0) -> int:
+    cost = estimate_tokens(SYSTEM_PROMPT + prompt) + max_tokens
+    return cost + parallel_days * (DAY_PROMPT_TOKENS + env_int("ITINERARY_DAY_TOKENS", 220))
+
+
+def itinerary_trip(search: FlightSearch, num_days, travel_theme, source_city, destination_city,
+                   activity_preferences, budget, flight_class, hotel_rating, visa_required,
+                   travel_insurance) -> dict:
+    """Prompt inputs for a trip on the fares `search` found."""
+    return dict(
+        num_days=num_days, travel_theme=travel_theme, source_city=source_city, source=search.source,
+        destination_city=destination_city, destination=search.destination,
+        activity_preferences=activity_preferences, budget=budget, flight_class=flight_class,
+        hotel_rating=hotel_rating, visa_required=visa_required, travel_insurance=travel_insurance,
+        flight_summary=search.flight_summary(), budget_hint=search.budget_hint(),
+    )
+
+
+def start_itinerary(client, trip: dict, search: FlightSearch, signature=None, force: bool = False,
+                    search_deadline: Optional[Deadline] = None) -> Tuple[Optional[tuple], Optional[ItineraryJob]]:
+    """(cached (text, CacheInfo), None) if this trip was planned before, else
+    (None, job) for a generation started in the background.
+
+    Raises QuotaExceeded when the token budget can't cover even an outline.
+    """
+    cache_key = itinerary_cache_key(
+        trip["num_days"], trip["travel_theme"], trip["source"], trip["destination"],
+        trip["activity_preferences"], trip["budget"], trip["flight_class"], trip["hotel_rating"],
+        trip["visa_required"], trip["travel_insurance"], search.min_price, search.avg_price,
+    )
+    if not force:
+        cached = itinerary_cache().lookup(cache_key)
+        if cached is not None:
+            return cached, None
+
+    fmt = itinerary_format()
+    # Long trips: stream an outline, then write the days in parallel
+    parallel = use_parallel_days(trip["num_days"], fmt)
+    if parallel:
+        build_prompt = build_outline_prompt
+    else:
+        build_prompt = build_structured_prompt if fmt == "json" else build_itinerary_prompt
+    with span("build_prompt", format=fmt, parallel=parallel) as s:
+        prompt = build_prompt(**trip)
+        s.set(prompt_bytes=len(prompt.encode("utf-8")))
+    max_tokens = outline_max_tokens(trip["num_days"]) if parallel else itinerary_max_tokens(trip["num_days"], fmt)
+    response_format = outline_response_format() if parallel else itinerary_response_format(fmt)
+    short = False
+    with deadline(search_deadline or Deadline(env_float("SEARCH_DEADLINE", 90))):
+        cost = itinerary_token_cost(prompt, max_tokens, trip["num_days"] if parallel else 0)
+        try:
+            budget().spend("openai", cost)
+        except QuotaExceeded:
+            cache_key = (*cache_key, "outline")
+            cached = None if force else itinerary_cache().lookup(cache_key)
+            if cached is not None:
+                degraded("openai", "short")
+                return cached, None
+            prompt, max_tokens = build_outline_prompt(**trip), outline_max_tokens(trip["num_days"])
+            response_format, parallel, short = outline_response_format(), False, True
+            cost = itinerary_token_cost(prompt, max_tokens)
+            try:
+                budget().spend("openai", cost)
+            except QuotaExceeded:
+                degraded("openai", "refused")
+                raise
+            degraded("openai", "short")
+        job = ItineraryJob(
+            client,
+            itinerary_messages(prompt),
+            signature=signature,
+            stream=env_int("ITINERARY_STREAM", 1) == 1,
+            cache_key=cache_key,
+            max_tokens=max_tokens,
+            response_format=response_format,
+            trip=trip if parallel else None,
+            tokens_charged=cost,
+            short=short,
+        )
+    return None, job
@@ -0,0 +1,84 @@
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+from config import env_int
+
+# ================== BOUNDED CONCURRENT FAN-OUT ==================
+# One shared worker pool per process; each fan-out caps how many of its own
+# tasks run at once, so a single page cannot starve the others. Results are
+# yielded as they finish so callers can render partial output. Tasks run in
+# a copy of the caller's context, so tracing spans follow them.
+
+_POOL = ThreadPoolExecutor(
+    max_workers=env_int("FANOUT_POOL_SIZE", 32), thread_name_prefix="fanout"
+)
+
+
+def _started(ctx: contextvars.Context, fn: Callable[[], object], started: list) -> object:
+    # Runs on the pool thread: the task's clock starts here, not at submit
+    started[0] = time.monotonic()
+    return ctx.run(fn)
+
+
+def fan_out(
+    tasks: Dict[Hashable, Callable[[], object]],
+    max_concurrency: int = 6,
+    task_timeout: Optional[float] = None,
+    deadline: Optional[float] = None,
+) -> Iterator[Tuple[Hashable, object, Optional[BaseException]]]:
+    """Yield (key, result, error) for every task, in completion order.
+
+    `task_timeout` bounds each task from the moment it starts; `deadline` is
+    an absolute time.monotonic() value after which everything still pending
+    is reported as a TimeoutError. Timed-out work is abandoned, not killed,
+    and keeps counting against `max_concurrency` until it finishes.
+    """
+    queue = list(tasks.items())
+    queue.reverse()
+    running = {}  # future -> (key, [started_at or None while queued in the pool])
+    abandoned = set()  # timed out but still holding a pool thread
+
+    while queue or running:
+        abandoned = {future for future in abandoned if not future.done()}
+        while queue and len(running) + len(abandoned) < max_concurrency:
+            key, fn = queue.pop()
+            started = [None]
+            running[_POOL.submit(_started, contextvars.copy_context(), fn, started)] = (key, started)
+
+        now = time.monotonic()
+        limits = []
+        if deadline is not None:
+            limits.append(deadline - now)
+        if task_timeout is not None and running:
+            # A task still queued in the pool cannot time out sooner than a full task_timeout from now
+            limits.append(min(
+                (started[0] if started[0] is not None else now) + task_timeout for _, started in running.values()
+            ) - now)
+        timeout = max(0.0, min(limits)) if limits else None
+
+        done, _ = wait(set(running) | abandoned, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future not in running:
+                continue
+            key, _ = running.pop(future)
+            error = future.exception()
+            yield key, (None if error else future.result()), error
+
+        now = time.monotonic()
+        if deadline is not None and now >= deadline:
+            for future, (key, _) in list(running.items()):
+                future.cancel()
+                yield key, None, TimeoutError("deadline exceeded")
+            while queue:
+                key, _ = queue.pop()
+                yield key, None, TimeoutError("deadline exceeded")
+            return
+        if task_timeout is not None:
+            for future, (key, started) in list(running.items()):
+                if started[0] is not None and now - started[0] >= task_timeout:
+                    del running[future]
+                    if not future.cancel():
+                        abandoned.add(future)
+                    yield key, None, TimeoutError(f"no response after {task_timeout:.0f}s")
@@ -0,0 +1,263 @@
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from config import cache_dir, env_float, env_int, env_str
+
+# ================== FARE HISTORY STORE ==================
+# Every user search that reached SerpAPI appends its fares, merged across
+# the city pair's airports, as one fetch to an SQLite table of small integer
+# columns (route, travel dates as day numbers, price, duration, stops,
+# fetch time) and never updated. Fare-matrix cells and cache hits are not
+# searches and are not recorded. Reads go through per-route NumPy columns
+# kept in memory and topped up with only the rows added since the last
+# read, so analytics over a route never walk Python objects row by row.
+# Decoding SQLite rows is the slow part (~2 µs a fare), so each route's
+# columns are also snapshotted to an .npy file next to the database once
+# FARE_HISTORY_SNAPSHOT_ROWS new fares have arrived; a fresh process loads
+# the snapshot and reads only the rows after it.
+
+# One in-memory row per stored fare; airline names stay in SQLite only
+ROW_DTYPE = np.dtype([
+    ("rowid", np.int64),
+    ("fetch_id", np.int64),
+    ("fetched_at", np.int64),
+    ("dep_day", np.int32),
+    ("ret_day", np.int32),
+    ("price", np.float64),
+    ("duration", np.float32),
+    ("stops", np.int8),
+])
+
+
+class _RouteColumns:
+    # Grows like a list (capacity doubles), so topping up is O(new rows)
+    __slots__ = ("_rows", "size", "snapshot_size")
+
+    def __init__(self):
+        self._rows = np.empty(0, ROW_DTYPE)
+        self.size = 0
+        self.snapshot_size = 0  # rows already in the .npy snapshot
+
+    @classmethod
+    def from_rows(cls, rows: np.ndarray) -> "_RouteColumns":
+        cols = cls()
+        cols._rows, cols.size = rows, len(rows)
+        cols.snapshot_size = cols.size
+        return cols
+
+    def rows(self) -> np.ndarray:
+        return self._rows[:self.size]
+
+    @property
+    def last_rowid(self) -> int:
+        return int(self._rows["rowid"][self.size - 1]) if self.size else 0
+
+    def column(self, name: str) -> np.ndarray:
+        return self._rows[name][:self.size]
+
+    def extend(self, rows: np.ndarray) -> None:
+        needed = self.size + len(rows)
+        if needed > len(self._rows):
+            grown = np.empty(max(needed, 2 * len(self._rows), 1024), ROW_DTYPE)
+            grown[:self.size] = self._rows[:self.size]
+            self._rows = grown
+        self._rows[self.size:needed] = rows
+        self.size = needed
+
+
+class FareHistory:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or env_str("FARE_HISTORY_PATH", os.path.join(cache_dir(), "fare_history.sqlite3"))
+        self._lock = threading.Lock()
+        self._columns: Dict[str, _RouteColumns] = {}
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS fares ("
+                " route TEXT NOT NULL, fetch_id INTEGER NOT NULL, fetched_at INTEGER NOT NULL,"
+                " dep_day INTEGER NOT NULL, ret_day INTEGER NOT NULL, price INTEGER NOT NULL,"
+                " duration INTEGER, stops INTEGER NOT NULL, airline TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS fares_route ON fares (route)")
+        self._snapshot_dir = self.path + ".columns"
+
+    # ----- writes -----
+
+    def append(self, route: str, dep_date, ret_date, records: Iterable, fetched_at: Optional[float] = None) -> int:
+        """Store one search's priced FlightRecords; returns how many were stored."""
+        fetched_at = int(fetched_at if fetched_at is not None else time.time())
+        fetch_id = time.time_ns()
+        dep_day, ret_day = _day(dep_date), _day(ret_date)
+        rows = [
+            (route, fetch_id, fetched_at, dep_day, ret_day, int(r.price),
+             int(r.duration) if r.has_duration else None, r.stops, r.airline)
+            for r in records if r.has_price
+        ]
+        if rows:
+            with self._lock, self._db:
+                self._db.executemany("INSERT INTO fares VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    # ----- reads -----
+
+    def columns(self, route: str) -> _RouteColumns:
+        # In-memory columns for a route, topped up from SQLite incrementally
+        with self._lock:
+            cols = self._columns.get(route)
+            if cols is None:
+                cols = self._columns[route] = self._load_snapshot(route)
+            cursor = self._db.execute(
+                "SELECT rowid, fetch_id, fetched_at, dep_day, ret_day, price, COALESCE(duration, -1), stops"
+                " FROM fares WHERE route = ? AND rowid > ? ORDER BY rowid",
+                (route, cols.last_rowid),
+            )
+            rows = np.fromiter(cursor, ROW_DTYPE)
+            if len(rows):
+                cols.extend(rows)
+            if cols.size - cols.snapshot_size >= env_int("FARE_HISTORY_SNAPSHOT_ROWS", 50000):
+                self._save_snapshot(route, cols)
+            return cols
+
+    def _snapshot_path(self, route: str) -> str:
+        return os.path.join(self._snapshot_dir, route.replace("/", "_") + ".npy")
+
+    def _load_snapshot(self, route: str) -> _RouteColumns:
+        try:
+            rows = np.load(self._snapshot_path(route))
+        except (OSError, ValueError):
+            return _RouteColumns()
+        # A snapshot ahead of the database belongs to a deleted/replaced file
+        newest = self._db.execute("SELECT MAX(rowid) FROM fares").fetchone()[0] or 0
+        if rows.dtype != ROW_DTYPE or (len(rows) and rows["rowid"][-1] > newest):
+            return _RouteColumns()
+        return _RouteColumns.from_rows(rows)
+
+    def _save_snapshot(self, route: str, cols: _RouteColumns) -> None:
+        path = self._snapshot_path(route)
+        try:
+            os.makedirs(self._snapshot_dir, exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, cols.rows())
+            os.replace(path + ".tmp", path)
+            cols.snapshot_size = cols.size
+        except OSError:
+            pass  # only a cache; the next process reads SQLite instead
+
+    def route_analytics(self, routes: List[str], dep_date=None, ret_date=None,
+                        lookback_days: Optional[float] = None) -> Optional["RouteAnalytics"]:
+        """Past searches on `routes`; with travel dates, only searches for those dates."""
+        lookback_days = lookback_days or env_float("FARE_HISTORY_LOOKBACK_DAYS", 90)
+        since = time.time() - lookback_days * 86400
+        parts = [self.columns(route) for route in routes]
+        # Each route's rows stay contiguous, so fetches never interleave below
+        fetch_id = np.concatenate([c.column("fetch_id") for c in parts])
+        fetched_at = np.concatenate([c.column("fetched_at") for c in parts])
+        price = np.concatenate([c.column("price") for c in parts])
+        keep = fetched_at >= since
+        if dep_date is not None:
+            keep &= np.concatenate([c.column("dep_day") for c in parts]) == _day(dep_date)
+        if ret_date is not None:
+            keep &= np.concatenate([c.column("ret_day") for c in parts]) == _day(ret_date)
+        return analyze(fetch_id[keep], fetched_at[keep], price[keep])
+
+
+def history_route(source_codes: Sequence[str], destination_codes: Sequence[str], currency: str = "INR") -> str:
+    # One route per city pair, whichever of its airports a fare came from,
+    # e.g. "LGW+LHR+STN-BOM". Fares in different currencies are kept apart.
+    route = f"{'+'.join(sorted(source_codes))}-{'+'.join(sorted(destination_codes))}"
+    return route if currency == "INR" else f"{route}/{currency}"
+
+
+def _day(value) -> int:
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    return value.toordinal()
+
+
+# ================== ANALYTICS ==================
+
+@dataclass
+class RouteAnalytics:
+    fetches: int                    # past searches
+    fares: int
+    percentiles: Dict[int, float]   # of the cheapest fare per search
+    days: np.ndarray                # unix day numbers with data
+    daily_low: np.ndarray           # cheapest fare seen that day
+    daily_median: np.ndarray        # median of that day's per-fetch cheapest fares
+    trend_per_week: Optional[float] # fitted change in the cheapest fare, fraction per week
+    cheapest: np.ndarray            # per-fetch cheapest fares, sorted
+
+    def percentile_rank(self, price: float) -> float:
+        # Share of past searches that found something cheaper
+        return float(np.searchsorted(self.cheapest, price, side="left") / len(self.cheapest))
+
+    def verdict(self, price: float) -> str:
+        rank = self.percentile_rank(price)
+        if rank <= 0.2:
+            return "good"
+        if rank >= 0.75:
+            return "high"
+        return "typical"
+
+
+def analyze(fetch_id: np.ndarray, fetched_at: np.ndarray, price: np.ndarray,
+            min_fetches: int = 3) -> Optional[RouteAnalytics]:
+    if len(price) == 0:
+        return None
+
+    # Cheapest fare per fetch. A fetch's rows are inserted in one batch, so
+    # they are contiguous and a single reduceat pass finds every minimum.
+    starts = np.flatnonzero(np.r_[True, fetch_id[1:] != fetch_id[:-1]])
+    per_fetch_price = np.minimum.reduceat(price, starts)
+    per_fetch_day = fetched_at[starts] // 86400
+    if len(per_fetch_price) < min_fetches:
+        return None
+
+    # Daily low / median of the per-fetch cheapest fares
+    day_order = np.lexsort((per_fetch_price, per_fetch_day))
+    day_sorted = per_fetch_day[day_order]
+    price_by_day = per_fetch_price[day_order]
+    day_starts = np.flatnonzero(np.r_[True, day_sorted[1:] != day_sorted[:-1]])
+    counts = np.diff(np.r_[day_starts, len(day_sorted)])
+    days = day_sorted[day_starts]
+    daily_low = price_by_day[day_starts]
+    daily_median = price_by_day[day_starts + counts // 2]
+
+    trend = None
+    if len(days) >= 3:
+        slope, intercept = np.polyfit(days - days[0], daily_low, 1)
+        level = intercept + slope * (days[-1] - days[0])
+        if level > 0:
+            trend = float(slope * 7 / level)
+
+    qs = (10, 25, 50, 75, 90)
+    return RouteAnalytics(
+        fetches=len(per_fetch_price),
+        fares=len(price),
+        percentiles=dict(zip(qs, np.percentile(per_fetch_price, qs).tolist())),
+        days=days,
+        daily_low=daily_low,
+        daily_median=daily_median,
+        trend_per_week=trend,
+        cheapest=np.sort(per_fetch_price),
+    )
+
+
+_HISTORY: Optional[FareHistory] = None
+_HISTORY_LOCK = threading.Lock()
+
+
+def fare_history() -> FareHistory:
+    global _HISTORY
+    with _HISTORY_LOCK:
+        if _HISTORY is None:
+            _HISTORY = FareHistory()
+        return _HISTORY
@@ -0,0 +1,147 @@
+import contextvars
+import threading
+import time
+from contextlib import ExitStack
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from fanout import fan_out
+from quota import QuotaExceeded, budget
+
+# ================== FLEXIBLE-DATE FARE MATRIX ==================
+# The grid is paid for as one SerpAPI spend of a search per cell (quota.py),
+# refunded for cells served from cache, so a session's bucket never runs dry
+# halfway through it. When the budget can't cover the whole grid, cells spend
+# one by one and those it refuses are marked REFUSED rather than "no fare".
+
+Cell = Tuple[date, date]
+REFUSED = "refused"  # a cell the search budget turned down
+
+
+def flex_dates(departure_date: date, return_date: date, flex_days: int):
+    today = date.today()
+    dep_dates = [
+        departure_date + timedelta(days=d)
+        for d in range(-flex_days, flex_days + 1)
+        if departure_date + timedelta(days=d) >= today
+    ]
+    ret_dates = [return_date + timedelta(days=d) for d in range(-flex_days, flex_days + 1)]
+    return dep_dates, ret_dates
+
+
+def matrix_cells(dep_dates: List[date], ret_dates: List[date]) -> List[Cell]:
+    return [(dep, ret) for dep in dep_dates for ret in ret_dates if ret >= dep]
+
+
+def build_fare_matrix(
+    cells: List[Cell],
+    cheapest_fare: Callable[[date, date], Optional[float]],
+    max_concurrency: int = 6,
+    cell_timeout: float = 20.0,
+    total_timeout: float = 45.0,
+) -> Iterator[Tuple[Cell, Optional[float], Optional[BaseException]]]:
+    tasks = {cell: (lambda cell=cell: cheapest_fare(*cell)) for cell in cells}
+    yield from fan_out(
+        tasks,
+        max_concurrency=max_concurrency,
+        task_timeout=cell_timeout,
+        deadline=time.monotonic() + total_timeout,
+    )
+
+
+class FareMatrixJob:
+    # Runs build_fare_matrix() on its own thread so the page can keep drawing
+    # other sections; `results` is read by the script thread between redraws.
+    def __init__(self, cells: List[Cell], cheapest_fare, signature=None, **limits):
+        self.signature = signature
+        self.total = len(cells)
+        self.results: Dict[Cell, object] = {}  # price, None (no fare) or REFUSED
+        self.failed = 0
+        self.refused: Optional[QuotaExceeded] = None  # the last refusal, for the notice
+        self._cancelled = threading.Event()
+        self._finished = threading.Event()
+        context = contextvars.copy_context()
+        threading.Thread(
+            target=context.run, args=(self._run, cells, cheapest_fare, limits),
+            name="fare-matrix", daemon=True,
+        ).start()
+
+    def _run(self, cells, cheapest_fare, limits):
+        try:
+            with ExitStack() as paid:
+                try:
+                    paid.enter_context(budget().prepaid("serpapi", len(cells)))
+                except QuotaExceeded:
+                    pass  # cells spend one by one
+                for cell, price, error in build_fare_matrix(cells, cheapest_fare, **limits):
+                    if self._cancelled.is_set():
+                        break
+                    if isinstance(error, QuotaExceeded):
+                        self.results[cell], self.refused = REFUSED, error
+                        continue
+                    self.results[cell] = price
+                    self.failed += error is not None
+        finally:
+            self._finished.set()
+
+    @property
+    def refused_cells(self) -> int:
+        return sum(price is REFUSED for price in list(self.results.values()))
+
+    @property
+    def done(self) -> bool:
+        return self._finished.is_set()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+
+def _heat_colour(price: float, low: float, high: float) -> str:
+    # green (cheapest) -> amber -> red (most expensive)
+    ratio = 0.0 if high <= low else (price - low) / (high - low)
+    hue = int(120 * (1 - ratio))
+    return f"hsla({hue}, 70%, 42%, 0.85)"
+
+
+def fare_heatmap_html(
+    dep_dates: List[date],
+    ret_dates: List[date],
+    results: Dict[Cell, object],
+    selected: Optional[Cell] = None,
+    currency_symbol: str = "₹",
+) -> str:
+    prices = [p for p in results.values() if isinstance(p, (int, float))]
+    low, high = (min(prices), max(prices)) if prices else (0, 0)
+
+    header = "".join(f"<th>{r.strftime('%a %d %b')}</th>" for r in ret_dates)
+    rows = []
+    for dep in dep_dates:
+        cells = []
+        for ret in ret_dates:
+            cell = (dep, ret)
+            classes = "fare-cell"
+            if cell == selected:
+                classes += " fare-cell-selected"
+            if ret < dep:
+                cells.append('<td class="fare-cell fare-cell-empty"></td>')
+                continue
+            if cell not in results:
+                cells.append(f'<td class="{classes} fare-cell-pending">…</td>')
+                continue
+            price = results[cell]
+            if isinstance(price, (int, float)):
+                style = f' style="background:{_heat_colour(price, low, high)}"'
+                label = f"{currency_symbol}{price:,.0f}"
+            elif price is REFUSED:
+                classes += " fare-cell-refused"
+                style, label = ' title="Not searched: search limit reached"', "🚫"
+            else:
+                style, label = "", "—"
+            cells.append(f'<td class="{classes}"{style}>{label}</td>')
+        rows.append(f"<tr><th>{dep.strftime('%a %d %b')}</th>{''.join(cells)}</tr>")
+
+    return (
+        '<table class="fare-matrix">'
+        f'<tr><th class="fare-matrix-corner">Depart ↓ / Return →</th>{header}</tr>'
+        f"{''.join(rows)}</table>"
+    )
@@ -0,0 +1,330 @@
+import heapq
+import logging
+import math
+import time
+from functools import lru_cache
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import product
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from cache import CacheInfo, get_cache
+from config import env_float, env_int, env_str
+from fanout import fan_out
+from http_clients import PooledGoogleSearch
+from quota import QuotaExceeded, budget, degraded
+from timings import annotate, span
+
+logger = logging.getLogger(__name__)
+
+# ================== MULTI-AIRPORT SEARCH ==================
+# Metro areas with several airports (London, New York, Mumbai...) are
+# searched on every source x destination pair at once. Each pair's SerpAPI
+# payload is merged into a single payload shaped like one search, with
+# itineraries seen on several pairs kept once at their lowest price.
+
+Pair = Tuple[str, str]
+
+
+def airport_pairs(source_codes: Iterable[str], destination_codes: Iterable[str]) -> List[Pair]:
+    return [(src, dst) for src, dst in product(source_codes, destination_codes) if src != dst]
+
+
+def flight_identity(flight: dict):
+    # Same legs (flight numbers + departure times) = same itinerary, whichever
+    # pair it came back on.
+    legs = flight.get("flights") or []
+    return tuple(
+        (leg.get("flight_number"), (leg.get("departure_airport") or {}).get("time"))
+        for leg in legs
+    ) or None
+
+
+def _price(flight: dict) -> float:
+    price = flight.get("price")
+    return price if isinstance(price, (int, float)) else float("inf")
+
+
+def merge_flight_data(payloads: Iterable[dict]) -> dict:
+    merged = {"best_flights": [], "other_flights": []}
+    seen = {}  # identity -> (section, index)
+    for data in payloads:
+        for section in ("best_flights", "other_flights"):
+            for flight in data.get(section, []):
+                identity = flight_identity(flight)
+                if identity is None:
+                    merged[section].append(flight)
+                    continue
+                if identity not in seen:
+                    seen[identity] = (section, len(merged[section]))
+                    merged[section].append(flight)
+                    continue
+                where, index = seen[identity]
+                if _price(flight) < _price(merged[where][index]):
+                    merged[where][index] = flight
+    return merged
+
+
+def search_airport_pairs(
+    pairs: List[Pair],
+    fetch: Callable[[str, str], Tuple[dict, object]],
+    max_concurrency: int = 4,
+    pair_timeout: float = 20.0,
+    total_timeout: float = 30.0,
+):
+    """Fetch every pair concurrently and merge what came back in time.
+
+    Returns (merged_data, cache_infos, errors) where `errors` maps each pair
+    that failed, timed out or returned a SerpAPI error to its message.
+    """
+    if len(pairs) == 1:
+        # No fan-out for the common single-airport case
+        results = [(pairs[0], *_fetch_one(fetch, pairs[0]))]
+    else:
+        tasks = {pair: (lambda pair=pair: fetch(*pair)) for pair in pairs}
+        results = fan_out(
+            tasks,
+            max_concurrency=max_concurrency,
+            task_timeout=pair_timeout,
+            deadline=time.monotonic() + total_timeout,
+        )
+
+    payloads, cache_infos, errors = [], [], {}
+    for pair, result, error in results:
+        if error is not None:
+            errors[pair] = str(error) or type(error).__name__
+            continue
+        data, cache_info = result
+        if "error" in data:
+            errors[pair] = data["error"]
+            continue
+        payloads.append(data)
+        cache_infos.append(cache_info)
+    return merge_flight_data(payloads), cache_infos, errors
+
+
+def _fetch_one(fetch, pair) -> Tuple[Optional[tuple], Optional[BaseException]]:
+    try:
+        return fetch(*pair), None
+    except Exception as e:
+        return None, e
+
+
+def oldest_cache_info(cache_infos: List) -> Optional[object]:
+    # The caption describes the stalest fares on screen
+    return max(cache_infos, key=lambda info: (info.state != "miss", info.age), default=None)
+
+
+# ================== FLIGHT RECORDS ==================
+# SerpAPI itineraries are parsed once into small slotted records holding only
+# what ranking and the result cards need; display strings are formatted here
+# so re-rendering never walks the nested payload again.
+
+@lru_cache(maxsize=4096)
+def _parse_time(raw) -> Tuple[str, int]:
+    # (display string, minutes after midnight); the same departure times
+    # recur across pairs and dates, so each distinct string is parsed once.
+    try:
+        dt = datetime.strptime(raw, "%Y-%m-%d %H:%M")
+    except (TypeError, ValueError):
+        return "N/A", -1
+    return dt.strftime("%b-%d, %Y | %I:%M %p"), dt.hour * 60 + dt.minute
+
+
+@dataclass(slots=True)
+class FlightRecord:
+    price: float             # math.inf when SerpAPI gave no price
+    duration: float          # minutes, math.inf when unknown
+    stops: int
+    departure_minute: int    # minutes after midnight, -1 when unknown
+    airline: str
+    logo: str
+    departure_code: str
+    arrival_code: str
+    departure_time: str      # preformatted for display
+    arrival_time: str
+    booking_token: Optional[str]
+
+    @property
+    def has_price(self) -> bool:
+        return self.price != math.inf
+
+    @property
+    def has_duration(self) -> bool:
+        return self.duration != math.inf
+
+
+def _number(value) -> float:
+    return value if isinstance(value, (int, float)) else math.inf
+
+
+def parse_flight(flight: dict) -> FlightRecord:
+    legs = flight.get("flights") or [{}]
+    dep = legs[0].get("departure_airport") or {}
+    arr = legs[-1].get("arrival_airport") or {}
+    departure_time, departure_minute = _parse_time(dep.get("time", "N/A"))
+    return FlightRecord(
+        price=_number(flight.get("price")),
+        duration=_number(flight.get("total_duration")),
+        stops=max(len(legs) - 1, 0),
+        departure_minute=departure_minute,
+        airline=flight.get("airline") or legs[0].get("airline") or "Airline",
+        logo=flight.get("airline_logo", ""),
+        departure_code=dep.get("id", ""),
+        arrival_code=arr.get("id", ""),
+        departure_time=departure_time,
+        arrival_time=_parse_time(arr.get("time", "N/A"))[0],
+        booking_token=flight.get("booking_token"),
+    )
+
+
+def parse_flights(flight_data: dict) -> List[FlightRecord]:
+    return [
+        parse_flight(flight)
+        for section in ("best_flights", "other_flights")
+        for flight in flight_data.get(section, [])
+    ]
+
+
+# ================== RANKING ==================
+# heapq.nsmallest keeps a k-sized heap, so ranking n records is O(n log k)
+# and never copies or fully sorts the merged list.
+
+SORT_KEYS = {
+    "price": lambda r: (r.price, r.duration, r.stops),
+    "duration": lambda r: (r.duration, r.price, r.stops),
+    "stops": lambda r: (r.stops, r.price, r.duration),
+}
+
+# (start, end) minutes after midnight; night wraps past midnight
+DEPARTURE_WINDOWS = {
+    "morning": (5 * 60, 12 * 60),
+    "afternoon": (12 * 60, 17 * 60),
+    "evening": (17 * 60, 21 * 60),
+    "night": (21 * 60, 5 * 60),
+}
+
+
+def in_window(record: FlightRecord, window: Optional[str]) -> bool:
+    if not window:
+        return True
+    if record.departure_minute < 0:
+        return False
+    start, end = DEPARTURE_WINDOWS[window]
+    if start <= end:
+        return start <= record.departure_minute < end
+    return record.departure_minute >= start or record.departure_minute < end
+
+
+def pareto_front(records: Iterable[FlightRecord]) -> List[FlightRecord]:
+    """Records no other record beats on price, duration and stops at once.
+
+    Sweeping in price order, a record survives if no earlier (cheaper) record
+    with as few or fewer stops was also at least as fast. Stops are small, so
+    the best duration seen per stop count is tracked in a short list. A
+    record without a duration cannot be shown slower, so only price and
+    stops decide whether it stays.
+    """
+    front = []
+    best_duration = []  # best_duration[s] = fastest seen with exactly s stops
+    for record in sorted(records, key=SORT_KEYS["price"]):
+        if not record.has_price:
+            break
+        if record.stops >= len(best_duration):
+            best_duration.extend([math.inf] * (record.stops + 1 - len(best_duration)))
+        if record.has_duration and min(best_duration[:record.stops + 1]) <= record.duration:
+            continue
+        front.append(record)
+        if record.has_duration:
+            best_duration[record.stops] = min(best_duration[record.stops], record.duration)
+    return front
+
+
+def rank_flights(records: Iterable[FlightRecord], k: int = 8, by: str = "price",
+                 window: Optional[str] = None) -> List[FlightRecord]:
+    candidates = (r for r in records if in_window(r, window))
+    if by == "pareto":
+        return pareto_front(candidates)[:k]
+    return heapq.nsmallest(k, candidates, key=SORT_KEYS[by])
+
+
+# ================== FLIGHT SEARCH (SERPAPI) ==================
+# Shared by the app, the cache warmer (warm_cache.py) and benchmarks: they all
+# read and write the same "flights" cache, keyed per airport pair and dates.
+# Every real SerpAPI call spends one search from the budget (quota.py). When
+# the budget says no, fares kept past their stale window (up to
+# FLIGHT_CACHE_KEEP_TTL) are served as "expired"; with nothing kept the pair
+# comes back as an error saying when to try again (see quota_refusal()).
+
+def flight_cache():
+    return get_cache(
+        "flights",
+        ttl=env_float("FLIGHT_CACHE_TTL", 900),
+        stale_ttl=env_float("FLIGHT_CACHE_STALE_TTL", 3600),
+        max_entries=env_int("FLIGHT_CACHE_MAX_ENTRIES", 512),
+        keep_ttl=env_float("FLIGHT_CACHE_KEEP_TTL", 24 * 3600),
+    )
+
+
+def flight_cache_key(source_code, destination_code, dep_date, ret_date, currency="INR", hl="en"):
+    return (source_code, destination_code, str(dep_date), str(ret_date), currency, hl)
+
+
+def fetch_flights(source_code, destination_code, dep_date, ret_date,
+                  currency="INR", hl="en", force_refresh=False, timeout=None, api_key=None, serve_kept=True):
+    params = {
+        "engine": "google_flights",
+        "departure_id": source_code,
+        "arrival_id": destination_code,
+        "outbound_date": str(dep_date),
+        "return_date": str(ret_date),
+        "currency": currency,
+        "hl": hl,
+        "api_key": api_key if api_key is not None else env_str("SERPAPI_KEY", ""),
+    }
+
+    def load():
+        # With an expired copy to fall back on, don't queue for the budget
+        budget().spend("serpapi", 1, wait=0 if flight_cache().peek(key) else None)
+        search = PooledGoogleSearch(dict(params), timeout=timeout)
+        search.params_dict["output"] = "json"
+        response = search.get_response()
+        annotate(response_bytes=len(response.content), status=response.status_code)
+        if response.status_code >= 500:
+            # Still failing after the retries; shown like a SerpAPI error, never cached
+            return {"error": f"SerpAPI is unavailable (HTTP {response.status_code}), please try again"}
+        return response.json()
+
+    # Returns (flight_data, CacheInfo); SerpAPI error payloads are never cached.
+    # With serve_kept=False a refused budget raises QuotaExceeded instead.
+    key = flight_cache_key(source_code, destination_code, dep_date, ret_date, currency, hl)
+    with span("fetch_flights", route=f"{source_code}-{destination_code}", date=str(dep_date)) as s:
+        try:
+            data, info = flight_cache().get_or_load(
+                key, load, cacheable=lambda data: "error" not in data, force_refresh=force_refresh
+            )
+        except QuotaExceeded as e:
+            if not serve_kept:
+                raise
+            kept = flight_cache().peek(key)
+            degraded("serpapi", "stale" if kept is not None else "refused")
+            if kept is not None:
+                data, info = kept
+            else:
+                quota = {"reason": e.reason, "retry_after": e.retry_after}
+                data, info = {"error": str(e), "quota": quota}, CacheInfo("miss", 0.0)
+        s.set(cache=info.state)
+        return data, info
+
+
+def quota_refusal(flight_data) -> Optional[QuotaExceeded]:
+    # The budget's refusal behind an error payload from fetch_flights(), if that was the cause
+    quota = flight_data.get("quota")
+    if quota is None:
+        return None
+    return QuotaExceeded("serpapi", quota["reason"], quota["retry_after"])
+
+
+def extract_top_flights(flight_data, max_results=8, by="price", window=None):
+    # FlightRecords, best first
+    return rank_flights(parse_flights(flight_data), k=max_results, by=by, window=window)
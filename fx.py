@@ -0,0 +1,174 @@
+import json
+import logging
+import os
+import threading
+import time
+from calendar import timegm
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from cache import get_cache
+from config import env_float, env_str
+
+logger = logging.getLogger(__name__)
+
+# ================== EXCHANGE RATES ==================
+# Fares are always fetched in INR; other display currencies are a local
+# conversion, never another SerpAPI search. The rate table is the cached
+# answer of FX_RATES_URL (any "latest rates" JSON with a `rates` object,
+# rebased to INR), shared by every process through the "fx_rates" cache.
+# It is used for FX_RATES_TTL seconds and then refreshed in the background
+# while the old table stays on screen, so converting never waits on the
+# network. Until the first refresh lands (or with FX_RATES_URL=off, or
+# offline) prices convert at the bundled data/fx_rates.json.
+
+FX_BASE = "INR"
+BUNDLED_FX_RATES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "fx_rates.json")
+DEFAULT_FX_RATES_URL = "https://open.er-api.com/v6/latest/INR"
+FX_KEY = ("rates", FX_BASE)
+
+CURRENCY_SYMBOLS = {
+    "INR": "₹", "USD": "$", "EUR": "€", "GBP": "£", "JPY": "¥", "CNY": "CN¥", "AUD": "A$",
+    "CAD": "C$", "SGD": "S$", "HKD": "HK$", "NZD": "NZ$",
+}
+
+
+@dataclass(frozen=True)
+class RateTable:
+    codes: Tuple[str, ...]        # bundled currencies first, then the rest A-Z
+    per_inr: np.ndarray           # units of codes[i] one rupee buys
+    as_of: float                  # unix time of the rates
+    source: str                   # "live" or "seed"
+
+    def rate(self, currency: str) -> float:
+        return float(self.per_inr[self.codes.index(currency)])
+
+
+def _parse_as_of(payload: dict) -> float:
+    if "time_last_update_unix" in payload:
+        return float(payload["time_last_update_unix"])
+    return float(timegm(time.strptime(str(payload.get("as_of") or payload.get("date")), "%Y-%m-%d")))
+
+
+def _rebased(payload: dict) -> dict:
+    # {"as_of": unix time, "rates": {code: per INR}} from a provider payload
+    rates = {str(code).upper(): float(rate) for code, rate in payload["rates"].items() if float(rate) > 0}
+    per_base = rates[FX_BASE]
+    return {"as_of": _parse_as_of(payload), "rates": {code: rate / per_base for code, rate in rates.items()}}
+
+
+def _load_seed() -> dict:
+    with open(env_str("FX_SEED_PATH", BUNDLED_FX_RATES), encoding="utf-8") as f:
+        return _rebased(json.load(f))
+
+
+def fetch_rates(url: str, timeout: float) -> dict:
+    import httpx
+
+    response = httpx.get(url, timeout=timeout, follow_redirects=True)
+    response.raise_for_status()
+    return _rebased(response.json())
+
+
+# ----- table -----
+
+_TABLES: Dict[tuple, RateTable] = {}
+_STATE = {"refreshing": False, "failed_at": 0.0}
+_LOCK = threading.Lock()
+
+
+def fx_cache():
+    return get_cache(
+        "fx_rates",
+        ttl=env_float("FX_RATES_TTL", 6 * 3600),
+        keep_ttl=env_float("FX_RATES_KEEP_TTL", 30 * 86400),
+        max_entries=4,
+    )
+
+
+def _table(payload: dict, source: str) -> RateTable:
+    key = (source, payload["as_of"], len(payload["rates"]))
+    with _LOCK:
+        table = _TABLES.get(key)
+        if table is None:
+            seed_order = list(_seed()["rates"])
+            codes = tuple(
+                [code for code in seed_order if code in payload["rates"]]
+                + sorted(code for code in payload["rates"] if code not in seed_order)
+            )
+            per_inr = np.array([payload["rates"][code] for code in codes], dtype=np.float64)
+            table = _TABLES[key] = RateTable(codes, per_inr, payload["as_of"], source)
+            if len(_TABLES) > 8:
+                _TABLES.pop(next(iter(_TABLES)))
+        return table
+
+
+_SEED: Optional[dict] = None
+
+
+def _seed() -> dict:
+    global _SEED
+    if _SEED is None:
+        _SEED = _load_seed()
+    return _SEED
+
+
+def _refresh() -> None:
+    try:
+        payload = fetch_rates(env_str("FX_RATES_URL", DEFAULT_FX_RATES_URL), env_float("FX_FETCH_TIMEOUT", 10))
+        fx_cache().store(FX_KEY, payload)
+    except Exception as e:
+        logger.warning("could not refresh exchange rates: %s", e)
+        _STATE["failed_at"] = time.monotonic()
+    finally:
+        _STATE["refreshing"] = False
+
+
+def _refresh_in_background() -> None:
+    if env_str("FX_RATES_URL", DEFAULT_FX_RATES_URL).lower() == "off":
+        return
+    with _LOCK:
+        # One refresh at a time, and none for FX_RETRY_AFTER seconds after a failure
+        if _STATE["refreshing"] or (
+            _STATE["failed_at"] and time.monotonic() - _STATE["failed_at"] < env_float("FX_RETRY_AFTER", 600)
+        ):
+            return
+        _STATE["refreshing"] = True
+    threading.Thread(target=_refresh, name="fx-refresh", daemon=True).start()
+
+
+def rate_table() -> RateTable:
+    """The current rates; starts a background refresh when they are due."""
+    kept = fx_cache().peek(FX_KEY)
+    if kept is None or kept[1].state != "fresh":
+        _refresh_in_background()
+    if kept is not None:
+        return _table(kept[0], "live")
+    return _table(_seed(), "seed")
+
+
+# ================== CONVERSION ==================
+
+def convert_prices(table: Optional[RateTable], currency: str, **columns: Sequence[float]) -> Dict[str, np.ndarray]:
+    """Every INR column on screen converted in one pass: {name: array in `currency`}.
+
+    Missing prices go in as NaN and come out as NaN. No table (the
+    converter is off) means INR, unconverted.
+    """
+    sizes = [len(values) for values in columns.values()]
+    flat = np.concatenate([np.asarray(values, dtype=np.float64).ravel() for values in columns.values()] or [[]])
+    if table is not None and currency != FX_BASE:
+        flat = flat * table.rate(currency)
+    return dict(zip(columns, np.split(flat, np.cumsum(sizes)[:-1])))
+
+
+def currency_symbol(currency: str) -> str:
+    return CURRENCY_SYMBOLS.get(currency, currency + " ")
+
+
+def format_money(amount, currency: str = FX_BASE) -> str:
+    if amount is None or np.isnan(amount):
+        return "–"
+    return f"{currency_symbol(currency)}{amount:,.0f}"
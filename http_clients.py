@@ -0,0 +1,236 @@
+import asyncio
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Optional
+
+import httpx
+
+from aio import RETRY_STATUSES, LatencyTracker, bounded, hedged, run, time_left, with_retries
+from config import env_float, env_int, env_str
+from metrics import Counter, Gauge
+from quota import QuotaExceeded, budget
+
+if TYPE_CHECKING:
+    import openai
+
+# ================== SHARED UPSTREAM CLIENTS ==================
+# One async SerpAPI client and one AsyncOpenAI client per process, living on
+# the I/O loop (aio.py) and shared by every Streamlit session and worker
+# thread. Both keep connections alive in a bounded pool, so repeat searches
+# skip the TCP + TLS handshake, and both use explicit connect / read
+# timeouts instead of the libraries' defaults (google-search-results waits
+# 60000 s). On top of that every call is bounded by the current deadline
+# and retried with jittered backoff on 429 / 5xx / connection errors
+# (aio.with_retries; the SDK's own retries are off). Every SerpAPI request is
+# a billable search: the caller pays for the first (flights.fetch_flights),
+# each retry or hedged duplicate spends one more from the budget (quota.py)
+# and is skipped when the budget has no room for it. Knobs:
+#
+#   SERPAPI_POOL_SIZE = 32          # keep-alive connections to serpapi.com
+#   SERPAPI_CONNECT_TIMEOUT = 3.05
+#   SERPAPI_READ_TIMEOUT = 30       # fetch_flights(timeout=...) overrides
+#   SERPAPI_MAX_RETRIES = 2
+#   SERPAPI_HEDGE = 0               # 1: duplicate a request still running after the recent p95
+#   SERPAPI_HEDGE_AFTER = 5         # seconds, until there are enough samples for a p95
+#   OPENAI_POOL_SIZE = 32
+#   OPENAI_KEEPALIVE_EXPIRY = 60    # seconds an idle connection is kept
+#   OPENAI_CONNECT_TIMEOUT = 5
+#   OPENAI_READ_TIMEOUT = 60        # max gap between streamed chunks
+#   OPENAI_MAX_RETRIES = 2          # before the first token only
+#
+# The SDKs (openai: ~0.8 s to import, google-search-results: ~0.1 s) are
+# imported on first use, so a worker starts, and a visitor who only browses
+# fares is served, without paying for them.
+
+_LOCK = threading.Lock()
+_SERPAPI_CLIENT: Optional[httpx.AsyncClient] = None
+_OPENAI_CLIENTS: Dict[str, "openai.AsyncOpenAI"] = {}
+_SERPAPI_COUNTS = {"requests": 0, "connections_opened": 0}
+
+HTTP_REQUESTS = Counter(
+    "travel_planner_upstream_requests_total", "Requests sent to upstream APIs", ["upstream"]
+)
+
+
+def http_retry_reason(response, error) -> Optional[str]:
+    if isinstance(error, (httpx.TransportError, asyncio.TimeoutError)):
+        return type(error).__name__
+    if error is None and response.status_code in RETRY_STATUSES:
+        return f"http_{response.status_code}"
+    return None
+
+
+# ----- SerpAPI (httpx.AsyncClient) -----
+
+async def _serpapi_trace(event_name, info):
+    if event_name == "connection.connect_tcp.complete":
+        _SERPAPI_COUNTS["connections_opened"] += 1
+
+
+async def _on_serpapi_request(request):
+    HTTP_REQUESTS.inc(upstream="serpapi")
+    _SERPAPI_COUNTS["requests"] += 1
+    request.extensions["trace"] = _serpapi_trace
+
+
+def serpapi_client() -> httpx.AsyncClient:
+    global _SERPAPI_CLIENT
+    with _LOCK:
+        if _SERPAPI_CLIENT is None:
+            size = env_int("SERPAPI_POOL_SIZE", 32)
+            _SERPAPI_CLIENT = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=size, max_keepalive_connections=size),
+                timeout=httpx.Timeout(
+                    env_float("SERPAPI_READ_TIMEOUT", 30), connect=env_float("SERPAPI_CONNECT_TIMEOUT", 3.05)
+                ),
+                event_hooks={"request": [_on_serpapi_request]},
+            )
+        return _SERPAPI_CLIENT
+
+
+SERPAPI_LATENCY = LatencyTracker()
+
+
+async def _spend_extra_search() -> bool:
+    # A retry or hedge is one more billable search; never queue for it
+    try:
+        await asyncio.to_thread(budget().spend, "serpapi", 1, 0)
+    except QuotaExceeded:
+        return False
+    return True
+
+
+class PooledGoogleSearch:
+    """GoogleSearch whose request goes through the shared async client."""
+
+    def __init__(self, params_dict, timeout: Optional[float] = None):
+        from serpapi import GoogleSearch
+
+        self._search = GoogleSearch(params_dict)
+        self.timeout = timeout or env_float("SERPAPI_READ_TIMEOUT", 30)
+        base_url = env_str("SERPAPI_BASE_URL", "")
+        if base_url:
+            self._search.BACKEND = base_url.rstrip("/")
+
+    @property
+    def params_dict(self) -> dict:
+        return self._search.params_dict
+
+    def get_response(self, path="/search") -> httpx.Response:
+        return run(self.fetch(path))
+
+    async def fetch(self, path="/search") -> httpx.Response:
+        url, params = self._search.construct_url(path)
+        client = serpapi_client()
+
+        async def send():
+            started = time.monotonic()
+            timeout = httpx.Timeout(time_left(self.timeout), connect=env_float("SERPAPI_CONNECT_TIMEOUT", 3.05))
+            response = await client.get(url, params=params, timeout=timeout)
+            if response.status_code not in RETRY_STATUSES:
+                SERPAPI_LATENCY.observe(time.monotonic() - started)
+            return response
+
+        async def attempt():
+            hedge_after = None
+            if env_int("SERPAPI_HEDGE", 0) == 1:
+                hedge_after = SERPAPI_LATENCY.quantile(0.95) or env_float("SERPAPI_HEDGE_AFTER", 5)
+            return await hedged(send, hedge_after, "serpapi", may_hedge=_spend_extra_search)
+
+        async with bounded():
+            return await with_retries(
+                attempt, "serpapi", http_retry_reason, attempts=env_int("SERPAPI_MAX_RETRIES", 2),
+                may_retry=_spend_extra_search,
+            )
+
+
+# ----- OpenAI (AsyncOpenAI, httpx pool) -----
+
+def openai_retry_reason(result, error) -> Optional[str]:
+    import openai
+
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)):
+        return type(error).__name__
+    return None
+
+
+async def _on_openai_request(request):
+    HTTP_REQUESTS.inc(upstream="openai")
+
+
+def openai_client(api_key: str) -> "openai.AsyncOpenAI":
+    with _LOCK:
+        client = _OPENAI_CLIENTS.get(api_key)
+        if client is None:
+            import openai
+
+            size = env_int("OPENAI_POOL_SIZE", 32)
+            # httpx.Limits of whichever httpx build the SDK ships with
+            limits = type(openai.DEFAULT_CONNECTION_LIMITS)(
+                max_connections=size,
+                max_keepalive_connections=size,
+                keepalive_expiry=env_float("OPENAI_KEEPALIVE_EXPIRY", 60),
+            )
+            timeout = openai.Timeout(
+                env_float("OPENAI_READ_TIMEOUT", 60), connect=env_float("OPENAI_CONNECT_TIMEOUT", 5)
+            )
+            http_client = openai.DefaultAsyncHttpxClient(
+                limits=limits,
+                timeout=timeout,
+                event_hooks={"request": [_on_openai_request]},
+            )
+            client = openai.AsyncOpenAI(
+                api_key=api_key,
+                http_client=http_client,
+                timeout=timeout,
+                max_retries=0,
+            )
+            _OPENAI_CLIENTS[api_key] = client
+        return client
+
+
+# ----- pool stats -----
+
+def pool_stats() -> Dict[str, dict]:
+    """Connection counts per upstream, read from the live pools."""
+    stats = {}
+    with _LOCK:
+        serpapi = _SERPAPI_CLIENT
+        clients = list(_OPENAI_CLIENTS.values())
+
+    if serpapi is not None:
+        opened, requests_sent = _SERPAPI_COUNTS["connections_opened"], _SERPAPI_COUNTS["requests"]
+        stats["serpapi"] = {
+            "connections_opened": opened,
+            "idle_connections": _pool_counts([serpapi])[1],
+            "requests": requests_sent,
+            "reuse_ratio": max(1 - opened / requests_sent, 0.0) if requests_sent else 0.0,
+        }
+
+    if clients:
+        open_connections, idle = _pool_counts([client._client for client in clients])
+        stats["openai"] = {"open_connections": open_connections, "idle_connections": idle}
+    return stats
+
+
+def _pool_counts(http_clients):
+    # (open, idle) connections in the httpcore pools behind httpx clients
+    open_connections = idle = 0
+    for http_client in http_clients:
+        pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+        for conn in list(getattr(pool, "connections", [])):
+            open_connections += 1
+            idle += conn.is_idle()
+    return open_connections, idle
+
+
+def _collect_pool_gauge():
+    for upstream, values in pool_stats().items():
+        for stat, value in values.items():
+            yield {"upstream": upstream, "stat": stat}, value
+
+
+POOL_GAUGE = Gauge(
+    "travel_planner_http_pool", "Upstream connection pool state", ["upstream", "stat"],
+    collect=_collect_pool_gauge,
+)
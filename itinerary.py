@@ -0,0 +1,743 @@
+import contextvars
+import json
+import logging
+import math
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import aio
+from cache import get_cache, make_key
+from config import env_float, env_int, env_str
+from fanout import fan_out
+from http_clients import openai_retry_reason
+from quota import budget
+from singleflight import COALESCED
+from timings import annotate, record, span
+
+logger = logging.getLogger(__name__)
+
+# ================== ITINERARY PROMPT ==================
+
+ITINERARY_MODEL = "gpt-4o-mini"
+SYSTEM_PROMPT = "You are a helpful, detail-oriented travel planner for Indian travellers."
+
+
+def build_itinerary_prompt(
+    num_days, travel_theme, source_city, source, destination_city, destination,
+    activity_preferences, budget, flight_class, hotel_rating, visa_required,
+    travel_insurance, flight_summary, budget_hint,
+) -> str:
+    return f"""
+You are an expert travel planner for Indian travellers.
+
+Create a detailed {num_days}-day itinerary for a {travel_theme.lower()} trip
+from {source_city} ({source}) to {destination_city} ({destination}).
+
+Traveller preferences:
+- Activities: {activity_preferences}
+- Budget level: {budget}
+- Flight class: {flight_class}
+- Hotel rating preference: {hotel_rating}
+- Visa required: {visa_required}
+- Travel insurance: {travel_insurance}
+
+Real flight options (from SerpAPI / Google Flights):
+{flight_summary}
+
+Cost information:
+{budget_hint}
+
+Use the flight price range and budget level to choose realistic hotels, activities,
+and total budget in INR.
+
+Return a Markdown-formatted answer with:
+- Overview
+- Best flight choice + reasoning
+- 3 hotel suggestions (area + rough nightly price)
+- Day-by-day itinerary ({num_days} days; morning/afternoon/evening)
+- Cost breakdown (flights, hotels, food/local travel, activities)
+- One-line summary about whether it fits a typical {budget} Indian traveller.
+                    """
+
+
+def itinerary_messages(prompt: str):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
+
+# ================== STRUCTURED OUTPUT ==================
+# ITINERARY_FORMAT=json (default) asks for JSON matching ITINERARY_SCHEMA
+# instead of free-form Markdown, with a compact prompt and a max_tokens budget
+# that grows with the number of days. Keys stream in schema order, so the
+# overview, flight and hotels arrive first and each day can be shown as soon
+# as its object closes. ITINERARY_FORMAT=markdown keeps the original prompt
+# (still with a budget). Budgets, in tokens: base + per_day * num_days,
+# overridable with ITINERARY_BASE_TOKENS / ITINERARY_TOKENS_PER_DAY.
+
+TOKEN_BUDGETS = {"json": (450, 130), "markdown": (700, 220)}
+
+_STR = {"type": "string"}
+_INR = {"type": "integer"}
+
+
+def _object(**properties):
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+DAY_SCHEMA = _object(day=_INR, title=_STR, morning=_STR, afternoon=_STR, evening=_STR)
+ITINERARY_SCHEMA = _object(
+    overview=_STR,
+    flight_choice=_object(airline=_STR, price_inr=_INR, reason=_STR),
+    hotels={"type": "array", "items": _object(name=_STR, area=_STR, nightly_inr=_INR)},
+    days={"type": "array", "items": DAY_SCHEMA},
+    cost_breakdown=_object(
+        flights_inr=_INR, hotels_inr=_INR, food_local_travel_inr=_INR, activities_inr=_INR, total_inr=_INR,
+    ),
+    summary=_STR,
+)
+
+
+def itinerary_format() -> str:
+    return "markdown" if env_str("ITINERARY_FORMAT", "json").lower() == "markdown" else "json"
+
+
+def itinerary_max_tokens(num_days, fmt: str) -> int:
+    base, per_day = TOKEN_BUDGETS[fmt]
+    base = env_int("ITINERARY_BASE_TOKENS", base)
+    per_day = env_int("ITINERARY_TOKENS_PER_DAY", per_day)
+    return min(base + per_day * max(int(num_days), 1), 16000)
+
+
+def _schema_format(name: str, schema: dict) -> dict:
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def itinerary_response_format(fmt: str) -> Optional[dict]:
+    return _schema_format("itinerary", ITINERARY_SCHEMA) if fmt == "json" else None
+
+
+def _trip_brief(
+    num_days, travel_theme, source_city, source, destination_city, destination,
+    activity_preferences, budget, flight_class, hotel_rating, visa_required,
+    travel_insurance, flight_summary, budget_hint,
+) -> str:
+    fares = "\n".join(flight_summary.splitlines()[:env_int("ITINERARY_PROMPT_FLIGHTS", 5)])
+    return (
+        f"{num_days}-day {travel_theme.lower()} trip, {source_city} ({source}) to "
+        f"{destination_city} ({destination}).\n"
+        f"Activities: {activity_preferences}. Budget: {budget}. Flight class: {flight_class}. "
+        f"Hotels: {hotel_rating}. Visa required: {'yes' if visa_required else 'no'}. "
+        f"Insurance: {'yes' if travel_insurance else 'no'}.\n"
+        f"Live fares:\n{fares}\n{budget_hint}\n"
+    )
+
+
+def build_structured_prompt(**trip) -> str:
+    # Same inputs as build_itinerary_prompt(); the layout lives in the schema
+    return _trip_brief(**trip) + (
+        f"Pick the best flight above, 3 hotels, and exactly {trip['num_days']} days with one short "
+        f"sentence each for morning, afternoon and evening. Costs in INR for the whole trip. "
+        f"Summary: one line on whether it suits a typical {trip['budget']} Indian traveller."
+    )
+
+
+_DECODER = json.JSONDecoder()
+_GAP = re.compile(r"[\s,]*")
+_COLON = re.compile(r"\s*:\s*")
+
+
+def _decode_complete(text: str, pos: int):
+    # raw_decode, except a number running into the end of the text may still grow
+    value, end = _DECODER.raw_decode(text, pos)
+    if end == len(text) and isinstance(value, (int, float)) and not isinstance(value, bool):
+        raise ValueError("number may be cut off")
+    return value, end
+
+
+def _partial_list(text: str, pos: int) -> List:
+    items = []
+    pos += 1  # past "["
+    while True:
+        pos = _GAP.match(text, pos).end()
+        if pos >= len(text) or text[pos] == "]":
+            return items
+        try:
+            item, pos = _decode_complete(text, pos)
+        except ValueError:
+            return items
+        items.append(item)
+
+
+def parse_partial_itinerary(text: str) -> Tuple[dict, bool]:
+    """Fields of a streamed JSON itinerary that are complete so far, and
+    whether the whole object is. Unfinished `hotels` / `days` lists hold
+    their finished items."""
+    data = {}
+    pos = text.find("{")
+    if pos < 0:
+        return data, False
+    pos += 1
+    while True:
+        pos = _GAP.match(text, pos).end()
+        if pos >= len(text):
+            return data, False
+        if text[pos] == "}":
+            return data, True
+        try:
+            key, pos = _DECODER.raw_decode(text, pos)
+            pos = _COLON.match(text, pos).end()
+        except (ValueError, AttributeError):
+            return data, False
+        try:
+            data[key], pos = _decode_complete(text, pos)
+        except ValueError:
+            if pos < len(text) and text[pos] == "[":
+                data[key] = _partial_list(text, pos)
+            return data, False
+
+
+def _inr(value) -> str:
+    return f"₹{value:,}" if isinstance(value, int) else "₹–"
+
+
+def format_day(day: dict) -> str:
+    if day.get("pending"):
+        return f"### Day {day['day']} — ⏳ still being planned\n"
+    if day.get("failed"):
+        return f"### Day {day['day']} — ⚠️ couldn't be planned; press Search to try again\n"
+    return (
+        f"### Day {day.get('day', '?')} — {day.get('title', '')}\n"
+        f"- **Morning:** {day.get('morning', '')}\n"
+        f"- **Afternoon:** {day.get('afternoon', '')}\n"
+        f"- **Evening:** {day.get('evening', '')}\n"
+    )
+
+
+def format_itinerary(data: dict) -> str:
+    """Markdown for a (possibly partial) structured itinerary."""
+    parts = []
+    if "overview" in data:
+        parts.append(f"## Overview\n\n{data['overview']}\n")
+    flight = data.get("flight_choice")
+    if flight:
+        parts.append(
+            f"## Best flight choice\n\n**{flight.get('airline', '')} — {_inr(flight.get('price_inr'))}.** "
+            f"{flight.get('reason', '')}\n"
+        )
+    if data.get("hotels"):
+        lines = [
+            f"{n}. **{h.get('area', '')} — {h.get('name', '')}** (≈ {_inr(h.get('nightly_inr'))}/night)"
+            for n, h in enumerate(data["hotels"], start=1)
+        ]
+        parts.append("## Hotels\n\n" + "\n".join(lines) + "\n")
+    if data.get("days"):
+        parts.append("## Day-by-day itinerary\n\n" + "\n".join(format_day(d) for d in data["days"]))
+    elif data.get("plan"):
+        # An outline (OUTLINE_SCHEMA) before its days are written, or on its own
+        lines = [f"- **Day {p.get('day', '?')}** — {p.get('area', '')}: {p.get('theme', '')}" for p in data["plan"]]
+        parts.append("## Day-by-day outline\n\n" + "\n".join(lines) + "\n")
+    costs = data.get("cost_breakdown")
+    if costs:
+        parts.append(
+            "## Cost breakdown\n\n| | INR |\n|---|---:|\n"
+            f"| Flights | {_inr(costs.get('flights_inr'))} |\n"
+            f"| Hotels | {_inr(costs.get('hotels_inr'))} |\n"
+            f"| Food & local travel | {_inr(costs.get('food_local_travel_inr'))} |\n"
+            f"| Activities | {_inr(costs.get('activities_inr'))} |\n"
+            f"| **Total** | **{_inr(costs.get('total_inr'))}** |\n"
+        )
+    if "summary" in data:
+        parts.append(f"**In short:** {data['summary']}\n")
+    return "\n".join(parts)
+
+
+def itinerary_markdown(text: str) -> Tuple[str, dict, bool]:
+    """(markdown, parsed fields, complete) for raw model output of either format."""
+    if not text.lstrip().startswith("{"):
+        return text, {}, True
+    data, complete = parse_partial_itinerary(text)
+    return format_itinerary(data), data, complete
+
+
+# ================== PARALLEL DAYS ==================
+# Long trips (num_days >= ITINERARY_PARALLEL_MIN_DAYS, JSON format only; 0
+# turns it off) are planned in two steps: one streamed call for an outline
+# (overview, flight, hotels, costs and an area + theme line per day), then
+# one small call per day, ITINERARY_DAY_CONCURRENCY at a time. A day that
+# fails, outlives ITINERARY_DAY_TIMEOUT or comes back cut off is retried on
+# its own, up to ITINERARY_DAY_RETRIES more times, while the other days are
+# shown as they land. Wall-clock time is the outline plus one short call
+# per wave of days, instead of growing with the length of the trip.
+
+OUTLINE_SCHEMA = _object(
+    overview=_STR,
+    flight_choice=ITINERARY_SCHEMA["properties"]["flight_choice"],
+    hotels=ITINERARY_SCHEMA["properties"]["hotels"],
+    plan={"type": "array", "items": _object(day=_INR, area=_STR, theme=_STR)},
+    cost_breakdown=ITINERARY_SCHEMA["properties"]["cost_breakdown"],
+    summary=_STR,
+)
+
+
+def is_outline_only(data: dict) -> bool:
+    # A finished outline-only plan, the short itinerary served when the token budget is low
+    return "plan" in data and "days" not in data
+
+
+def use_parallel_days(num_days, fmt: str) -> bool:
+    min_days = env_int("ITINERARY_PARALLEL_MIN_DAYS", 6)
+    return fmt == "json" and min_days > 0 and int(num_days) >= min_days
+
+
+def outline_max_tokens(num_days) -> int:
+    base = env_int("ITINERARY_OUTLINE_BASE_TOKENS", 450)
+    return base + env_int("ITINERARY_OUTLINE_TOKENS_PER_DAY", 30) * int(num_days)
+
+
+def outline_response_format() -> dict:
+    return _schema_format("outline", OUTLINE_SCHEMA)
+
+
+def build_outline_prompt(**trip) -> str:
+    return _trip_brief(**trip) + (
+        f"Pick the best flight above and 3 hotels. For each of the {trip['num_days']} days give only the "
+        f"area and a theme of a few words; the days are written separately. Costs in INR for the whole "
+        f"trip. Summary: one line on whether it suits a typical {trip['budget']} Indian traveller."
+    )
+
+
+def build_day_prompt(trip: dict, outline: dict, day: int) -> str:
+    plan = {entry.get("day"): entry for entry in outline.get("plan", [])}
+    nearby = "; ".join(
+        f"day {d}: {plan[d].get('area', '')} — {plan[d].get('theme', '')}" for d in (day - 1, day, day + 1)
+        if d in plan
+    )
+    hotels = ", ".join(h.get("area", "") for h in outline.get("hotels", []))
+    return (
+        f"Day {day} of {trip['num_days']}, {trip['travel_theme'].lower()} trip to {trip['destination_city']} "
+        f"from {trip['source_city']}. Activities: {trip['activity_preferences']}. Budget: {trip['budget']}. "
+        f"Staying in: {hotels}.\nPlan: {nearby}.\n"
+        f"Write day {day}: a short title and one short sentence each for morning, afternoon and evening."
+    )
+
+
+# ================== ITINERARY CACHE ==================
+# Popular routes and themes repeat a lot, so finished itineraries are cached
+# on a canonical form of the trip inputs. Fares only enter the key as coarse
+# log-scale buckets (~15% wide), so day-to-day fare noise keeps hitting.
+# Bump ITINERARY_PROMPT_VERSION whenever the prompt or output format changes.
+
+ITINERARY_PROMPT_VERSION = 2
+
+
+def itinerary_cache():
+    return get_cache(
+        "itineraries",
+        ttl=env_float("ITINERARY_CACHE_TTL", 7 * 24 * 3600),
+        max_entries=env_int("ITINERARY_CACHE_MAX_ENTRIES", 256),
+        max_disk_entries=env_int("ITINERARY_CACHE_MAX_DISK_ENTRIES", 5000),
+    )
+
+
+def price_bucket(price, step: float = 0.15):
+    if not isinstance(price, (int, float)) or price <= 0:
+        return None
+    return int(math.log(price) / math.log1p(step))
+
+
+def _normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", str(text)).strip().lower()
+
+
+def _normalize_activities(text: str) -> str:
+    items = {_normalize_text(item).strip(".") for item in re.split(r"[,;\n]|\band\b", str(text))}
+    return ",".join(sorted(item for item in items if item))
+
+
+def itinerary_cache_key(
+    num_days, travel_theme, source, destination, activity_preferences, budget,
+    flight_class, hotel_rating, visa_required, travel_insurance, min_price, avg_price,
+):
+    step = env_float("ITINERARY_PRICE_BUCKET", 0.15)
+    return (
+        ITINERARY_PROMPT_VERSION,
+        ITINERARY_MODEL,
+        itinerary_format(),
+        str(source).upper(),
+        str(destination).upper(),
+        int(num_days),
+        _normalize_text(travel_theme),
+        _normalize_activities(activity_preferences),
+        _normalize_text(budget),
+        _normalize_text(flight_class),
+        _normalize_text(hotel_rating),
+        bool(visa_required),
+        bool(travel_insurance),
+        price_bucket(min_price, step),
+        price_bucket(avg_price, step),
+    )
+
+
+# ================== COMPLETION (STREAMING) ==================
+
+@dataclass
+class ItineraryStats:
+    started_at: float
+    first_token_s: Optional[float] = None
+    total_s: Optional[float] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    chunks: int = 0
+    max_tokens: Optional[int] = None
+    finish_reason: Optional[str] = None
+    day_calls: int = 0
+
+    @property
+    def total_tokens(self) -> Optional[int]:
+        if self.prompt_tokens is None or self.completion_tokens is None:
+            return None
+        return self.prompt_tokens + self.completion_tokens
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters a token for these prompts; close enough to budget with
+    return math.ceil(len(text) / 4)
+
+
+def stream_itinerary(client, messages, stats: ItineraryStats, stream: bool = True,
+                     temperature: float = 0.7, max_tokens: Optional[int] = None,
+                     response_format: Optional[dict] = None) -> Iterator[str]:
+    """Yield the itinerary text as it is generated, filling in `stats`."""
+    options = {"model": ITINERARY_MODEL, "messages": messages, "temperature": temperature}
+    if max_tokens:
+        options["max_tokens"] = stats.max_tokens = max_tokens
+    if response_format:
+        options["response_format"] = response_format
+    with span("chat_completion", model=ITINERARY_MODEL, stream=stream, max_tokens=max_tokens):
+        if not stream:
+            completion = aio.run(_create_completion(client, options))
+            stats.first_token_s = time.perf_counter() - stats.started_at
+            stats.finish_reason = completion.choices[0].finish_reason
+            _record_usage(stats, completion.usage)
+            stats.chunks = 1
+            stats.total_s = stats.first_token_s
+            _log_stats(stats)
+            yield completion.choices[0].message.content or ""
+            return
+
+        response = aio.iterate(_stream_chunks(client, options))
+        try:
+            for chunk in response:
+                if chunk.usage is not None:
+                    _record_usage(stats, chunk.usage)
+                if not chunk.choices:
+                    continue
+                if chunk.choices[0].finish_reason:
+                    stats.finish_reason = chunk.choices[0].finish_reason
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if stats.first_token_s is None:
+                    stats.first_token_s = time.perf_counter() - stats.started_at
+                stats.chunks += 1
+                yield delta
+        finally:
+            response.close()
+            stats.total_s = time.perf_counter() - stats.started_at
+            _log_stats(stats)
+
+
+async def _create_completion(client, options: dict, **extra):
+    # Retried on rate limits / 5xx / dropped connections, i.e. before any
+    # output, and never past the current deadline
+    async with aio.bounded():
+        return await aio.with_retries(
+            lambda: client.chat.completions.create(**options, **extra),
+            "openai", openai_retry_reason, attempts=env_int("OPENAI_MAX_RETRIES", 2),
+        )
+
+
+async def _stream_chunks(client, options: dict):
+    response = await _create_completion(
+        client, options, stream=True, stream_options={"include_usage": True}
+    )
+    try:
+        async with aio.bounded():
+            async for chunk in response:
+                yield chunk
+    finally:
+        await response.close()
+
+
+def _record_usage(stats: ItineraryStats, usage) -> None:
+    if usage is not None:
+        stats.prompt_tokens = usage.prompt_tokens
+        stats.completion_tokens = usage.completion_tokens
+
+
+def _log_stats(stats: ItineraryStats) -> None:
+    if stats.first_token_s is not None:
+        record("llm_first_token", stats.first_token_s)
+    annotate(
+        first_token_ms=None if stats.first_token_s is None else round(stats.first_token_s * 1000, 1),
+        prompt_tokens=stats.prompt_tokens,
+        completion_tokens=stats.completion_tokens,
+        chunks=stats.chunks,
+        finish_reason=stats.finish_reason,
+    )
+    logger.info(
+        "itinerary ttft=%.3fs total=%.3fs prompt_tokens=%s completion_tokens=%s/%s chunks=%d finish=%s",
+        stats.first_token_s or -1, stats.total_s or -1,
+        stats.prompt_tokens, stats.completion_tokens, stats.max_tokens, stats.chunks, stats.finish_reason,
+    )
+
+
+def format_stats(stats: ItineraryStats) -> str:
+    parts = []
+    if stats.first_token_s is not None:
+        parts.append(f"first words after {stats.first_token_s:.1f}s")
+    if stats.total_s is not None:
+        parts.append(f"complete in {stats.total_s:.1f}s")
+    if stats.total_tokens is not None:
+        parts.append(
+            f"{stats.total_tokens:,} tokens ({stats.prompt_tokens:,} prompt + "
+            f"{stats.completion_tokens:,} completion"
+            + (f" of {stats.max_tokens:,} budgeted)" if stats.max_tokens else ")")
+        )
+    if stats.day_calls:
+        parts.append(f"days written by {stats.day_calls} parallel calls")
+    if stats.finish_reason == "length":
+        parts.append("cut off at the token budget")
+    return " · ".join(parts)
+
+
+# ================== BACKGROUND GENERATION ==================
+# The completion runs on a worker thread and appends chunks to a buffer; the
+# Streamlit script thread polls `text` and redraws its placeholder. Cancelling
+# stops reading the stream and closes the HTTP response.
+#
+# An ItineraryJob is one session's handle on a _Generation. Sessions that
+# start an identical prompt while it is still generating attach to the same
+# generation instead of calling OpenAI again, and read the same buffer; the
+# stream is only cancelled once every attached session has cancelled.
+#
+# Given the trip inputs (`trip`), the streamed answer is the outline and the
+# days are then planned in parallel (see PARALLEL DAYS); `text` becomes the
+# merged itinerary, with placeholders for days that are not back yet.
+#
+# `tokens_charged` is what the caller spent from the OpenAI budget up front
+# (an estimate, see engine.py); once the generation finishes the budget is
+# corrected to the tokens actually used. Attached sessions get theirs back.
+
+_JOB_POOL = ThreadPoolExecutor(
+    max_workers=env_int("ITINERARY_WORKERS", 16), thread_name_prefix="itinerary"
+)
+_GENERATIONS: Dict[str, "_Generation"] = {}
+_GENERATIONS_LOCK = threading.Lock()
+
+
+class _Generation:
+    def __init__(self, key, client, messages, stream: bool, cache_key, options: dict,
+                 trip: Optional[dict] = None, tokens_charged: int = 0):
+        self.key = key
+        self.cache_key = cache_key
+        self.tokens_charged = tokens_charged
+        self.stats = ItineraryStats(started_at=time.perf_counter())
+        self.error: Optional[BaseException] = None
+        self.watchers = 1
+        self._chunks = []
+        self._document: Optional[str] = None
+        self._cancelled = threading.Event()
+        self._finished = threading.Event()
+        self._future = _JOB_POOL.submit(
+            contextvars.copy_context().run, self._run, client, messages, stream, options, trip
+        )
+
+    def _run(self, client, messages, stream, options, trip):
+        try:
+            for delta in stream_itinerary(client, messages, self.stats, stream=stream, **options):
+                if self._cancelled.is_set():
+                    break
+                self._chunks.append(delta)
+            else:
+                complete = self._plan_days(client, trip) if trip is not None else True
+                # A cut-off answer is shown but not reused
+                if (self.cache_key is not None and self._chunks and complete
+                        and self.stats.finish_reason != "length" and not self._cancelled.is_set()):
+                    itinerary_cache().store(self.cache_key, self.text)
+        except Exception as e:
+            self.error = e
+        finally:
+            with _GENERATIONS_LOCK:
+                if _GENERATIONS.get(self.key) is self:
+                    del _GENERATIONS[self.key]
+            self._settle()
+            self._finished.set()
+
+    def _settle(self) -> None:
+        used = self.stats.total_tokens
+        if used is None:
+            # No usage reported: nothing was generated, or the stream was cut
+            used = 0 if self.error is not None and not self._chunks else self.tokens_charged
+        try:
+            budget().settle("openai", used - self.tokens_charged)
+        except Exception:
+            logger.exception("could not settle the itinerary token budget")
+
+    def _plan_days(self, client, trip: dict) -> bool:
+        """Write every day of the streamed outline; True if none had to be given up."""
+        outline, complete = parse_partial_itinerary("".join(self._chunks))
+        if not complete or self.stats.finish_reason == "length":
+            return False
+        num_days = int(trip["num_days"])
+        days: Dict[int, dict] = {}
+        calls: List[ItineraryStats] = []
+        self._publish(outline, days, num_days)
+
+        def plan_day(day):
+            stats = ItineraryStats(started_at=time.perf_counter())
+            calls.append(stats)
+            text = "".join(stream_itinerary(
+                client, itinerary_messages(build_day_prompt(trip, outline, day)), stats, stream=False,
+                max_tokens=env_int("ITINERARY_DAY_TOKENS", 220), response_format=_schema_format("day", DAY_SCHEMA),
+            ))
+            if stats.finish_reason == "length":
+                raise ValueError("cut off at the token budget")
+            return dict(json.loads(text), day=day)
+
+        pending = list(range(1, num_days + 1))
+        with span("itinerary_days", days=num_days):
+            for attempt in range(env_int("ITINERARY_DAY_RETRIES", 1) + 1):
+                failed = []
+                for day, result, error in fan_out(
+                    {day: partial(plan_day, day) for day in pending},
+                    max_concurrency=env_int("ITINERARY_DAY_CONCURRENCY", 8),
+                    task_timeout=env_float("ITINERARY_DAY_TIMEOUT", 45),
+                ):
+                    if self._cancelled.is_set():
+                        return False
+                    if error is not None:
+                        logger.warning("itinerary day %d (attempt %d) failed: %s", day, attempt + 1, error)
+                        failed.append(day)
+                        continue
+                    days[day] = result
+                    self._publish(outline, days, num_days)
+                pending = sorted(failed)
+                if not pending:
+                    break
+            annotate(day_calls=len(calls), failed_days=len(pending))
+
+        for day in pending:
+            days[day] = {"day": day, "failed": True}
+        self._publish(outline, days, num_days)
+        for stats in calls:
+            self.stats.prompt_tokens = (self.stats.prompt_tokens or 0) + (stats.prompt_tokens or 0)
+            self.stats.completion_tokens = (self.stats.completion_tokens or 0) + (stats.completion_tokens or 0)
+            self.stats.max_tokens = (self.stats.max_tokens or 0) + (stats.max_tokens or 0)
+        self.stats.day_calls = len(calls)
+        self.stats.total_s = time.perf_counter() - self.stats.started_at
+        return not pending
+
+    def _publish(self, outline: dict, days: Dict[int, dict], num_days: int) -> None:
+        # Same shape and key order as a one-shot ITINERARY_SCHEMA answer
+        merged = {}
+        for key in ITINERARY_SCHEMA["properties"]:
+            if key == "days":
+                merged[key] = [days.get(day, {"day": day, "pending": True}) for day in range(1, num_days + 1)]
+            elif key in outline:
+                merged[key] = outline[key]
+        self._document = json.dumps(merged, ensure_ascii=False)
+
+    @property
+    def text(self) -> str:
+        if self._document is not None:
+            return self._document
+        return "".join(self._chunks)
+
+    @property
+    def done(self) -> bool:
+        return self._finished.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._finished.wait(timeout)
+
+    def attach(self) -> bool:
+        # Called under _GENERATIONS_LOCK
+        if self._cancelled.is_set() or self.done:
+            return False
+        self.watchers += 1
+        return True
+
+    def detach(self) -> None:
+        with _GENERATIONS_LOCK:
+            self.watchers -= 1
+            if self.watchers > 0:
+                return
+            self._cancelled.set()
+            if _GENERATIONS.get(self.key) is self:
+                del _GENERATIONS[self.key]
+        self._future.cancel()
+
+
+class ItineraryJob:
+    def __init__(self, client, messages, signature=None, stream: bool = True, cache_key=None,
+                 max_tokens: Optional[int] = None, response_format: Optional[dict] = None,
+                 trip: Optional[dict] = None, tokens_charged: int = 0, short: bool = False):
+        self.signature = signature
+        self.cache_key = cache_key
+        self.parallel = trip is not None
+        self.short = short  # an outline-only plan, because the token budget ran low
+        self._cancelled = threading.Event()
+        options = {"max_tokens": max_tokens, "response_format": response_format}
+        key = make_key([ITINERARY_MODEL, messages, stream, options, self.parallel])
+        with _GENERATIONS_LOCK:
+            generation = _GENERATIONS.get(key)
+            self.shared = generation is not None and generation.attach()
+            if not self.shared:
+                generation = _GENERATIONS[key] = _Generation(
+                    key, client, messages, stream, cache_key, options, trip, tokens_charged
+                )
+        if self.shared and tokens_charged:
+            budget().settle("openai", -tokens_charged)
+        COALESCED.inc(group="itinerary", role="follower" if self.shared else "leader")
+        self._generation = generation
+
+    @property
+    def stats(self) -> ItineraryStats:
+        return self._generation.stats
+
+    @property
+    def error(self) -> Optional[BaseException]:
+        return self._generation.error
+
+    @property
+    def text(self) -> str:
+        return self._generation.text
+
+    @property
+    def done(self) -> bool:
+        return self._generation.done or self.cancelled
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        if not self._cancelled.is_set():
+            self._cancelled.set()
+            self._generation.detach()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._generation.wait(timeout)
@@ -0,0 +1,167 @@
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# ================== PROMETHEUS-STYLE METRICS ==================
+# Minimal counters / histograms rendered in the Prometheus text format, so a
+# local scraper can read them from http://127.0.0.1:$METRICS_PORT/metrics
+# without adding a client library. Values are per process.
+
+logger = logging.getLogger(__name__)
+
+_REGISTRY: List["_Metric"] = []
+_LOCK = threading.Lock()
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        with _LOCK:
+            _REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if amount < 0:
+            raise ValueError(f"{self.name}: counters only go up (inc by {amount})")
+        key = self._key(labels)
+        with _LOCK:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with _LOCK:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        lines = super().render()
+        with _LOCK:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Gauge(_Metric):
+    # Values come from `collect()` at scrape time, e.g. connection pool sizes
+    # read straight off the pools: [({"label": "value"}, number), ...]
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), collect: Callable[[], Iterable] = None):
+        super().__init__(name, help, labelnames)
+        self.collect = collect
+
+    def render(self):
+        lines = super().render()
+        for labels, value in (self.collect() if self.collect else []):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, self._key(labels))} {value:g}")
+        return lines
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[LabelValues, List[int]] = {}  # per bucket, non-cumulative
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with _LOCK:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def render(self):
+        lines = super().render()
+        with _LOCK:
+            for key, counts in sorted(self._counts.items()):
+                running = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    running += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    labels = _format_labels(self.labelnames, key, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{labels} {running}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {self._sums[key]:g}")
+                lines.append(f"{self.name}_count{labels} {running}")
+        return lines
+
+
+def render_metrics() -> str:
+    with _LOCK:
+        metrics = list(_REGISTRY)
+    return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+# ================== /metrics ENDPOINT ==================
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_SERVER: Optional[ThreadingHTTPServer] = None
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> Optional[ThreadingHTTPServer]:
+    # Idempotent: every Streamlit session runs the script, only the first
+    # call binds the port. port <= 0 leaves the endpoint off.
+    global _SERVER
+    if port <= 0:
+        return None
+    with _LOCK:
+        if _SERVER is None:
+            try:
+                _SERVER = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                logger.warning("metrics endpoint not started on %s:%d: %s", host, port, e)
+                return None
+            _SERVER.daemon_threads = True
+            threading.Thread(target=_SERVER.serve_forever, name="metrics", daemon=True).start()
+    return _SERVER
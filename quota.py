@@ -0,0 +1,414 @@
+import calendar
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from aio import time_left
+from cache import format_age
+from config import cache_dir, env_float, env_int, env_str
+from metrics import Counter, Gauge
+
+# ================== UPSTREAM BUDGETS ==================
+# SerpAPI searches and OpenAI tokens are metered, so every upstream call
+# spends from a budget first (spend() raises QuotaExceeded when it can't):
+#
+#   per session   an in-memory token bucket per Streamlit session / API
+#                 client: {R}_SESSION_BURST units, refilled at
+#                 {R}_SESSION_PER_MINUTE
+#   daily/monthly hard quotas ({R}_DAILY_QUOTA, {R}_MONTHLY_QUOTA; 0 =
+#                 none) against a ledger on disk of what was spent per UTC
+#                 day and month, shared by every process on the box
+#   pace          with a quota set, a global token bucket in the same
+#                 ledger holding up to QUOTA_BURST_SHARE of the day's
+#                 allowance, refilled with what is left of the allowance
+#                 spread evenly over what is left of the day. The allowance
+#                 is the daily quota, or the rest of the monthly one spread
+#                 over the rest of the month if that is less. A burst of
+#                 traffic runs into the pace (minutes of waiting, expired
+#                 fares) instead of using up the quota by noon (hours).
+#
+# R is SERPAPI (unit: one search) or OPENAI (unit: one token). A refused
+# spend that would be allowed within QUOTA_QUEUE_WAIT seconds (and the
+# current deadline) waits for it instead: the request is queued. A batch of
+# calls (the fare matrix) can be paid for up front with Budget.prepaid();
+# spends inside it draw on that and what is left over is refunded. What is
+# served when that doesn't help is up to the caller (flights.py,
+# engine.py): expired cached fares, an outline-only itinerary, or an error
+# saying when to try again.
+
+RESOURCES = {"serpapi": "SERPAPI", "openai": "OPENAI"}
+RESOURCE_LABELS = {"serpapi": "Flight search", "openai": "AI planning"}
+# (burst, per minute); a cold search with a ±3 fare matrix is up to 9 pairs + 49 cells
+SESSION_DEFAULTS = {"serpapi": (60, 10), "openai": (20000, 4000)}
+REASONS = {
+    "session": "too many requests from this session",
+    "pace": "the service is busy",
+    "daily": "today's quota is used up",
+    "monthly": "this month's quota is used up",
+}
+
+QUOTA_SPENT = Counter(
+    "travel_planner_quota_spent_total", "Metered upstream units spent (searches, tokens)", ["resource"]
+)
+QUOTA_REFUNDED = Counter(
+    "travel_planner_quota_refunded_total",
+    "Units given back by settle() (unused prepaid searches, tokens over-estimated); net use is spent - refunded",
+    ["resource"],
+)
+QUOTA_DENIED = Counter(
+    "travel_planner_quota_denied_total", "Spends refused by a budget", ["resource", "reason"]
+)
+QUOTA_DEGRADED = Counter(
+    "travel_planner_quota_degraded_total", "Requests served degraded because of a budget",
+    ["resource", "mode"],
+)
+
+
+class QuotaExceeded(RuntimeError):
+    def __init__(self, resource: str, reason: str, retry_after: float):
+        self.resource = resource
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(
+            f"{RESOURCE_LABELS[resource]} limit reached ({REASONS[reason]}); "
+            f"try again in {format_age(max(retry_after, 1))}"
+        )
+
+
+@dataclass
+class Limits:
+    session_burst: float
+    session_rate: float      # units per second
+    daily: float             # 0 = no quota
+    monthly: float
+
+
+def resource_limits(resource: str) -> Limits:
+    prefix = RESOURCES[resource]
+    burst, per_minute = SESSION_DEFAULTS[resource]
+    return Limits(
+        session_burst=env_float(f"{prefix}_SESSION_BURST", burst),
+        session_rate=env_float(f"{prefix}_SESSION_PER_MINUTE", per_minute) / 60,
+        daily=env_float(f"{prefix}_DAILY_QUOTA", 0),
+        monthly=env_float(f"{prefix}_MONTHLY_QUOTA", 0),
+    )
+
+
+def degraded(resource: str, mode: str) -> None:
+    # mode: "stale" (expired cached answer), "short" (outline-only itinerary),
+    # "queued" (waited for the budget) or "refused"
+    QUOTA_DEGRADED.inc(resource=resource, mode=mode)
+
+
+# ----- sessions -----
+
+_SESSION: ContextVar[Optional[str]] = ContextVar("quota_session", default=None)
+
+
+@contextmanager
+def quota_session(session_id: Optional[str]):
+    token = _SESSION.set(session_id)
+    try:
+        yield session_id
+    finally:
+        _SESSION.reset(token)
+
+
+def use_session(session_id: Optional[str]) -> None:
+    # For the rest of the current context, e.g. one Streamlit script run
+    _SESSION.set(session_id)
+
+
+class _Prepaid:
+    # Units of one resource paid for up front, drawn on by spends in the same context
+    def __init__(self, budget: "Budget", resource: str, amount: float):
+        self.budget = budget
+        self.resource = resource
+        self.left = amount
+        self._lock = threading.Lock()
+
+    def take(self, budget: "Budget", resource: str, amount: float) -> bool:
+        if budget is not self.budget or resource != self.resource:
+            return False
+        with self._lock:
+            if self.left < amount:
+                return False
+            self.left -= amount
+            return True
+
+
+_PREPAID: ContextVar[Optional[_Prepaid]] = ContextVar("quota_prepaid", default=None)
+
+
+# ================== TOKEN BUCKET ==================
+
+class TokenBucket:
+    """`capacity` units, refilled at `rate` per second. A full bucket lets
+    any amount through (and goes into debt), so a spend bigger than the
+    bucket is slow, never impossible."""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.time):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated_at = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def take(self, amount: float) -> float:
+        """Take `amount` and return 0, or return the seconds until it could be taken."""
+        with self._lock:
+            self._refill()
+            needed = min(amount, self.capacity)
+            if self.tokens < needed:
+                return (needed - self.tokens) / self.rate if self.rate > 0 else float("inf")
+            self.tokens -= amount
+            return 0.0
+
+    def give(self, amount: float) -> None:
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+# ================== LEDGER + BUDGET ==================
+
+def _periods(now: float):
+    # (day, month, seconds left in the day, seconds left in the month), UTC
+    t = time.gmtime(now)
+    day_start = calendar.timegm((t.tm_year, t.tm_mon, t.tm_mday, 0, 0, 0))
+    days_in_month = calendar.monthrange(t.tm_year, t.tm_mon)[1]
+    month_end = calendar.timegm((t.tm_year, t.tm_mon, days_in_month, 0, 0, 0)) + 86400
+    return time.strftime("%Y-%m-%d", t), time.strftime("%Y-%m", t), day_start + 86400 - now, month_end - now
+
+
+class Budget:
+    def __init__(self, path: Optional[str] = None, clock: Callable[[], float] = time.time):
+        self.path = path or env_str("QUOTA_LEDGER_PATH", os.path.join(cache_dir(), "quota.sqlite3"))
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[tuple, TokenBucket]" = OrderedDict()
+        # Transactions are explicit (BEGIN IMMEDIATE) so workers never race on a row
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=10, isolation_level=None)
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS quota_usage ("
+                " resource TEXT NOT NULL, period TEXT NOT NULL, used REAL NOT NULL,"
+                " PRIMARY KEY (resource, period))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS quota_buckets ("
+                " resource TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    # ----- spending -----
+
+    def spend(self, resource: str, amount: float, wait: Optional[float] = None) -> None:
+        """Spend `amount` units of `resource` or raise QuotaExceeded.
+
+        A refusal that clears within `wait` seconds (default QUOTA_QUEUE_WAIT,
+        capped by the current deadline) is waited out.
+        """
+        paid = _PREPAID.get()
+        if paid is not None and paid.take(self, resource, amount):
+            return
+        limits = resource_limits(resource)
+        if wait is None:
+            wait = time_left(env_float("QUOTA_QUEUE_WAIT", 5))
+        waited_until = time.monotonic() + wait
+        queued = False
+        while True:
+            denied = self._try_spend(resource, amount, limits)
+            if denied is None:
+                QUOTA_SPENT.inc(amount, resource=resource)
+                if queued:
+                    degraded(resource, "queued")
+                return
+            if time.monotonic() + denied.retry_after > waited_until:
+                QUOTA_DENIED.inc(resource=resource, reason=denied.reason)
+                raise denied
+            queued = True
+            time.sleep(max(denied.retry_after, 0.01))
+
+    @contextmanager
+    def prepaid(self, resource: str, amount: float, wait: Optional[float] = None):
+        """Spend `amount` once for a batch of calls; refund what they don't use.
+
+        Raises QuotaExceeded like spend() when the batch can't be paid for.
+        Spends in this context (and in copies of it, e.g. fan_out tasks)
+        draw on the prepaid units first.
+        """
+        self.spend(resource, amount, wait=wait)
+        paid = _Prepaid(self, resource, amount)
+        token = _PREPAID.set(paid)
+        try:
+            yield paid
+        finally:
+            _PREPAID.reset(token)
+            with paid._lock:
+                unused, paid.left = paid.left, 0
+            self.settle(resource, -unused)
+
+    def settle(self, resource: str, delta: float) -> None:
+        """Correct an earlier spend by `delta` units (actual minus estimate)."""
+        if not delta:
+            return
+        bucket = self._session_bucket(resource, resource_limits(resource))
+        if bucket is not None:
+            bucket.give(-delta)
+        day, month, _, _ = _periods(self.clock())
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for period in (day, month):
+                    self._add_usage(resource, period, delta)
+                self._db.execute(
+                    "UPDATE quota_buckets SET tokens = tokens - ? WHERE resource = ?", (delta, resource)
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        if delta > 0:
+            QUOTA_SPENT.inc(delta, resource=resource)
+        else:
+            QUOTA_REFUNDED.inc(-delta, resource=resource)
+
+    def _session_bucket(self, resource: str, limits: Limits) -> Optional[TokenBucket]:
+        session = _SESSION.get()
+        if session is None or limits.session_burst <= 0:
+            return None
+        key = (resource, session)
+        with self._lock:
+            bucket = self._sessions.get(key)
+            if bucket is None:
+                bucket = self._sessions[key] = TokenBucket(limits.session_rate, limits.session_burst, self.clock)
+                while len(self._sessions) > env_int("QUOTA_MAX_SESSIONS", 10000):
+                    self._sessions.popitem(last=False)
+            self._sessions.move_to_end(key)
+            return bucket
+
+    def _try_spend(self, resource: str, amount: float, limits: Limits) -> Optional[QuotaExceeded]:
+        bucket = self._session_bucket(resource, limits)
+        if bucket is not None:
+            retry_after = bucket.take(amount)
+            if retry_after:
+                return QuotaExceeded(resource, "session", retry_after)
+        denied = self._spend_global(resource, amount, limits)
+        if denied is not None and bucket is not None:
+            bucket.give(amount)
+        return denied
+
+    def _spend_global(self, resource: str, amount: float, limits: Limits) -> Optional[QuotaExceeded]:
+        now = self.clock()
+        day, month, day_left, month_left = _periods(now)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                denied = self._check_and_take(resource, amount, limits, now, day, month, day_left, month_left)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return denied
+
+    def _check_and_take(self, resource, amount, limits, now, day, month, day_left, month_left):
+        # Runs inside the ledger transaction
+        used_day, used_month = self._usage(resource, day), self._usage(resource, month)
+        if limits.daily and used_day + amount > limits.daily:
+            return QuotaExceeded(resource, "daily", day_left)
+        if limits.monthly and used_month + amount > limits.monthly:
+            return QuotaExceeded(resource, "monthly", month_left)
+        if not limits.daily and not limits.monthly:
+            for period in (day, month):
+                self._add_usage(resource, period, amount)
+            return None
+
+        allowance = limits.daily or float("inf")
+        if limits.monthly:
+            days_left = math.ceil(month_left / 86400)
+            allowance = min(allowance, (limits.monthly - used_month + used_day) / days_left)
+        share = min(max(env_float("QUOTA_BURST_SHARE", 0.1), 0.0), 1.0)
+        capacity = max(allowance * share, 1.0)
+        row = self._db.execute(
+            "SELECT tokens, updated_at FROM quota_buckets WHERE resource = ?", (resource,)
+        ).fetchone()
+        tokens, updated_at = row if row is not None else (capacity, now)
+        # What is neither spent nor in the bucket yet, over the rest of the day
+        rate = max(allowance - used_day - tokens, 0) / day_left
+        tokens = min(capacity, tokens + max(now - updated_at, 0) * rate)
+        needed = min(amount, capacity)
+        if tokens < needed:
+            return QuotaExceeded(resource, "pace", (needed - tokens) / rate if rate > 0 else day_left)
+        self._db.execute(
+            "INSERT OR REPLACE INTO quota_buckets (resource, tokens, updated_at) VALUES (?, ?, ?)",
+            (resource, tokens - amount, now),
+        )
+        for period in (day, month):
+            self._add_usage(resource, period, amount)
+        return None
+
+    def _usage(self, resource: str, period: str) -> float:
+        row = self._db.execute(
+            "SELECT used FROM quota_usage WHERE resource = ? AND period = ?", (resource, period)
+        ).fetchone()
+        return row[0] if row else 0.0
+
+    def _add_usage(self, resource: str, period: str, amount: float) -> None:
+        updated = self._db.execute(
+            "UPDATE quota_usage SET used = MAX(used + ?, 0) WHERE resource = ? AND period = ?",
+            (amount, resource, period),
+        )
+        if not updated.rowcount:
+            self._db.execute(
+                "INSERT INTO quota_usage (resource, period, used) VALUES (?, ?, ?)",
+                (resource, period, max(amount, 0)),
+            )
+
+    # ----- reporting -----
+
+    def usage(self, resource: str) -> dict:
+        # Units spent today / this month, against the quotas (0 = none)
+        limits = resource_limits(resource)
+        day, month, _, _ = _periods(self.clock())
+        with self._lock:
+            today, this_month = self._usage(resource, day), self._usage(resource, month)
+        return {"today": today, "month": this_month, "daily": limits.daily, "monthly": limits.monthly}
+
+
+_BUDGET: Optional[Budget] = None
+_BUDGET_LOCK = threading.Lock()
+
+
+def budget() -> Budget:
+    global _BUDGET
+    with _BUDGET_LOCK:
+        if _BUDGET is None:
+            _BUDGET = Budget()
+        return _BUDGET
+
+
+def _collect_usage_gauge():
+    for resource in RESOURCES:
+        for period, used in budget().usage(resource).items():
+            if period in ("today", "month"):
+                yield {"resource": resource, "period": period}, used
+
+
+QUOTA_USAGE = Gauge(
+    "travel_planner_quota_used", "Metered upstream units spent this UTC day / month", ["resource", "period"],
+    collect=_collect_usage_gauge,
+)
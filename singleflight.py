@@ -0,0 +1,65 @@
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from aio import time_left
+from metrics import Counter
+
+# ================== SINGLE-FLIGHT ==================
+# Collapses identical calls that overlap in time: the first caller for a key
+# runs the function, callers arriving while it runs wait on the same Future
+# and get the same result (or exception). Nothing is kept once the call
+# finishes; that is the cache's job. This covers the gap a cache cannot:
+# many sessions asking for the same route before the first answer exists.
+# Followers wait no longer than the current deadline (aio.time_left()), so a
+# hung leader cannot hold them past it.
+
+COALESCED = Counter(
+    "travel_planner_singleflight_calls_total",
+    "Calls through single-flight groups; role=follower are upstream calls saved",
+    ["group", "role"],
+)
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, Future] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run fn() once per key at a time; returns (result, shared)."""
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.leaders += 1
+            else:
+                self.followers += 1
+        COALESCED.inc(group=self.name, role="leader" if leader else "follower")
+
+        if not leader:
+            return future.result(timeout=time_left()), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "followers": self.followers,
+                "in_flight": len(self._inflight),
+            }
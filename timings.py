@@ -0,0 +1,198 @@
+import json
+import logging
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from config import env_int, env_str
+from metrics import Counter, Histogram
+
+# ================== STAGE TIMINGS ==================
+# Process-wide recorder for how long each stage of a search takes (flight
+# fetch, ranking, prompt building, LLM call, card rendering). Only the last
+# STAGE_TIMING_SAMPLES durations per stage are kept; benchmarks read them
+# back with snapshot().
+
+_SAMPLES = defaultdict(lambda: deque(maxlen=env_int("STAGE_TIMING_SAMPLES", 1000)))
+_LOCK = threading.Lock()
+
+
+def record(stage: str, seconds: float) -> None:
+    with _LOCK:
+        _SAMPLES[stage].append(seconds)
+
+
+def snapshot() -> Dict[str, List[float]]:
+    with _LOCK:
+        return {stage: list(samples) for stage, samples in _SAMPLES.items()}
+
+
+def reset() -> None:
+    with _LOCK:
+        _SAMPLES.clear()
+
+
+# ================== TRACING ==================
+# A Trace groups the spans of one search. The current trace and span live in
+# context variables; fan_out() and the job pools run work inside a copy of
+# the submitting context, so spans on worker threads land in the right trace.
+# Every finished span is also recorded above, fed to the Prometheus metrics
+# and, with TRACE_LOG set ("stderr" or a file path), written as a JSON line.
+
+STAGE_SECONDS = Histogram(
+    "travel_planner_stage_duration_seconds", "Time spent per stage", ["stage"]
+)
+STAGE_ERRORS = Counter(
+    "travel_planner_stage_errors_total", "Stages that raised", ["stage"]
+)
+PAYLOAD_BYTES = Counter(
+    "travel_planner_payload_bytes_total", "Bytes received or rendered per stage", ["stage"]
+)
+LLM_TOKENS = Counter(
+    "travel_planner_llm_tokens_total", "OpenAI tokens used", ["kind"]
+)
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "started_at", "offset", "duration", "thread", "attrs", "error")
+
+    def __init__(self, name: str, trace: Optional["Trace"], attrs: dict):
+        self.name = name
+        self.trace_id = trace.id if trace else None
+        self.started_at = time.perf_counter()
+        self.offset = self.started_at - trace.started_at if trace else 0.0
+        self.duration: Optional[float] = None
+        self.thread = threading.current_thread().name
+        self.attrs = attrs
+        self.error: Optional[str] = None
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def as_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span": self.name,
+            "offset_ms": round(self.offset * 1000, 2),
+            "duration_ms": None if self.duration is None else round(self.duration * 1000, 2),
+            "thread": self.thread,
+            "error": self.error,
+            **self.attrs,
+        }
+
+
+class Trace:
+    def __init__(self, name: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started_at = time.perf_counter()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def rows(self) -> List[dict]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.offset)
+        return [s.as_dict() for s in spans]
+
+
+_CURRENT_TRACE: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_CURRENT_SPAN: ContextVar[Optional[Span]] = ContextVar("span", default=None)
+
+
+@contextmanager
+def trace(name: str):
+    current = Trace(name)
+    token = _CURRENT_TRACE.set(current)
+    try:
+        yield current
+    finally:
+        _CURRENT_TRACE.reset(token)
+
+
+@contextmanager
+def use_trace(current: Optional[Trace]):
+    # Attach later work (e.g. a fragment rerun) to an earlier search's trace
+    token = _CURRENT_TRACE.set(current)
+    try:
+        yield current
+    finally:
+        _CURRENT_TRACE.reset(token)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    current_trace = _CURRENT_TRACE.get()
+    current = Span(name, current_trace, attrs)
+    token = _CURRENT_SPAN.set(current)
+    try:
+        yield current
+    except GeneratorExit:
+        current.set(cancelled=True)  # a streaming generator closed early
+        raise
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        _CURRENT_SPAN.reset(token)
+        current.duration = time.perf_counter() - current.started_at
+        if current_trace is not None:
+            current_trace.add(current)
+        _finish(current)
+
+
+def annotate(**attrs) -> None:
+    # Add attributes to whatever span is open, if any
+    current = _CURRENT_SPAN.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def _finish(current: Span) -> None:
+    record(current.name, current.duration)
+    STAGE_SECONDS.observe(current.duration, stage=current.name)
+    if current.error:
+        STAGE_ERRORS.inc(stage=current.name)
+    for key, value in current.attrs.items():
+        if key.endswith("_bytes") and isinstance(value, int):
+            PAYLOAD_BYTES.inc(value, stage=current.name)
+        elif key in ("prompt_tokens", "completion_tokens") and isinstance(value, int):
+            LLM_TOKENS.inc(value, kind=key[:-len("_tokens")])
+    logger = _trace_logger()
+    if logger is not None:
+        logger.info(json.dumps(dict(current.as_dict(), ts=time.time()), default=str))
+
+
+_TRACE_LOGGER: Optional[logging.Logger] = None
+_LOGGER_READY = False
+
+
+def _trace_logger() -> Optional[logging.Logger]:
+    global _TRACE_LOGGER, _LOGGER_READY
+    if _LOGGER_READY:
+        return _TRACE_LOGGER
+    with _LOCK:
+        if _LOGGER_READY:
+            return _TRACE_LOGGER
+        target = env_str("TRACE_LOG", "")
+        if target:
+            handler = (
+                logging.StreamHandler(sys.stderr) if target == "stderr"
+                else logging.FileHandler(target, encoding="utf-8")
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger = logging.getLogger("travel_planner.trace")
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            _TRACE_LOGGER = logger
+        _LOGGER_READY = True
+        return _TRACE_LOGGER
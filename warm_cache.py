@@ -0,0 +1,263 @@
+"""Prefetch fares for popular routes so first clicks hit a warm cache.
+
+    python warm_cache.py                                  # preset cities, next 3 weekends
+    python warm_cache.py --weekends 4 --trip 2026-12-20:2026-12-27 --budget 300
+    python warm_cache.py --routes mumbai:delhi,delhi:mumbai --concurrency 4
+    python warm_cache.py --off-peak 01:00-06:00           # cron: stops starting fetches at 06:00
+
+Fetches go through flights.fetch_flights(), so results land in the same
+"flights" cache (CACHE_DIR) that the app reads, per airport pair and dates.
+Entries younger than --max-age are skipped without spending quota. Every
+finished fetch is checkpointed (one line appended to a log). Rerunning with
+the same arguments resumes a crashed or budget-limited run, and SerpAPI
+searches already spent (as the search budget counted them, retries
+included) count against --budget.
+
+Schedule it so that runs land within FLIGHT_CACHE_TTL + FLIGHT_CACHE_STALE_TTL
+of peak traffic. Older entries are reloaded on the user's click.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from airports import airport_index, preset_cities
+from cache import make_key
+from config import cache_dir
+from fanout import fan_out
+from flights import airport_pairs, extract_top_flights, fetch_flights, flight_cache, flight_cache_key
+from quota import QUOTA_REFUNDED, QUOTA_SPENT, QuotaExceeded
+
+# SerpAPI answers with one of these once the account's searches are used up
+QUOTA_ERRORS = ("run out of searches", "account has run out", "exceeded")
+
+
+class Skipped(Exception):
+    pass
+
+
+def load_secrets(path=os.path.join(".streamlit", "secrets.toml")):
+    # Same promotion Streamlit does: root-level string secrets become env vars
+    if not os.path.exists(path):
+        return
+    import tomllib
+
+    with open(path, "rb") as f:
+        for key, value in tomllib.load(f).items():
+            if isinstance(value, (str, int, float)) and key not in os.environ:
+                os.environ[key] = str(value)
+
+
+def weekend_trips(count, today=None):
+    # Friday out, Sunday back, for the next `count` weekends (this one included)
+    today = today or date.today()
+    friday = today + timedelta(days=(4 - today.weekday()) % 7)
+    return [(friday + timedelta(weeks=i), friday + timedelta(weeks=i, days=2)) for i in range(count)]
+
+
+def parse_trip(text):
+    dep, _, ret = text.partition(":")
+    return date.fromisoformat(dep), date.fromisoformat(ret or dep)
+
+
+def city_routes(spec):
+    index = airport_index()
+    if not spec:
+        cities = preset_cities()
+        return [(a, b) for a in cities for b in cities if a != b]
+    routes = []
+    for item in spec.split(","):
+        source, _, destination = item.partition(":")
+        keys = index.resolve_city(source), index.resolve_city(destination)
+        if None in keys:
+            raise SystemExit(f"unknown city in route {item!r}")
+        routes.append(keys)
+    return routes
+
+
+def build_tasks(routes, trips):
+    index = airport_index()
+    tasks = []
+    for source_key, destination_key in routes:
+        source_codes = [a.iata for a in index.airports_for_city(source_key)]
+        destination_codes = [a.iata for a in index.airports_for_city(destination_key)]
+        for dep, ret in trips:
+            for src, dst in airport_pairs(source_codes, destination_codes):
+                tasks.append((src, dst, dep.isoformat(), ret.isoformat()))
+    return tasks
+
+
+def in_off_peak(window, now=None):
+    if not window:
+        return True
+    start, _, end = window.partition("-")
+    now = (now or datetime.now()).strftime("%H:%M")
+    return start <= now < end if start <= end else now >= start or now < end
+
+
+# ================== CHECKPOINT ==================
+
+class Checkpoint:
+    # An append-only log of JSON lines: {"run_id"} first, then {"done": [task]}
+    # per finished fetch and {"calls": n} per batch of searches spent. A line
+    # cut short by a crash is skipped on resume.
+    def __init__(self, path, run_id, fresh=False):
+        self.path = path
+        self.run_id = run_id
+        self.done = set()
+        self.calls = 0
+        self._counted = 0  # searches spent in this process so far, as last logged
+        self._lock = threading.Lock()
+        resumed = False
+        if not fresh and os.path.exists(path):
+            with open(path) as f:
+                entries = []
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        pass
+            if entries and entries[0].get("run_id") == run_id:
+                resumed = True
+                for entry in entries:
+                    self.done.update(entry.get("done", ()))
+                    self.calls += entry.get("calls", 0)
+        self._log = open(path, "a" if resumed else "w")
+        if not resumed:
+            self._append({"run_id": run_id})
+
+    def mark(self, task_id):
+        with self._lock:
+            self.done.add(task_id)
+            self._append({"done": [task_id]})
+
+    def count_calls(self, spent):
+        # `spent`: searches the budget let through in this run so far
+        with self._lock:
+            if spent > self._counted:
+                self.calls += spent - self._counted
+                self._append({"calls": spent - self._counted})
+                self._counted = spent
+
+    def _append(self, entry):
+        self._log.write(json.dumps(entry) + "\n")
+        self._log.flush()
+
+
+# ================== RUN ==================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--routes", default="", help="city:city,... (default: every ordered preset pair)")
+    parser.add_argument("--weekends", type=int, default=3, help="Fri-Sun trips for the next N weekends")
+    parser.add_argument("--trip", action="append", default=[], metavar="DEP:RET", help="extra date pair")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--budget", type=int, default=200, help="max SerpAPI calls for this run (incl. resumed)")
+    parser.add_argument("--max-age", type=float, default=600, help="skip entries fresher than this many seconds")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds per fetch")
+    parser.add_argument("--off-peak", default="", metavar="HH:MM-HH:MM", help="only start fetches in this window")
+    parser.add_argument("--checkpoint", default=None, help="default: $CACHE_DIR/warm_checkpoint.json")
+    parser.add_argument("--fresh", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--dry-run", action="store_true", help="list what would be fetched")
+    args = parser.parse_args(argv)
+
+    load_secrets()
+    if not os.environ.get("SERPAPI_KEY") and not os.environ.get("SERPAPI_BASE_URL"):
+        raise SystemExit("SERPAPI_KEY is not set (env or .streamlit/secrets.toml)")
+
+    trips = weekend_trips(args.weekends) + [parse_trip(t) for t in args.trip]
+    tasks = build_tasks(city_routes(args.routes), trips)
+    task_ids = {task: "|".join(task) for task in tasks}
+    checkpoint = Checkpoint(
+        args.checkpoint or os.path.join(cache_dir(), "warm_checkpoint.json"),
+        run_id=make_key(sorted(task_ids.values())),
+        fresh=args.fresh,
+    )
+    cache = flight_cache()
+
+    pending, fresh_already = [], 0
+    for task in tasks:
+        if task_ids[task] in checkpoint.done:
+            continue
+        # peek(), not lookup(): the scan shouldn't count as cache hits and misses
+        kept = cache.peek(flight_cache_key(*task))
+        if kept is not None and kept[1].state == "fresh" and kept[1].age <= args.max_age:
+            fresh_already += 1
+            continue
+        pending.append(task)
+
+    remaining_budget = max(0, args.budget - checkpoint.calls)
+    print(
+        f"{len(tasks)} fetches planned · {len(checkpoint.done)} done earlier · {fresh_already} already fresh · "
+        f"{len(pending)} to fetch · budget {remaining_budget} of {args.budget} calls left"
+    )
+    if args.dry_run:
+        for task in pending[:remaining_budget]:
+            print("  " + " ".join(task))
+        return 0
+
+    stop = threading.Event()
+    def net_spent():
+        return QUOTA_SPENT.value(resource="serpapi") - QUOTA_REFUNDED.value(resource="serpapi")
+
+    spent_before = net_spent()
+
+    def searches_spent():
+        # Counted where the budget lets a search through, so only requests actually sent
+        return net_spent() - spent_before
+
+    def warm(task):
+        if stop.is_set() or not in_off_peak(args.off_peak):
+            raise Skipped()
+        started = time.perf_counter()
+        try:
+            # An expired cached copy is no use to a warmer: a refused budget ends the run
+            data, _ = fetch_flights(*task, force_refresh=True, timeout=args.timeout, serve_kept=False)
+        except QuotaExceeded:
+            stop.set()
+            raise
+        finally:
+            checkpoint.count_calls(searches_spent())
+        error = data.get("error")
+        if error:
+            if any(marker in str(error).lower() for marker in QUOTA_ERRORS):
+                stop.set()
+            raise RuntimeError(error)
+        checkpoint.mark(task_ids[task])
+        top = extract_top_flights(data, max_results=1)
+        return top[0].price if top and top[0].has_price else None, time.perf_counter() - started
+
+    batch = {task: (lambda task=task: warm(task)) for task in pending[:remaining_budget]}
+    warmed = failed = skipped = 0
+    for n, (task, result, error) in enumerate(
+        fan_out(batch, max_concurrency=args.concurrency, task_timeout=args.timeout + 5), start=1
+    ):
+        src, dst, dep, ret = task
+        label = f"[{n:>4}/{len(batch)}] {src}→{dst} {dep}→{ret}"
+        if isinstance(error, Skipped):
+            skipped += 1
+        elif error is not None:
+            failed += 1
+            print(f"{label}  failed: {error}")
+        else:
+            warmed += 1
+            price, seconds = result
+            fare = f"₹{price:,.0f}" if price is not None else "no fares"
+            print(f"{label}  {fare:>10}  {seconds * 1000:.0f} ms")
+
+    checkpoint.count_calls(searches_spent())
+    left = len(pending) - warmed
+    print(
+        f"warmed {warmed} · failed {failed} · skipped {skipped} · {left} still to fetch · "
+        f"{checkpoint.calls} SerpAPI calls spent in this run"
+    )
+    if stop.is_set():
+        print("stopped early: SerpAPI quota exhausted or search budget reached (see quota.py)")
+    return 1 if failed and not warmed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())